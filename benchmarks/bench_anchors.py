@@ -0,0 +1,76 @@
+"""Requests needed to learn when freshly written streams are anchored
+
+Creates `--streams` documents on the local Ceramic stub, which anchors all of
+them `--anchor-after` seconds later. The "per-stream" run fetches the state of
+each pending stream every `--interval` seconds until all are anchored. The
+"tracker" run registers them with an AnchorTracker, which polls with
+multiqueries and spaces the polls out exponentially. It prints the requests
+each run sent to the node and how long after the anchor it saw the last stream
+anchored.
+
+    python benchmarks/bench_anchors.py --streams 1000 --anchor-after 5
+"""
+
+import argparse
+import logging
+import threading
+import time
+
+from ceramic_python import AnchorTracker, CeramicClient, DID
+from ceramic_python.model_instance_document import ModelInstanceDocument, ModelInstanceDocumentMetadataArgs
+
+from stub import PAGEVIEW_MODEL, StubNode
+
+
+def create_streams(stub, count):
+    signer = DID("11" * 32)
+    metadata = ModelInstanceDocumentMetadataArgs(signer.public_key, PAGEVIEW_MODEL)
+    return [stub.create_stream(ModelInstanceDocument.make_genesis(signer, {"page": f"/{i}"}, metadata))
+            for i in range(count)]
+
+
+def per_stream(client, stream_ids, interval):
+    pending = set(stream_ids)
+    while pending:
+        for stream_id in list(pending):
+            if client.get_stream_state(stream_id)["anchorStatus"] == "ANCHORED":
+                pending.discard(stream_id)
+        if pending:
+            time.sleep(interval)
+
+
+def with_tracker(client, stream_ids, interval):
+    tracker = AnchorTracker(client, initial_delay=interval, max_delay=60)
+    for future in tracker.track_many(stream_ids):
+        future.result()
+    tracker.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=1000)
+    parser.add_argument("--anchor-after", type=float, default=5.0, help="seconds until the stub anchors the streams")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between polls, the first tracker delay")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    stub = StubNode()
+    stub.add_model()
+    url = stub.start()
+    client = CeramicClient(url, "")
+
+    for name, run in [("per-stream", per_stream), ("tracker", with_tracker)]:
+        stream_ids = create_streams(stub, args.streams)
+        anchored_at = []
+        timer = threading.Timer(args.anchor_after, lambda: (stub.anchor_all(), anchored_at.append(time.monotonic())))
+        stub.requests.clear()
+        timer.start()
+        run(client, stream_ids, args.interval)
+        lag = time.monotonic() - anchored_at[0]
+        requests = sum(stub.requests.values())
+        print(f"{name:<11} {requests:>7} requests, all anchored seen {lag:.2f}s after the anchor")
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Loading commit histories from the node compared with the local block store
+
+Creates `--streams` streams with `--updates` updates each on the local Ceramic
+stub, then loads every stream's commits three times: without a block store,
+with an empty one (first fetch, which fills it) and with the filled one.
+
+    python benchmarks/bench_blocks.py --streams 200 --updates 10 --latency 0.01
+"""
+
+import argparse
+import tempfile
+import time
+
+from ceramic_python import BlockStore, CeramicClient, DID
+from ceramic_python.helper import commit_cid
+from ceramic_python.model_instance_document import ModelInstanceDocument, ModelInstanceDocumentMetadataArgs
+
+from stub import PAGEVIEW_MODEL, StubNode
+
+
+def create_streams(stub, streams, updates):
+    signer = DID("11" * 32)
+    metadata = ModelInstanceDocumentMetadataArgs(signer.public_key, PAGEVIEW_MODEL)
+    stream_ids = []
+    for i in range(streams):
+        genesis = ModelInstanceDocument.make_genesis(signer, {"page": f"/{i}"}, metadata)
+        stream_id = stub.create_stream(genesis)
+        previous = genesis_cid = commit_cid(genesis)
+        for n in range(updates):
+            commit = ModelInstanceDocument.make_patch_commit(
+                signer, genesis_cid, previous, [{"op": "replace", "path": "/page", "value": f"/{i}/{n}"}])
+            stub.apply_commit(stream_id, commit)
+            previous = commit_cid(commit)
+        stream_ids.append(stream_id)
+    return stream_ids
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds the stub adds to every call")
+    args = parser.parse_args()
+
+    stub = StubNode(latency=args.latency)
+    stub.add_model()
+    url = stub.start()
+    stream_ids = create_streams(stub, args.streams, args.updates)
+    logs = {stream_id: [entry["cid"] for entry in stub.streams[stream_id]["log"]] for stream_id in stream_ids}
+
+    with tempfile.TemporaryDirectory() as directory:
+        blocks = BlockStore(directory)
+        for name, client in [("no store", CeramicClient(url, "")), ("cold store", CeramicClient(url, "", blocks=blocks)),
+                             ("warm store", CeramicClient(url, "", blocks=blocks))]:
+            stub.requests.clear()
+            t = time.perf_counter()
+            for stream_id in stream_ids:
+                client.load_commits(stream_id, logs[stream_id])
+            elapsed = time.perf_counter() - t
+            print(f"{name:<11} {len(stream_ids) / elapsed:>8.0f} histories/s, {sum(stub.requests.values()):>5} requests")
+        print(f"store: {blocks.stats()}")
+        blocks.close()
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""CAR export and import throughput between two Ceramic stubs
+
+Creates `--streams` streams with `--updates` updates each on one local stub,
+exports them to a CAR file and imports that file into a second, empty stub.
+Reports MB/s and streams/s for both directions.
+
+    python benchmarks/bench_car.py --streams 500 --updates 5 --concurrency 8
+"""
+
+import argparse
+import os
+import tempfile
+
+from ceramic_python import CeramicClient, export_streams, import_car
+
+from bench_blocks import create_streams
+from stub import StubNode
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=500)
+    parser.add_argument("--updates", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=None, help="verification processes, 0 verifies inline")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the stubs add to every call")
+    args = parser.parse_args()
+
+    source, target = StubNode(latency=args.latency), StubNode(latency=args.latency)
+    source.add_model()
+    target.add_model()
+    stream_ids = create_streams(source, args.streams, args.updates)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "streams.car")
+        exported = export_streams(CeramicClient(source.start(), ""), stream_ids, path, concurrency=args.concurrency)
+        imported = import_car(CeramicClient(target.start(), ""), path, concurrency=args.concurrency,
+                              processes=args.processes)
+    for name, stats in [("export", exported), ("import", imported)]:
+        print(f"{name}  {stats['streams']:>6} streams {stats['bytes'] / 1e6:>7.2f} MB in {stats['seconds']:>6.2f}s  "
+              f"{stats['bytes'] / 1e6 / stats['seconds']:>6.2f} MB/s {stats['streams'] / stats['seconds']:>7.0f} streams/s  "
+              f"{len(stats['failed'])} failed")
+    assert all(target.streams[s]["content"] == source.streams[s]["content"] for s in stream_ids)
+    source.stop()
+    target.stop()
+
+
+if __name__ == "__main__":
+    main()
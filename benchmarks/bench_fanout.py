@@ -0,0 +1,50 @@
+"""Wall-clock scaling of OrbisDB.scan_range from 1 to 16 partitions
+
+The stub node charges a fixed latency per request plus a per-row cost, so a
+single query over the whole range behaves like one long serial scan.
+
+    python benchmarks/bench_fanout.py --rows 100000 --latency 0.05 --row-latency 0.0001
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+from orbis_python import OrbisDB
+
+from bench_views import COLUMNS, TABLE, make_rows
+from stub import StubNode
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every request")
+    parser.add_argument("--row-latency", type=float, default=0.0001, help="seconds added per returned row")
+    parser.add_argument("--partitions", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    stub = StubNode(latency=args.latency, row_latency=args.row_latency)
+    stub.create_table(TABLE, COLUMNS)
+    stub.insert_rows(TABLE, make_rows(0, args.rows))
+    url = stub.start()
+    db = OrbisDB(c_endpoint=url, o_endpoint=url, table_stream=TABLE)
+
+    start = datetime(2024, 9, 25, tzinfo=timezone.utc)
+    end = start + timedelta(seconds=args.rows * 7)
+
+    print(f"{'partitions':>10} {'rows':>8} {'seconds':>8} {'speedup':>8}")
+    baseline = None
+    for partitions in args.partitions:
+        t = time.perf_counter()
+        rows = db.scan_range("env", "timestamp", start.isoformat(), end.isoformat(),
+                             partitions=partitions, parallelism=partitions)
+        elapsed = time.perf_counter() - t
+        baseline = baseline or elapsed
+        print(f"{partitions:>10} {len(rows):>8} {elapsed:>8.2f} {baseline / elapsed:>7.1f}x")
+
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Reading a stream at past commits, with and without history snapshots
+
+Creates a stream with `--updates` updates on the local Ceramic stub and
+loads it at `--reads` random commits, replaying from the local block store.
+Snapshots every `--interval` commits bound how many patches one read replays.
+
+    python benchmarks/bench_history.py --updates 1000 --reads 100 --interval 50
+"""
+
+import argparse
+import random
+import tempfile
+import time
+
+from ceramic_python import BlockStore, CeramicClient, StreamHistory
+from ceramic_python.model_instance_document import ModelInstanceDocument
+
+from bench_blocks import create_streams
+from stub import StubNode
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--reads", type=int, default=100)
+    parser.add_argument("--interval", type=int, default=50)
+    args = parser.parse_args()
+
+    stub = StubNode()
+    stub.add_model()
+    url = stub.start()
+    stream_id, = create_streams(stub, 1, args.updates)
+    log = [entry["cid"] for entry in stub.streams[stream_id]["log"]]
+    rng = random.Random(7)
+    targets = [rng.choice(log) for _ in range(args.reads)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        blocks = BlockStore(directory)
+        CeramicClient(url, "", blocks=blocks).load_commits(stream_id, log)
+        for name, interval in [("no snapshots", len(log) + 1), (f"every {args.interval}", args.interval)]:
+            history = StreamHistory(interval=interval)
+            client = CeramicClient(url, "", blocks=blocks, history=history)
+            t = time.perf_counter()
+            for cid in targets:
+                ModelInstanceDocument.load(client, stream_id, at_commit=cid)
+            elapsed = time.perf_counter() - t
+            print(f"{name:<13} {args.reads / elapsed:>8.0f} reads/s {history.replayed / args.reads:>8.1f} commits replayed/read")
+        blocks.close()
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
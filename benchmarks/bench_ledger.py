@@ -0,0 +1,63 @@
+"""Reopen time and lookup speed of the ingestion checkpoint ledger
+
+Fills a ledger with `--records` entries, then times reopening it with and
+without the saved Bloom filter. It also times looking up rows that were
+already written, in input order as a resumed run does and shuffled, and
+rows that were not.
+
+    python benchmarks/bench_ledger.py --records 2000000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from orbis_python.ledger import CheckpointLedger, row_digest
+
+
+def timed(label, fn, count=None):
+    t = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t
+    rate = f" ({count / elapsed:,.0f}/s)" if count else ""
+    print(f"{label:<42} {elapsed:>8.2f}s{rate}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rows.ledger")
+        digests = [row_digest({"page": "/home", "customer_user_id": i}) for i in range(args.records)]
+
+        def fill():
+            with CheckpointLedger(path, sync_every=10_000) as ledger:
+                for i, digest in enumerate(digests):
+                    ledger.add(digest, f"kjzl6kcym7w8y{i:050d}")
+
+        timed(f"write {args.records:,} records", fill, args.records)
+        print(f"ledger {os.path.getsize(path) / 1e6:.0f} MB, filter {os.path.getsize(path + '.bloom') / 1e6:.0f} MB")
+
+        ledger = timed("reopen with saved filter", lambda: CheckpointLedger(path))
+        hits = digests[:args.lookups]
+        timed(f"{len(hits):,} lookups of written rows, in order", lambda: [ledger.get(d) for d in hits], len(hits))
+        shuffled = random.Random(0).sample(digests, len(hits))
+        timed(f"{len(shuffled):,} lookups of written rows, shuffled", lambda: [ledger.get(d) for d in shuffled],
+              len(shuffled))
+        misses = [row_digest({"page": "/new", "customer_user_id": i}) for i in range(args.lookups)]
+        found = timed(f"{len(misses):,} lookups of new rows", lambda: [ledger.get(d) for d in misses], len(misses))
+        print(f"new rows reported as written: {sum(f is not None for f in found)}")
+        ledger.close()
+
+        os.remove(path + ".bloom")
+        timed("reopen rebuilding the filter", lambda: CheckpointLedger(path).close())
+
+
+if __name__ == "__main__":
+    main()
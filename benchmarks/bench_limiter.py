@@ -0,0 +1,104 @@
+"""Finds the knee of the stub node's capacity curve with the adaptive limiter
+
+The stub serves `--capacity` requests at a time, each taking `--latency`
+seconds, queues up to `--max-queue` more and refuses the rest with 503. The
+first part sweeps a fixed number of concurrent callers and prints throughput,
+p50 latency and the error rate at each level: throughput stops growing at the
+capacity while latency keeps rising, and past capacity + max_queue calls fail.
+The second part runs `--callers` threads through a LimitedSession and prints
+the concurrency limit it settles on, which should sit near the knee.
+
+    python benchmarks/bench_limiter.py --capacity 8 --latency 0.05 --callers 64
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+import requests
+
+from ceramic_python import CeramicClient, LimitedSession
+
+from stub import PAGEVIEW_MODEL, StubNode
+
+
+def run(client, callers, seconds):
+    """`callers` threads fetching stream state back to back. Returns (calls/s, p50 ms, error rate)"""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def loop():
+        while time.monotonic() < deadline:
+            t = time.perf_counter()
+            try:
+                client.get_stream_state(PAGEVIEW_MODEL)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - t)
+
+    threads = [threading.Thread(target=loop) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = len(latencies) + errors[0]
+    p50 = statistics.median(latencies) * 1000 if latencies else float("nan")
+    return len(latencies) / seconds, p50, errors[0] / total if total else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--capacity", type=int, default=8, help="requests the stub serves at once")
+    parser.add_argument("--max-queue", type=int, default=16, help="requests the stub queues before refusing")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the stub spends on each request")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 12, 16, 24, 32, 48])
+    parser.add_argument("--callers", type=int, default=64, help="threads in the adaptive run")
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each fixed level")
+    parser.add_argument("--duration", type=float, default=15.0, help="duration of the adaptive run")
+    args = parser.parse_args()
+
+    logging_off()
+    stub = StubNode(latency=args.latency, capacity=args.capacity, max_queue=args.max_queue)
+    stub.add_model()
+    url = stub.start()
+
+    print(f"{'callers':>8} {'calls/s':>9} {'p50 ms':>8} {'errors':>7}")
+    for callers in args.levels:
+        rps, p50, error_rate = run(CeramicClient(url, "", session=requests.Session()), callers, args.seconds)
+        print(f"{callers:>8} {rps:>9.0f} {p50:>8.1f} {error_rate:>7.1%}")
+
+    session = LimitedSession(max_limit=args.callers)
+    limiter = session.limiter(url)
+    samples = []
+    sampling = threading.Event()
+
+    def sample():
+        while not sampling.wait(0.25):
+            samples.append(limiter.limit)
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    rps, p50, error_rate = run(CeramicClient(url, "", session=session), args.callers, args.duration)
+    sampling.set()
+    sampler.join()
+    settled = samples[len(samples) // 3:]
+    print(f"\nadaptive, {args.callers} callers: {rps:.0f} calls/s, p50 {p50:.1f} ms, {error_rate:.1%} errors")
+    print(f"limit over time: {' '.join(f'{limit:.0f}' for limit in samples[::max(1, len(samples) // 20)])}")
+    print(f"settled limit {statistics.mean(settled):.1f} (min {min(settled):.0f}, max {max(settled):.0f}), "
+          f"{limiter.decreases} decreases, knee at {args.capacity}")
+    stub.stop()
+
+
+def logging_off():
+    # CeramicClient logs every refused call at ERROR level
+    import logging
+    logging.disable(logging.ERROR)
+
+
+if __name__ == "__main__":
+    main()
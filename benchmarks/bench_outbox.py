@@ -0,0 +1,65 @@
+"""Writes through the durable outbox compared with writing straight to the node
+
+Creates `--rows` documents against the local Ceramic + OrbisDB stub twice. The
+first pass calls `add_row` directly, so each call waits for the node. The
+second pass queues the signed commits in an Outbox and lets an OutboxDrainer
+submit them. It reports how fast rows are accepted, and how long the drainer
+takes until the node has every row.
+
+    python benchmarks/bench_outbox.py --rows 500 --latency 0.02
+"""
+
+import argparse
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ceramic_python import Outbox, OutboxDrainer
+from orbis_python import OrbisDB
+
+from bench_polling import seed_rows
+from stub import PAGEVIEW_MODEL, StubNode
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--producers", type=int, default=4, help="threads calling add_row")
+    parser.add_argument("--drainers", type=int, default=8, help="OutboxDrainer workers")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the stub adds to every call")
+    args = parser.parse_args()
+
+    stub = StubNode(latency=args.latency)
+    stub.add_model()
+    url = stub.start()
+    rows = [{key: row[key] for key in ("page", "address", "customer_user_id", "timestamp")}
+            for row in seed_rows(args.rows)]
+
+    def produce(db):
+        t = time.perf_counter()
+        with ThreadPoolExecutor(args.producers) as executor:
+            stream_ids = list(executor.map(db.add_row, rows))
+        return stream_ids, time.perf_counter() - t
+
+    direct = OrbisDB(url, url, table_stream=PAGEVIEW_MODEL, controller_private_key="11" * 32)
+    _, elapsed = produce(direct)
+    print(f"{'direct':<8} accepted {args.rows / elapsed:>8.0f} rows/s, on the node after {elapsed:.2f}s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        outbox = Outbox(directory)
+        queued = OrbisDB(url, url, table_stream=PAGEVIEW_MODEL, controller_private_key="22" * 32, outbox=outbox)
+        t = time.perf_counter()
+        drainer = OutboxDrainer(outbox, queued.ceramic_client, workers=args.drainers).start()
+        stream_ids, elapsed = produce(queued)
+        drainer.drain()
+        total = time.perf_counter() - t
+        drainer.stop()
+        outbox.close()
+    missing = [stream_id for stream_id in stream_ids if stream_id not in stub.streams]
+    print(f"{'outbox':<8} accepted {args.rows / elapsed:>8.0f} rows/s, on the node after {total:.2f}s"
+          f" ({len(missing)} missing)")
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
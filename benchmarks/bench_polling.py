@@ -0,0 +1,128 @@
+"""Upstream queries and response bytes of server-example.py under dashboard polling
+
+Many clients poll `/get` and `/filter` while a writer adds a document now and
+then. In the "plain" run every request queries OrbisDB and downloads the full
+result. In the "coalesced" run identical in-flight requests share one upstream
+query and clients send back the ETag they last saw, so unchanged results come
+back as empty 304s. The query cache is disabled in both runs so only the route
+level changes are measured.
+
+    python benchmarks/bench_polling.py --pollers 32 --seconds 5 --rows 2000
+"""
+
+import argparse
+import logging
+import random
+import statistics
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+from werkzeug.serving import make_server
+
+from bench_registry import load_server
+from stub import PAGEVIEW_MODEL, StubNode
+
+
+ROUTES = ["/get", "/filter?customer_user_id=3"]
+
+
+class NoFlight:
+    """Stand-in for SingleFlight that runs every call"""
+    in_flight = 0
+
+    def do(self, key, fn):
+        return fn(), False
+
+
+def seed_rows(count):
+    now = datetime.now(timezone.utc).isoformat()
+    return [{
+        "stream_id": f"k{i:012d}", "controller": None, "indexed_at": now, "page": "/home",
+        "address": f"0x{i:040x}", "customer_user_id": i % 50, "timestamp": now,
+    } for i in range(count)]
+
+
+def run(base, stub, pollers, seconds, use_etags, write_interval):
+    stop = threading.Event()
+    latencies, received, statuses = [], [0], {}
+    lock = threading.Lock()
+
+    def poll():
+        session = requests.Session()
+        etags = {}
+        while not stop.is_set():
+            route = random.choice(ROUTES)
+            headers = {"If-None-Match": etags[route]} if use_etags and route in etags else {}
+            t = time.perf_counter()
+            response = session.get(f"{base}{route}", headers=headers)
+            elapsed = time.perf_counter() - t
+            etags[route] = response.headers.get("ETag", "")
+            with lock:
+                latencies.append(elapsed)
+                received[0] += len(response.content)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    def write():
+        session = requests.Session()
+        while not stop.wait(write_interval):
+            session.post(f"{base}/create_document", params={"agent": "agent_one"}, json={
+                "page": "/pricing", "address": "0x1", "customer_user_id": 3,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+            })
+
+    before = stub.queries
+    threads = [threading.Thread(target=poll) for _ in range(pollers)] + [threading.Thread(target=write)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {
+        "requests": len(latencies),
+        "upstream": stub.queries - before,
+        "bytes": received[0],
+        "p50": statistics.median(latencies),
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pollers", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the stub adds to every upstream call")
+    parser.add_argument("--write-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    stub = StubNode(latency=args.latency)
+    stub.add_model()
+    stub.insert_rows(PAGEVIEW_MODEL, seed_rows(args.rows))
+    url = stub.start()
+    server = load_server(url)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    for handle in [server.registry.get(agent) for agent in server.registry.agents] + [server.registry.default]:
+        handle.cache = None
+    http = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{http.server_port}"
+
+    shared_flight = server.read_flight
+    results = {}
+    for mode, flight, use_etags in (("plain", NoFlight(), False), ("coalesced", shared_flight, True)):
+        server.read_flight = flight
+        results[mode] = run(base, stub, args.pollers, args.seconds, use_etags, args.write_interval)
+
+    http.shutdown()
+    stub.stop()
+    print(f"{'mode':>10} {'requests':>9} {'upstream':>9} {'upstream/s':>11} {'MB sent':>8} {'KB/req':>7} {'p50 (ms)':>9}  statuses")
+    for mode, r in results.items():
+        print(f"{mode:>10} {r['requests']:>9} {r['upstream']:>9} {r['upstream'] / args.seconds:>11.1f} "
+              f"{r['bytes'] / 1e6:>8.1f} {r['bytes'] / r['requests'] / 1e3:>7.1f} {r['p50'] * 1000:>9.1f}  {r['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
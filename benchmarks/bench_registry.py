@@ -0,0 +1,146 @@
+"""Per-route latency of server-example.py with and without the shared client registry
+
+Runs the example Flask app in-process against the local Ceramic + OrbisDB
+stub and drives every route from concurrent clients. The "per request" run
+swaps `registry.get` for the old behaviour of building a new OrbisDB (DID
+keys, Ceramic client, HTTP session) on every request; the "registry" run uses
+the handles built at startup. Prints p50 and p99 per route for both.
+Documents created by the first run stay in the table, so /get is measured
+against a larger table in the registry run.
+
+    python benchmarks/bench_registry.py --requests 300 --concurrency 8 --latency 0.002
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+from werkzeug.serving import make_server
+
+from orbis_python import OrbisDB
+
+from stub import PAGEVIEW_MODEL, StubNode
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+AGENTS = ["agent_one", "agent_two", "agent_three"]
+ROUTES = ["/", "/get", "/filter", "/create_document"]
+
+
+def load_server(url: str):
+    """Import server-example.py configured against the stub"""
+    os.environ.update(
+        ENV_ID="env",
+        TABLE_ID=PAGEVIEW_MODEL,
+        CONTEXT_ID="",
+        CERAMIC_ENDPOINT=url,
+        ORBIS_ENDPOINT=url,
+        QUERY_CACHE_TTL="0.001",
+        AGENT_ONE_SEED="11" * 32,
+        AGENT_TWO_SEED="22" * 32,
+        AGENT_THREE_SEED="33" * 32,
+    )
+    spec = importlib.util.spec_from_file_location("server_example", os.path.join(ROOT, "server-example.py"))
+    server = importlib.util.module_from_spec(spec)
+    # load_dotenv(override=True) would replace the values above with a local .env
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        spec.loader.exec_module(server)
+    finally:
+        os.chdir(cwd)
+    return server
+
+
+def per_request_handles(server):
+    """The pre-registry behaviour: a new OrbisDB for every request"""
+    def get(agent):
+        return OrbisDB(c_endpoint=server.CERAMIC_ENDPOINT,
+                       o_endpoint=server.ORBIS_ENDPOINT,
+                       context_stream=server.CONTEXT_ID,
+                       table_stream=server.TABLE_ID,
+                       controller_private_key=server.switcher.get(agent),
+                       cache=server.query_cache)
+    return get
+
+
+def call(session: requests.Session, base: str, route: str) -> float:
+    agent = random.choice(AGENTS)
+    t = time.perf_counter()
+    if route == "/create_document":
+        response = session.post(f"{base}{route}", params={"agent": agent}, json={
+            "page": "/home",
+            "address": f"0x{random.randrange(1 << 160):040x}",
+            "customer_user_id": random.randrange(20),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        })
+    elif route == "/filter":
+        response = session.get(f"{base}{route}", params={"agent": agent, "customer_user_id": random.randrange(20)})
+    else:
+        response = session.get(f"{base}{route}", params={"agent": agent})
+    elapsed = time.perf_counter() - t
+    response.raise_for_status()
+    return elapsed
+
+
+def run(base: str, total: int, concurrency: int):
+    local = threading.local()
+
+    def task(route):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return route, call(local.session, base, route)
+
+    latencies = {route: [] for route in ROUTES}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for route, elapsed in executor.map(task, [ROUTES[i % len(ROUTES)] for i in range(total)]):
+            latencies[route].append(elapsed)
+    return latencies
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400, help="requests per run, spread over the routes")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds the stub adds to every upstream call")
+    args = parser.parse_args()
+
+    stub = StubNode(latency=args.latency)
+    stub.add_model()
+    url = stub.start()
+    server = load_server(url)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    http = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{http.server_port}"
+
+    shared_get = server.registry.get
+    results = {}
+    for mode, get in (("per request", per_request_handles(server)), ("registry", shared_get)):
+        server.registry.get = get
+        run(base, len(ROUTES) * 5, args.concurrency)  # warm up
+        results[mode] = run(base, args.requests, args.concurrency)
+
+    http.shutdown()
+    stub.stop()
+    print(f"{'route':>18} {'mode':>12} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for route in ROUTES:
+        for mode, latencies in results.items():
+            values = latencies[route]
+            print(f"{route:>18} {mode:>12} {percentile(values, 50) * 1000:>9.2f} {percentile(values, 99) * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
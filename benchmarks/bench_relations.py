@@ -0,0 +1,65 @@
+"""Round trips needed to resolve stream-ID references for a page of rows
+
+Compares one filter() per reference with OrbisDB.load_related, which fetches
+the distinct referenced IDs with chunked IN queries.
+
+    python benchmarks/bench_relations.py --page 1000 --profiles 300 --latency 0.005
+"""
+
+import argparse
+import random
+import time
+
+from orbis_python import OrbisDB
+
+from stub import StubNode
+
+
+PAGEVIEWS = "kjzl6hvfrbw6cac35814w419t0jesyz5ibs94hxla1fqputf2aazb9do5sxji9f"
+PROFILES = "kjzl6hvfrbw6c6adsnzvbyr6itmf0igfy25xu0mqzei2pe2xw1hlusqyuknb9ky"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--page", type=int, default=1_000, help="rows in the page being resolved")
+    parser.add_argument("--profiles", type=int, default=300, help="distinct referenced rows")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds added to every request")
+    args = parser.parse_args()
+
+    stub = StubNode(latency=args.latency)
+    stub.create_table(PROFILES, ["stream_id", "name"])
+    stub.insert_rows(PROFILES, [{"stream_id": f"kp{i:08d}", "name": f"user {i}"} for i in range(args.profiles)])
+    stub.create_table(PAGEVIEWS, ["stream_id", "page", "profile_id"])
+    stub.insert_rows(PAGEVIEWS, [
+        {"stream_id": f"kv{i:08d}", "page": "/home", "profile_id": f"kp{random.randrange(args.profiles):08d}"}
+        for i in range(args.page)
+    ])
+    url = stub.start()
+    pageviews = OrbisDB(c_endpoint=url, o_endpoint=url, table_stream=PAGEVIEWS)
+    profiles = OrbisDB(c_endpoint=url, o_endpoint=url, table_stream=PROFILES)
+
+    page = pageviews.filter("env", {"page": "/home"}, limit=args.page)
+
+    before = stub.queries
+    t = time.perf_counter()
+    for row in page:
+        row["profile"] = profiles.filter("env", {"stream_id": row["profile_id"]})[0]
+    naive_time = time.perf_counter() - t
+    naive_trips = stub.queries - before
+
+    page = pageviews.filter("env", {"page": "/home"}, limit=args.page)
+    before = stub.queries
+    t = time.perf_counter()
+    pageviews.load_related("env", page, "profile_id", table=PROFILES)
+    batched_time = time.perf_counter() - t
+    batched_trips = stub.queries - before
+    assert all(row["profile"]["stream_id"] == row["profile_id"] for row in page)
+
+    print(f"{'strategy':>14} {'round trips':>12} {'seconds':>8}")
+    print(f"{'per reference':>14} {naive_trips:>12} {naive_time:>8.2f}")
+    print(f"{'load_related':>14} {batched_trips:>12} {batched_time:>8.2f}")
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
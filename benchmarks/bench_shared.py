@@ -0,0 +1,69 @@
+"""Query results cached per worker process compared with a cache shared through memory
+
+Forks `--workers` processes that each read `--reads` queries drawn from
+`--queries` distinct ones through a QueryCache, with and without a
+SharedMemoryCache behind it. A miss costs `--latency` seconds, standing in
+for the OrbisDB round trip. Reports upstream queries and reads/s.
+
+    python benchmarks/bench_shared.py --workers 4 --queries 200 --reads 2000
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from orbis_python import QueryCache, SharedMemoryCache
+
+
+TABLE = "kjzl6hvfrbw6cac35814w419t0jesyz5ibs94hxla1fqputf2aazb9do5sxji9f"
+
+
+def worker(seed, args, path, results):
+    cache = QueryCache(ttl=60, shared=SharedMemoryCache(path) if path else None)
+    rng = random.Random(seed)
+    loads = 0
+
+    def loader(n):
+        nonlocal loads
+        loads += 1
+        time.sleep(args.latency)
+        return b'{"data": [%s]}' % b", ".join(b'{"stream_id": "k%d", "page": "/%d"}' % (n, i) for i in range(args.rows))
+
+    started = time.perf_counter()
+    for _ in range(args.reads):
+        n = rng.randrange(args.queries)
+        cache.get_or_load("env", f"SELECT * FROM {TABLE} WHERE customer_user_id = $1", [n], lambda: loader(n))
+    results.put((loads, time.perf_counter() - started))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=2000, help="reads per worker")
+    parser.add_argument("--rows", type=int, default=20, help="rows per result")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds a query to OrbisDB takes")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, path in [("per worker", None), ("shared", os.path.join(directory, "cache"))]:
+            if path:
+                SharedMemoryCache(path).close()
+            results = context.Queue()
+            workers = [context.Process(target=worker, args=(seed, args, path, results)) for seed in range(args.workers)]
+            for process in workers:
+                process.start()
+            outcomes = [results.get() for _ in workers]
+            for process in workers:
+                process.join()
+            loads = sum(loads for loads, _ in outcomes)
+            reads_per_second = sum(args.reads / seconds for _, seconds in outcomes)
+            print(f"{name:<10} {loads:>6} upstream queries {reads_per_second:>9.0f} reads/s")
+
+
+if __name__ == "__main__":
+    main()
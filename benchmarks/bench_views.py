@@ -0,0 +1,96 @@
+"""Refresh cost of incrementally maintained aggregate views against table size
+
+For each table size the script compares recomputing "views per page per hour"
+and "distinct addresses per customer" from a full-table read with refreshing
+the registered views after a fixed batch of new rows.
+
+    python benchmarks/bench_views.py --sizes 10000 50000 100000 --batch 1000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from orbis_python import OrbisDB
+from orbis_python.views import bucket_timestamp
+
+from stub import StubNode
+
+
+TABLE = "kjzl6hvfrbw6cac35814w419t0jesyz5ibs94hxla1fqputf2aazb9do5sxji9f"
+COLUMNS = ["stream_id", "page", "address", "customer_user_id", "timestamp", "indexed_at"]
+PAGES = ["/home", "/about", "/contact", "/products", "/pricing", "/blog"]
+START = datetime(2024, 9, 25, tzinfo=timezone.utc)
+
+
+def make_rows(start: int, count: int):
+    rows = []
+    for i in range(start, start + count):
+        ts = (START + timedelta(seconds=i * 7)).isoformat()
+        rows.append({
+            "stream_id": f"k{i:012d}",
+            "page": random.choice(PAGES),
+            "address": f"0x{random.randrange(5000):040x}",
+            "customer_user_id": random.randrange(200),
+            "timestamp": ts,
+            "indexed_at": ts,
+        })
+    return rows
+
+
+def full_recompute(db: OrbisDB, env_id: str):
+    rows = db.read(env_id)
+    per_page_hour = defaultdict(int)
+    per_customer = defaultdict(set)
+    for row in rows:
+        per_page_hour[(row["page"], bucket_timestamp(row["timestamp"], 3600))] += 1
+        per_customer[row["customer_user_id"]].add(row["address"])
+    return per_page_hour, {k: len(v) for k, v in per_customer.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--batch", type=int, default=1_000)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'full (s)':>10} {'initial (s)':>12} {'refresh (s)':>12} {'speedup':>8}")
+    for size in args.sizes:
+        stub = StubNode()
+        stub.create_table(TABLE, COLUMNS)
+        stub.insert_rows(TABLE, make_rows(0, size))
+        url = stub.start()
+        db = OrbisDB(c_endpoint=url, o_endpoint=url, table_stream=TABLE)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "views.db")
+            db.register_view("env", "views_per_page_hour", group_by=["page"], time_bucket=("timestamp", 3600), path=path)
+            db.register_view("env", "addresses_per_customer", group_by=["customer_user_id"],
+                             count_distinct="address", path=path)
+
+            t = time.perf_counter()
+            db.refresh_views()
+            initial = time.perf_counter() - t
+
+            stub.insert_rows(TABLE, make_rows(size, args.batch))
+
+            t = time.perf_counter()
+            full_recompute(db, "env")
+            full = time.perf_counter() - t
+
+            t = time.perf_counter()
+            db.refresh_views()
+            refresh = time.perf_counter() - t
+            for view in db.views.values():
+                view.close()
+
+        stub.stop()
+        print(f"{size:>10} {full:>10.3f} {initial:>12.3f} {refresh:>12.3f} {full / refresh:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
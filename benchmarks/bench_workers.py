@@ -0,0 +1,114 @@
+"""Throughput of serve.py as the number of worker processes grows
+
+Starts `serve.py --workers N` for each N against the local Ceramic + OrbisDB
+stub and drives `/get` and `/filter` from several client processes for a fixed
+time. Prints requests per second and p50/p99 latency per worker count. Worker
+processes only help up to the number of CPU cores available.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 8 --clients 4 --seconds 5
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from bench_polling import seed_rows
+from stub import PAGEVIEW_MODEL, StubNode
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def client(base, seconds, threads, results):
+    """One client process: `threads` connections issuing requests back to back"""
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def loop():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            route = random.choice([f"/filter?customer_user_id={random.randrange(50)}&agent=agent_one", "/get?agent=agent_two"])
+            t = time.perf_counter()
+            session.get(f"{base}{route}").raise_for_status()
+            with lock:
+                latencies.append(time.perf_counter() - t)
+
+    workers = [threading.Thread(target=loop) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put(latencies)
+
+
+def measure(workers, port, env, clients, threads, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        ready_file = os.path.join(tmp, "ready")
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "serve.py"), "--workers", str(workers), "--port", str(port),
+             "--ready-file", ready_file],
+            env=env, cwd=tmp, stderr=subprocess.DEVNULL,
+        )
+        try:
+            while not os.path.exists(ready_file):
+                if server.poll() is not None:
+                    raise RuntimeError("serve.py exited before its workers were ready")
+                time.sleep(0.05)
+            results = multiprocessing.Queue()
+            base = f"http://127.0.0.1:{port}"
+            processes = [multiprocessing.Process(target=client, args=(base, seconds, threads, results))
+                         for _ in range(clients)]
+            for process in processes:
+                process.start()
+            latencies = [value for _ in processes for value in results.get()]
+            for process in processes:
+                process.join()
+        finally:
+            server.terminate()
+            server.wait()
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return len(latencies) / seconds, quantiles[49], quantiles[98]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=4, help="client processes")
+    parser.add_argument("--threads", type=int, default=4, help="connections per client process")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds the stub adds to every upstream call")
+    parser.add_argument("--port", type=int, default=18700)
+    args = parser.parse_args()
+
+    stub = StubNode(latency=args.latency)
+    stub.add_model()
+    stub.insert_rows(PAGEVIEW_MODEL, seed_rows(args.rows))
+    url = stub.start()
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [os.path.join(ROOT, "ceramicsdk"), os.environ.get("PYTHONPATH")])),
+        ENV_ID="env", TABLE_ID=PAGEVIEW_MODEL, CONTEXT_ID="", CERAMIC_ENDPOINT=url, ORBIS_ENDPOINT=url,
+        QUERY_CACHE_TTL="0.001", AGENT_ONE_SEED="11" * 32, AGENT_TWO_SEED="22" * 32, AGENT_THREE_SEED="33" * 32,
+    )
+
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'req/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for workers in args.workers:
+        rate, p50, p99 = measure(workers, args.port, env, args.clients, args.threads, args.seconds)
+        print(f"{workers:>8} {rate:>8.0f} {p50 * 1000:>9.1f} {p99 * 1000:>9.1f}")
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
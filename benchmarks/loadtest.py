@@ -0,0 +1,245 @@
+"""Load generator for server-example.py, against a local fake Ceramic/OrbisDB backend
+
+Starts the stub backend (stub.py) and `serve.py` pointed at it, seeds documents
+through `/create_documents`, then keeps `--concurrency` connections busy for
+`--duration` seconds: each connection picks a route from `--mix` by weight and
+sends the next request as soon as the previous one completes. The report is
+JSON, printed or written to `--output`: throughput, latency percentiles, error
+rate and status codes per route and overall, plus the upstream calls the
+backend received.
+
+    python benchmarks/loadtest.py --mix get=4,filter=4,create_document=1,update_document=1 \\
+        --concurrency 16 --duration 30 --output report.json
+
+`--target http://host:port` drives an already running server instead; the
+backend is not started then and updates use the documents seeded through it.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from stub import PAGEVIEW_MODEL, StubNode
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+AGENTS = ["agent_one", "agent_two", "agent_three"]
+PAGES = ["/home", "/about", "/contact", "/products", "/pricing", "/blog"]
+ROUTES = ("create_document", "get", "filter", "update_document")
+
+
+def parse_mix(text):
+    """"get=4,filter=1" -> {"get": 4.0, "filter": 1.0}"""
+    mix = {}
+    for part in text.split(","):
+        route, _, weight = part.partition("=")
+        route = route.strip().lstrip("/")
+        if route not in ROUTES:
+            raise argparse.ArgumentTypeError(f"Unknown route {route!r}, expected one of {', '.join(ROUTES)}")
+        mix[route] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("The mix needs at least one route with a positive weight")
+    return mix
+
+
+def make_document():
+    return {
+        "page": random.choice(PAGES),
+        "address": f"0x{random.randrange(1 << 160):040x}",
+        "customer_user_id": random.randrange(100),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+class LoadTest:
+    def __init__(self, base, mix, concurrency, duration, warmup):
+        self.base = base
+        self.routes = list(mix)
+        self.weights = [mix[route] for route in self.routes]
+        self.concurrency = concurrency
+        self.duration = duration
+        self.warmup = warmup
+        self.stream_ids = []
+        self.samples = {route: [] for route in self.routes}
+        self.errors = {route: 0 for route in self.routes}
+        self.statuses = {route: {} for route in self.routes}
+        self._lock = threading.Lock()
+
+    def seed(self, count):
+        """Create `count` documents in one NDJSON upload and remember their stream IDs for updates"""
+        body = "".join(json.dumps(make_document()) + "\n" for _ in range(count))
+        response = requests.post(f"{self.base}/create_documents", params={"agent": AGENTS[0]}, data=body,
+                                 headers={"Content-Type": "application/x-ndjson"}, stream=True)
+        response.raise_for_status()
+        for line in response.iter_lines():
+            result = json.loads(line)
+            if result.get("stream_id"):
+                self.stream_ids.append(result["stream_id"])
+
+    def request(self, session, route):
+        agent = random.choice(AGENTS)
+        if route == "create_document":
+            response = session.post(f"{self.base}/create_document", params={"agent": agent}, json=make_document())
+            if response.ok and response.status_code == 200:
+                with self._lock:
+                    self.stream_ids.append(json.loads(response.content))
+            return response
+        if route == "get":
+            return session.get(f"{self.base}/get", params={"agent": agent})
+        if route == "filter":
+            params = {"agent": agent, "customer_user_id": random.randrange(100), "order_by": "-timestamp", "limit": 50}
+            return session.get(f"{self.base}/filter", params=params)
+        stream_id = random.choice(self.stream_ids)
+        return session.patch(f"{self.base}/update_document", params={"agent": AGENTS[0]}, json={
+            "filters": {"stream_id": stream_id},
+            "content": {"page": random.choice(PAGES)},
+        })
+
+    def run(self):
+        started = time.monotonic()
+        measure_from = started + self.warmup
+        deadline = measure_from + self.duration
+        routes = [route for route in self.routes if route != "update_document" or self.stream_ids]
+        weights = [self.weights[self.routes.index(route)] for route in routes]
+
+        def worker():
+            session = requests.Session()
+            while True:
+                route = random.choices(routes, weights)[0]
+                t = time.monotonic()
+                if t >= deadline:
+                    return
+                try:
+                    response = self.request(session, route)
+                    status, ok = response.status_code, response.status_code < 400
+                except requests.RequestException:
+                    status, ok = "exception", False
+                elapsed = time.monotonic() - t
+                if t < measure_from:
+                    continue
+                with self._lock:
+                    self.samples[route].append(elapsed)
+                    self.errors[route] += not ok
+                    self.statuses[route][str(status)] = self.statuses[route].get(str(status), 0) + 1
+
+        threads = [threading.Thread(target=worker) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def report(self):
+        routes = {route: summarize(self.samples[route], self.errors[route], self.duration, self.statuses[route])
+                  for route in self.routes}
+        everything = [value for samples in self.samples.values() for value in samples]
+        statuses = {}
+        for counts in self.statuses.values():
+            for status, count in counts.items():
+                statuses[status] = statuses.get(status, 0) + count
+        return {"total": summarize(everything, sum(self.errors.values()), self.duration, statuses), "routes": routes}
+
+
+def summarize(samples, errors, duration, statuses):
+    summary = {"requests": len(samples), "errors": errors, "error_rate": errors / len(samples) if samples else 0.0,
+               "throughput_rps": len(samples) / duration, "statuses": statuses}
+    if samples:
+        ordered = sorted(samples)
+        cuts = statistics.quantiles(ordered, n=100, method="inclusive") if len(ordered) > 1 else ordered * 99
+        summary["latency_ms"] = {
+            "mean": statistics.fmean(ordered) * 1000,
+            "p50": cuts[49] * 1000,
+            "p90": cuts[89] * 1000,
+            "p99": cuts[98] * 1000,
+            "max": ordered[-1] * 1000,
+        }
+    return summary
+
+
+def start_server(url, workers, port, async_writes, tmp):
+    ready_file = os.path.join(tmp, "ready")
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [os.path.join(ROOT, "ceramicsdk"), os.environ.get("PYTHONPATH")])),
+        ENV_ID="env", TABLE_ID=PAGEVIEW_MODEL, CONTEXT_ID="", CERAMIC_ENDPOINT=url, ORBIS_ENDPOINT=url,
+        AGENT_ONE_SEED="11" * 32, AGENT_TWO_SEED="22" * 32, AGENT_THREE_SEED="33" * 32,
+        ASYNC_WRITES="true" if async_writes else "false",
+    )
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "serve.py"), "--workers", str(workers), "--port", str(port),
+         "--ready-file", ready_file],
+        env=env, cwd=tmp, stderr=subprocess.DEVNULL,
+    )
+    while not os.path.exists(ready_file):
+        if server.poll() is not None:
+            raise RuntimeError("serve.py exited before its workers were ready")
+        time.sleep(0.05)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("get=4,filter=4,create_document=1,update_document=1"),
+                        help="comma separated route=weight pairs")
+    parser.add_argument("--concurrency", type=int, default=8, help="connections kept busy")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds of load before measuring")
+    parser.add_argument("--seed", type=int, default=200, help="documents created before the run")
+    parser.add_argument("--workers", type=int, default=1, help="serve.py worker processes")
+    parser.add_argument("--port", type=int, default=18900)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds the fake backend adds to every call")
+    parser.add_argument("--async-writes", action="store_true", help="run the server with ASYNC_WRITES=true")
+    parser.add_argument("--target", help="base URL of an already running server")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    stub = server = None
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            if args.target:
+                base = args.target.rstrip("/")
+            else:
+                stub = StubNode(latency=args.latency)
+                stub.add_model()
+                server = start_server(stub.start(), args.workers, args.port, args.async_writes, tmp)
+                base = f"http://127.0.0.1:{args.port}"
+
+            test = LoadTest(base, args.mix, args.concurrency, args.duration, args.warmup)
+            if args.seed:
+                test.seed(args.seed)
+            upstream_before = dict(stub.requests) if stub else {}
+            test.run()
+            report = {
+                "config": {key: value for key, value in vars(args).items() if key != "output"},
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                **test.report(),
+            }
+            if stub:
+                report["upstream_calls"] = {route: count - upstream_before.get(route, 0)
+                                            for route, count in stub.requests.items()}
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+            if stub:
+                stub.stop()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
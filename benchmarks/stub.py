@@ -0,0 +1,283 @@
+"""Local stand-in for a Ceramic + OrbisDB node, used by the benchmarks in this folder
+
+Serves the OrbisDB `/api/db/query/json` route on top of an in-memory SQLite
+database. Queries are run as-is with the `$1, $2` parameters bound by
+position, which covers the SQL the ceramicsdk client generates.
+
+It also implements the slice of the Ceramic HTTP API that CeramicClient uses
+(streams, commits and multiqueries). Genesis and update commits are decoded
+and applied to an in-memory stream state, and documents of registered models
+are mirrored into the model's table so they can be queried right away.
+Signatures are not verified.
+
+`latency` adds a fixed delay to every request and `row_latency` a delay per
+returned row, to mimic a remote node that needs time to scan and serialize
+large results. With `capacity`, at most that many requests are served at once
+and the others wait their turn, so latency grows with load past the knee.
+Once `max_queue` requests are waiting, new ones are refused with `503`.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from base64 import b64decode
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import dag_cbor
+import jsonpatch
+from multiformats import CID, multihash
+from multiformats.multibase import base36
+
+from ceramic_python.helper import commit_cid, stream_id_from_genesis
+
+
+PAGEVIEW_MODEL = "kjzl6hvfrbw6cac35814w419t0jesyz5ibs94hxla1fqputf2aazb9do5sxji9f"
+with open(os.path.join(os.path.dirname(__file__), "..", "definition.json"), encoding="utf-8") as file:
+    PAGEVIEW_DEFINITION = json.load(file)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _cid(data: Any) -> str:
+    return str(CID("base32", 1, "dag-cbor", multihash.digest(dag_cbor.encode(data), "sha2-256")))
+
+
+def _decode_commit(commit: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    """Return (payload, cid) for a signed commit or an unsigned genesis"""
+    payload = dag_cbor.decode(b64decode(commit["linkedBlock"] + "==")) if "jws" in commit else commit
+    return payload, commit_cid(commit)
+
+
+class StubNode:
+    def __init__(self, latency: float = 0.0, row_latency: float = 0.0, capacity: int = 0,
+                 max_queue: Optional[int] = None) -> None:
+        self.latency = latency
+        self.row_latency = row_latency
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(capacity) if capacity else None
+        self._waiting = 0
+        self.queries = 0
+        self.requests: Dict[str, int] = {}
+        self.streams: Dict[str, Dict[str, Any]] = {}
+        # Commit CID -> commit as received, served by the commits route
+        self.commits: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._tables: Dict[str, List[str]] = {}
+        self._server = None
+        self._thread = None
+
+    # OrbisDB side
+
+    def create_table(self, table: str, columns: Iterable[str]) -> None:
+        columns = list(columns)
+        with self._lock:
+            self._conn.execute(f'CREATE TABLE "{table}" ({", ".join(map(_quote, columns))})')
+            if "stream_id" in columns:
+                self._conn.execute(f'CREATE UNIQUE INDEX "{table}_stream_id" ON "{table}" (stream_id)')
+            if "indexed_at" in columns:
+                self._conn.execute(f'CREATE INDEX "{table}_indexed_at" ON "{table}" (indexed_at, stream_id)')
+            self._tables[table] = columns
+
+    def insert_rows(self, table: str, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        columns = list(rows[0])
+        statement = (
+            f'INSERT OR REPLACE INTO "{table}" ({", ".join(map(_quote, columns))}) '
+            f'VALUES ({", ".join("?" for _ in columns)})'
+        )
+        with self._lock:
+            self._conn.executemany(statement, [[row[c] for c in columns] for row in rows])
+
+    def execute(self, query: str, params: List[Any]) -> List[Dict[str, Any]]:
+        with self._lock:
+            self.queries += 1
+            rows = self._conn.execute(query, {str(i): p for i, p in enumerate(params, start=1)}).fetchall()
+        return [dict(row) for row in rows]
+
+    # Ceramic side
+
+    def add_model(self, model_id: str = PAGEVIEW_MODEL, definition: Optional[Dict[str, Any]] = None) -> str:
+        """Register a model stream and create its table (stream_id, controller, indexed_at + schema fields)"""
+        definition = definition or PAGEVIEW_DEFINITION
+        self.streams[model_id] = {
+            "type": 2,
+            "content": definition,
+            "metadata": {"controllers": []},
+            "log": [{"cid": _cid(definition), "type": 0}],
+            "anchorStatus": "ANCHORED",
+        }
+        fields = list(definition["schema"]["properties"])
+        self.create_table(model_id, ["stream_id", "controller", "indexed_at", *fields])
+        return model_id
+
+    def create_stream(self, genesis: Dict[str, Any]) -> str:
+        payload, cid = _decode_commit(genesis)
+        header = payload.get("header", {})
+        model = header.get("model")
+        model = "k" + base36.encode(model if isinstance(model, bytes) else b64decode(model)).lower() if model else None
+        stream_id = stream_id_from_genesis(3, genesis)
+        with self._lock:
+            self.commits[cid] = genesis
+            # Creating a stream again from the same genesis commit returns the existing stream
+            self.streams.setdefault(stream_id, {
+                "type": 3,
+                "content": payload.get("data"),
+                "metadata": {"controllers": header.get("controllers", []), "model": model},
+                "log": [{"cid": cid, "type": 0}],
+                "anchorStatus": "PENDING",
+            })
+        self._index(stream_id)
+        return stream_id
+
+    def apply_commit(self, stream_id: str, commit: Dict[str, Any]) -> Dict[str, Any]:
+        payload, cid = _decode_commit(commit)
+        with self._lock:
+            state = self.streams[stream_id]
+            if any(entry["cid"] == cid for entry in state["log"]):
+                # Already applied, e.g. a retry after a lost response
+                return state
+            if CID.decode(str(payload["prev"])) != CID.decode(state["log"][-1]["cid"]):
+                raise ValueError(f"Commit {cid} does not build on the tip of {stream_id}")
+            state["content"] = jsonpatch.apply_patch(state["content"] or {}, payload["data"])
+            self.commits[cid] = commit
+            state["log"].append({"cid": cid, "type": 1})
+            state["anchorStatus"] = "PENDING"
+        self._index(stream_id)
+        return state
+
+    def _index(self, stream_id: str) -> None:
+        state = self.streams[stream_id]
+        table = state["metadata"].get("model")
+        if table not in self._tables or not state["content"]:
+            return
+        row = {column: None for column in self._tables[table]}
+        row.update({k: v for k, v in state["content"].items() if k in row})
+        row.update(stream_id=stream_id, controller=(state["metadata"]["controllers"] or [None])[0], indexed_at=_now())
+        self.insert_rows(table, [row])
+
+    def anchor_all(self) -> None:
+        """Mark every stream as anchored"""
+        with self._lock:
+            for state in self.streams.values():
+                state["anchorStatus"] = "ANCHORED"
+
+    # HTTP
+
+    def _enter(self) -> bool:
+        """Wait for a free slot. False when the queue is full and the request is refused"""
+        if self._slots is None:
+            return True
+        with self._lock:
+            if self.max_queue is not None and self._waiting >= self.max_queue:
+                self.rejected += 1
+                return False
+            self._waiting += 1
+        self._slots.acquire()
+        with self._lock:
+            self._waiting -= 1
+        return True
+
+    def _leave(self) -> None:
+        if self._slots is not None:
+            self._slots.release()
+
+    def handle(self, method: str, path: str, body: Optional[Dict[str, Any]]) -> Tuple[int, Any, int]:
+        """Route a request. Returns (status, payload, rows returned)"""
+        route = f"{method} {re.sub(r'/k[0-9a-z]+$', '/{id}', path)}"
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+        if path == "/api/db/query/json":
+            raw = body["jsonQuery"]["$raw"]
+            rows = self.execute(raw["query"], raw.get("params", []))
+            return 200, {"data": rows}, len(rows)
+        if method == "POST" and path == "/api/v0/streams":
+            stream_id = self.create_stream(body["genesis"])
+            return 200, {"streamId": stream_id, "state": self.streams[stream_id]}, 0
+        if method == "POST" and path == "/api/v0/commits":
+            return 200, {"streamId": body["streamId"], "state": self.apply_commit(body["streamId"], body["commit"])}, 0
+        if method == "POST" and path == "/api/v0/multiqueries":
+            found = {q["streamId"]: self.streams[q["streamId"]] for q in body["queries"] if q["streamId"] in self.streams}
+            return 200, found, 0
+
+        match = re.match(r"^/api/v0/(streams|commits)/(\w+)$", path)
+        if method == "GET" and match:
+            kind, stream_id = match.groups()
+            state = self.streams.get(stream_id)
+            if state is None:
+                return 404, {"error": f"Stream {stream_id} not found"}, 0
+            if kind == "streams":
+                return 200, {"streamId": stream_id, "state": state}, 0
+            commits = [{"cid": entry["cid"], "value": self.commits.get(entry["cid"])} for entry in state["log"]]
+            return 200, {"streamId": stream_id, "commits": commits}, 0
+        return 404, {"error": f"No route for {method} {path}"}, 0
+
+    def start(self, port: int = 0) -> str:
+        """Serve in a background thread. Returns the base URL to pass as both endpoints"""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _serve(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                if stub._enter():
+                    try:
+                        try:
+                            status, payload, rows = stub.handle(method, self.path.split("?")[0], body)
+                        except (sqlite3.Error, ValueError, KeyError) as e:
+                            status, payload, rows = 400, {"error": str(e)}, 0
+                        delay = stub.latency + stub.row_latency * rows
+                        if delay:
+                            time.sleep(delay)
+                    finally:
+                        stub._leave()
+                else:
+                    status, payload = 503, {"error": "Node overloaded"}
+                data = json.dumps(payload, default=str).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 256
+
+        self._server = Server(("127.0.0.1", port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
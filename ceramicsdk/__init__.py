@@ -1,2 +1,3 @@
 from .orbis_python.orbis_db import OrbisDB
+from .orbis_python.cache import QueryCache
 from .ceramic_python.ceramic_client import CeramicClient
\ No newline at end of file
@@ -1,3 +1,9 @@
 from .ceramic_client import CeramicClient
 from .did import DID
 from .model_instance_document import ModelInstanceDocument, ModelInstanceDocumentMetadata, ModelInstanceDocumentMetadataArgs
+from .outbox import Outbox, OutboxDrainer
+from .limiter import AdaptiveLimiter, LimitedSession, TokenBucket
+from .anchors import AnchorTracker
+from .blocks import BlockStore
+from .car import CarReader, CarWriter, export_streams, import_car
+from .history import StreamHistory
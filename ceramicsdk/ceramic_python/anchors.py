@@ -0,0 +1,225 @@
+# ceramic/anchors.py
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+ANCHORED = "ANCHORED"
+FAILED = "FAILED"
+# The anchor status of a stream does not change again once it reaches one of these
+FINAL_STATUSES = frozenset({ANCHORED, FAILED})
+
+AnchorCallback = Callable[[str, Optional[str], Optional[Dict[str, Any]]], None]
+
+
+class _Tracked:
+    __slots__ = ("stream_id", "future", "callbacks", "status", "deadline")
+
+    def __init__(self, stream_id: str, deadline: Optional[float]) -> None:
+        self.stream_id = stream_id
+        self.future: Future = Future()
+        self.callbacks: List[AnchorCallback] = []
+        self.status: Optional[str] = None
+        self.deadline = deadline
+
+
+class _Window:
+    """Streams registered in the same `window` seconds, polled together"""
+
+    __slots__ = ("key", "streams", "delay", "due")
+
+    def __init__(self, key: int, delay: float, due: float) -> None:
+        self.key = key
+        self.streams: Dict[str, _Tracked] = {}
+        self.delay = delay
+        self.due = due
+
+
+class AnchorTracker:
+    """Follows the anchor status of many streams with batched multiqueries
+
+    `track` registers a stream and returns a future that resolves with the
+    stream state once its anchor status is final (`ANCHORED` or `FAILED`).
+    The optional callback is called with (stream ID, status, state) each time
+    the status changes. Polling happens on one background thread, started
+    with the first registration.
+
+    Streams written around the same time are usually anchored in the same
+    batch, so streams registered within `window` seconds of each other are
+    grouped and polled together. A group is first polled `initial_delay`
+    seconds after it was created. The delay then grows by `factor` after each
+    poll, up to `max_delay`. When some streams of a group become anchored, the
+    rest are polled again after `initial_delay`. Groups that come due within
+    `window` seconds of each other share a poll, and each poll sends one
+    multiquery per `batch_size` streams. Streams still not final after
+    `timeout` seconds fail their future with TimeoutError.
+
+    Example:
+        tracker = AnchorTracker(db.ceramic_client)
+        futures = tracker.track_many(stream_ids, callback=lambda stream_id, status, state: print(stream_id, status))
+        states = [future.result() for future in futures]
+    """
+
+    def __init__(
+        self,
+        ceramic_client,
+        batch_size: int = 200,
+        initial_delay: float = 10.0,
+        max_delay: float = 300.0,
+        factor: float = 2.0,
+        window: float = 5.0,
+        timeout: Optional[float] = None,
+    ) -> None:
+        if factor < 1:
+            raise ValueError("AnchorTracker factor must be at least 1")
+        self.ceramic_client = ceramic_client
+        self.batch_size = batch_size
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.window = window
+        self.timeout = timeout
+        self.polls = 0
+        self.queries = 0
+        self._streams: Dict[str, _Tracked] = {}
+        self._windows: Dict[int, _Window] = {}
+        # (due, sequence, window key); stale entries are skipped when popped
+        self._schedule: List[tuple] = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._streams)
+
+    def track(self, stream_id: str, callback: Optional[AnchorCallback] = None) -> Future:
+        """Follow `stream_id` until its anchor status is final. Tracking a stream twice returns the same future"""
+        now = time.monotonic()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("AnchorTracker is closed")
+            tracked = self._streams.get(stream_id)
+            if tracked is None:
+                tracked = _Tracked(stream_id, now + self.timeout if self.timeout is not None else None)
+                self._streams[stream_id] = tracked
+                key = int(now // self.window) if self.window else next(self._sequence)
+                window = self._windows.get(key)
+                if window is None:
+                    window = self._windows[key] = _Window(key, self.initial_delay, now + self.initial_delay)
+                    self._push(window)
+                window.streams[stream_id] = tracked
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="anchor-tracker", daemon=True)
+                    self._thread.start()
+            if callback is not None:
+                tracked.callbacks.append(callback)
+        return tracked.future
+
+    def track_many(self, stream_ids: Iterable[str], callback: Optional[AnchorCallback] = None) -> List[Future]:
+        return [self.track(stream_id, callback) for stream_id in stream_ids]
+
+    def close(self) -> None:
+        """Stop polling. Futures that are not resolved yet are cancelled"""
+        with self._cond:
+            self._closed = True
+            tracked = list(self._streams.values())
+            self._streams.clear()
+            self._windows.clear()
+            self._cond.notify_all()
+        for entry in tracked:
+            entry.future.cancel()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _push(self, window: _Window) -> None:
+        heapq.heappush(self._schedule, (window.due, next(self._sequence), window.key))
+        self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed:
+                    now = time.monotonic()
+                    while self._schedule and self._stale(self._schedule[0]):
+                        heapq.heappop(self._schedule)
+                    if self._schedule and self._schedule[0][0] <= now:
+                        break
+                    self._cond.wait(self._schedule[0][0] - now if self._schedule else None)
+                if self._closed:
+                    return
+                # Windows coming due soon ride along with this poll instead of triggering their own
+                due = []
+                while self._schedule and self._schedule[0][0] <= now + self.window:
+                    entry = heapq.heappop(self._schedule)
+                    if not self._stale(entry):
+                        due.append(self._windows[entry[2]])
+                stream_ids = [stream_id for window in due for stream_id in window.streams]
+            states = self._query(stream_ids)
+            self._apply(due, states)
+
+    def _stale(self, entry: tuple) -> bool:
+        window = self._windows.get(entry[2])
+        return window is None or window.due != entry[0]
+
+    def _query(self, stream_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """State of each stream, None for streams the node did not return or could not be asked about"""
+        self.polls += 1
+        states: Dict[str, Optional[Dict[str, Any]]] = {}
+        for start in range(0, len(stream_ids), self.batch_size):
+            batch = stream_ids[start:start + self.batch_size]
+            self.queries += 1
+            try:
+                states.update(self.ceramic_client.multi_query(batch))
+            except Exception as e:
+                logging.warning(f"Anchor status poll of {len(batch)} streams failed: {e}")
+        return states
+
+    def _apply(self, windows: List[_Window], states: Dict[str, Optional[Dict[str, Any]]]) -> None:
+        now = time.monotonic()
+        changes, finished, timed_out = [], [], []
+        with self._cond:
+            for window in windows:
+                if self._windows.get(window.key) is not window:
+                    continue
+                anchored = False
+                for stream_id, tracked in list(window.streams.items()):
+                    state = states.get(stream_id)
+                    status = state.get("anchorStatus") if state else None
+                    if status is not None and status != tracked.status:
+                        tracked.status = status
+                        changes.append((tracked, status, state))
+                    if status in FINAL_STATUSES:
+                        anchored = anchored or status == ANCHORED
+                        finished.append((tracked, state))
+                    elif tracked.deadline is not None and now >= tracked.deadline:
+                        timed_out.append(tracked)
+                    else:
+                        continue
+                    del window.streams[stream_id]
+                    del self._streams[stream_id]
+                if not window.streams:
+                    del self._windows[window.key]
+                    continue
+                # The rest of an anchor batch usually lands shortly after the first streams of it
+                window.delay = self.initial_delay if anchored else min(self.max_delay, window.delay * self.factor)
+                window.due = now + window.delay
+                self._push(window)
+        for tracked, status, state in changes:
+            for callback in tracked.callbacks:
+                try:
+                    callback(tracked.stream_id, status, state)
+                except Exception as e:
+                    logging.error(f"Anchor callback for {tracked.stream_id} failed: {e}")
+        for tracked, state in finished:
+            if not tracked.future.done():
+                tracked.future.set_result(state)
+        for tracked in timed_out:
+            if not tracked.future.done():
+                tracked.future.set_exception(TimeoutError(f"{tracked.stream_id} not anchored after {self.timeout}s"))
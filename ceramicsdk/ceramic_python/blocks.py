@@ -0,0 +1,225 @@
+# ceramic/blocks.py
+
+import logging
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from multiformats import CID
+
+from .helper import format_cid, parse_cid, verify_block
+
+
+MAGIC = b"CBLK\x01\x00\x00\x00"
+# Length of the binary CID and of the block that follow
+RECORD_HEADER = struct.Struct(">HI")
+SEGMENT_SUFFIX = ".blk"
+
+
+class _Segment:
+    def __init__(self, path: str, number: int) -> None:
+        self.path = path
+        self.number = number
+        self.size = 0
+        self.cids: Set[bytes] = set()
+        self.map: Optional[mmap.mmap] = None
+
+    def read(self, offset: int, length: int) -> bytes:
+        if self.map is None or len(self.map) < offset + length:
+            # The segment being appended to is mapped again once it outgrows the current map
+            if self.map is not None:
+                self.map.close()
+            with open(self.path, "rb") as file:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map[offset:offset + length]
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+
+class BlockStore:
+    """Local content-addressed store of immutable blocks (commits and their linked payloads), keyed by CID
+
+    Blocks are appended to segment files of about `segment_bytes` in
+    `directory` and read back through memory maps. An in-memory index maps
+    each CID to its segment and offset. It is rebuilt from the segment
+    headers when the store is opened. Every read hashes the block again and
+    drops it if it does not match its CID, so a corrupt file costs a
+    refetch, never a wrong commit.
+
+    The store keeps at most `max_bytes` on disk. Once it is over, the oldest
+    segment is deleted as a whole. Blocks read from the oldest quarter of the
+    segments are copied to the newest one first, so blocks in use survive and
+    the least recently used ones go (an LRU approximation that never rewrites
+    a segment in place).
+
+    Example:
+        blocks = BlockStore("blocks", max_bytes=256 << 20)
+        client = CeramicClient(url, did, blocks=blocks)
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 << 20, segment_bytes: int = 8 << 20) -> None:
+        if segment_bytes > max_bytes:
+            raise ValueError("BlockStore segment_bytes cannot exceed max_bytes")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.hits = 0
+        self.misses = 0
+        self.corrupt = 0
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # CID -> (segment, offset of the block, length)
+        self._index: Dict[bytes, Tuple[_Segment, int, int]] = {}
+        self._segments: List[_Segment] = []
+        self._file = None
+        self._load()
+
+    def _load(self) -> None:
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        for name in names:
+            segment = _Segment(os.path.join(self.directory, name), int(name[:-len(SEGMENT_SUFFIX)]))
+            self._segments.append(segment)
+            with open(segment.path, "rb") as file:
+                data = file.read()
+            if len(data) < len(MAGIC) and MAGIC.startswith(data):
+                # Created right before a crash
+                with open(segment.path, "wb") as file:
+                    file.write(MAGIC)
+                data = MAGIC
+            if not data.startswith(MAGIC):
+                raise ValueError(f"{segment.path} is not a block store segment")
+            offset = len(MAGIC)
+            while offset + RECORD_HEADER.size <= len(data):
+                cid_length, length = RECORD_HEADER.unpack_from(data, offset)
+                start = offset + RECORD_HEADER.size + cid_length
+                if start + length > len(data):
+                    break
+                self._add(bytes(data[offset + RECORD_HEADER.size:start]), segment, start, length)
+                offset = start + length
+            if offset < len(data):
+                logging.warning(f"Dropping a torn block at the end of {segment.path}")
+                with open(segment.path, "r+b") as file:
+                    file.truncate(offset)
+            segment.size = offset
+        if self._segments:
+            self._file = open(self._segments[-1].path, "ab")
+        else:
+            self._new_segment()
+
+    def _new_segment(self) -> None:
+        number = self._segments[-1].number + 1 if self._segments else 0
+        segment = _Segment(os.path.join(self.directory, f"{number:012d}{SEGMENT_SUFFIX}"), number)
+        if self._file is not None:
+            self._file.close()
+        self._file = open(segment.path, "ab")
+        self._file.write(MAGIC)
+        segment.size = len(MAGIC)
+        self._segments.append(segment)
+
+    def _add(self, cid: bytes, segment: _Segment, offset: int, length: int) -> None:
+        previous = self._index.get(cid)
+        if previous is not None:
+            previous[0].cids.discard(cid)
+        self._index[cid] = (segment, offset, length)
+        segment.cids.add(cid)
+
+    @property
+    def size(self) -> int:
+        """Bytes on disk"""
+        with self._lock:
+            return sum(segment.size for segment in self._segments)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, cid: Union[str, bytes, CID]) -> bool:
+        return parse_cid(cid) in self._index
+
+    def __iter__(self) -> Iterator[bytes]:
+        with self._lock:
+            return iter(list(self._index))
+
+    def put(self, cid: Union[str, bytes, CID], data: bytes) -> bool:
+        """Store a block. Returns False, storing nothing, when `data` does not hash to `cid`"""
+        cid = parse_cid(cid)
+        if not verify_block(cid, data):
+            logging.debug(f"Not storing block {format_cid(cid)}, it does not match its CID")
+            return False
+        with self._lock:
+            if cid not in self._index:
+                self._append(cid, bytes(data))
+        return True
+
+    def _append(self, cid: bytes, data: bytes) -> None:
+        segment = self._segments[-1]
+        if segment.size >= self.segment_bytes:
+            self._new_segment()
+            segment = self._segments[-1]
+        self._file.write(RECORD_HEADER.pack(len(cid), len(data)) + cid + data)
+        self._file.flush()
+        offset = segment.size + RECORD_HEADER.size + len(cid)
+        segment.size = offset + len(data)
+        self._add(cid, segment, offset, len(data))
+        self._evict()
+
+    def _evict(self) -> None:
+        total = sum(segment.size for segment in self._segments)
+        while total > self.max_bytes and len(self._segments) > 1:
+            segment = self._segments.pop(0)
+            total -= segment.size
+            for cid in segment.cids:
+                del self._index[cid]
+            segment.close()
+            os.remove(segment.path)
+
+    def get(self, cid: Union[str, bytes, CID]) -> Optional[bytes]:
+        """The block stored under `cid`, or None"""
+        cid = parse_cid(cid)
+        with self._lock:
+            entry = self._index.get(cid)
+            if entry is None:
+                self.misses += 1
+                return None
+            segment, offset, length = entry
+            data = segment.read(offset, length)
+            old = self._segments.index(segment) < max(1, len(self._segments) // 4)
+        if not verify_block(cid, data):
+            logging.warning(f"Block in {segment.path} at {offset} does not match its CID, dropping it")
+            with self._lock:
+                if self._index.get(cid) is entry:
+                    del self._index[cid]
+                    segment.cids.discard(cid)
+                self.corrupt += 1
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            # Copy blocks still in use out of the segments that are evicted next
+            if old and len(self._segments) > 1 and self._index.get(cid) is entry:
+                self._append(cid, data)
+        return data
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"blocks": len(self._index), "bytes": sum(segment.size for segment in self._segments),
+                    "segments": len(self._segments), "hits": self.hits, "misses": self.misses,
+                    "corrupt": self.corrupt}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            for segment in self._segments:
+                segment.close()
+
+    def __enter__(self) -> "BlockStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
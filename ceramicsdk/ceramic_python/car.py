@@ -0,0 +1,346 @@
+# ceramic/car.py
+
+import hashlib
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import dag_cbor
+from multiformats import CID, varint
+
+from .ceramic_client import CeramicClient
+from .helper import DAG_JOSE_CODEC_CODE, commit_blocks, commit_from_blocks, format_cid, parse_cid, verify_block
+
+
+# Archives smaller than this are verified in the calling process, a worker pool costs more than it saves
+PARALLEL_VERIFY_BYTES = 4 << 20
+# Every commit but the last is replayed without requesting an anchor, the tip anchors the whole imported history
+IMPORT_OPTS = {"anchor": False, "publish": True, "sync": 0}
+IMPORT_TIP_OPTS = {"anchor": True, "publish": True, "sync": 0}
+
+
+def _read_varint(buffer, offset: int) -> Tuple[int, int]:
+    """Decode the unsigned varint at `offset`. Returns (value, offset after it)"""
+    value, shift = 0, 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _cid_length(buffer, offset: int) -> int:
+    if buffer[offset] == 0x12 and buffer[offset + 1] == 0x20:
+        # CIDv0, a bare sha2-256 multihash
+        return 34
+    end = offset
+    for _ in range(3):  # version, codec, hash function
+        _, end = _read_varint(buffer, end)
+    size, end = _read_varint(buffer, end)
+    return end + size - offset
+
+
+def _sections(buffer, offset: int, end: int) -> Iterator[Tuple[int, bytes, int, int]]:
+    """(section offset, CID, block offset, block length) of the sections between `offset` and `end`"""
+    while offset < end:
+        section_length, start = _read_varint(buffer, offset)
+        cid_length = _cid_length(buffer, start)
+        yield offset, bytes(buffer[start:start + cid_length]), start + cid_length, section_length - cid_length
+        offset = start + section_length
+
+
+def _verify(cid: bytes, data) -> bool:
+    if cid[:2] == b"\x12\x20":
+        return hashlib.sha256(data).digest() == cid[2:]
+    return verify_block(cid, data)
+
+
+def _verify_range(path: str, start: int, end: int) -> List[bytes]:
+    """CIDs of the blocks between `start` and `end` that do not match their hash. Runs in worker processes"""
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        return [cid for _, cid, offset, length in _sections(buffer, start, end)
+                if not _verify(cid, buffer[offset:offset + length])]
+
+
+class CarWriter:
+    """Writes a CARv1 archive: a dag-cbor header naming the root CIDs, then one (CID, block) section per block
+
+    Without `roots`, the roots are named with `add_root` while the blocks are
+    written, e.g. once it is known which of them made it into the archive.
+    The blocks then go to a temporary file next to `path` and are copied
+    behind the header on close.
+
+    Example:
+        with CarWriter("streams.car", [tip_cid]) as car:
+            for cid, data in commit_blocks(commit):
+                car.put(cid, data)
+    """
+
+    def __init__(self, path: str, roots: Optional[Iterable[bytes]] = None) -> None:
+        self.path = path
+        self.blocks = 0
+        self.bytes = 0
+        self._written: Set[bytes] = set()
+        self._roots: Optional[List[bytes]] = None
+        if roots is None:
+            self._roots = []
+            self._file = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path)))
+        else:
+            self._file = open(path, "wb")
+            self._write(self._header(roots))
+
+    @staticmethod
+    def _header(roots: Iterable[bytes]) -> bytes:
+        header = dag_cbor.encode({"roots": [CID.decode(parse_cid(root)) for root in roots], "version": 1})
+        return varint.encode(len(header)) + header
+
+    def add_root(self, root: bytes) -> None:
+        """Name `root` in the header written on close"""
+        if self._roots is None:
+            raise ValueError("The roots of this CarWriter were given when it was opened")
+        self._roots.append(parse_cid(root))
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self.bytes += len(data)
+
+    def put(self, cid: bytes, data: bytes) -> None:
+        """Append a block. Blocks already in the archive are skipped"""
+        if cid in self._written:
+            return
+        self._written.add(cid)
+        self._write(varint.encode(len(cid) + len(data)) + cid + data)
+        self.blocks += 1
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        if self._roots is not None:
+            header = self._header(self._roots)
+            with open(self.path, "wb") as file:
+                file.write(header)
+                self._file.seek(0)
+                shutil.copyfileobj(self._file, file, 1 << 20)
+            self.bytes += len(header)
+        self._file.close()
+
+    def __enter__(self) -> "CarWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class CarReader:
+    """Reads a CARv1 archive through a memory map
+
+    Opening it walks the section headers once to index where each block
+    starts, blocks are then sliced out of the map on demand. `verify` hashes
+    every block again, split over worker processes for large archives.
+
+    Example:
+        with CarReader("streams.car") as car:
+            corrupt = car.verify()
+            data = car.get(car.roots[0])
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "rb")
+        self.map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header_length, offset = _read_varint(self.map, 0)
+        header = dag_cbor.decode(self.map[offset:offset + header_length])
+        if not isinstance(header, dict) or header.get("version") != 1:
+            raise ValueError(f"{path} is not a CARv1 archive")
+        self.roots = [bytes(root) for root in header["roots"]]
+        # Section offsets in file order, where the verification ranges are cut
+        self.sections: List[int] = []
+        # CID -> (offset of the block, length)
+        self.index: Dict[bytes, Tuple[int, int]] = {}
+        for section, cid, start, length in _sections(self.map, offset + header_length, len(self.map)):
+            self.sections.append(section)
+            self.index[cid] = (start, length)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, cid: bytes) -> bool:
+        return cid in self.index
+
+    def get(self, cid: bytes) -> Optional[bytes]:
+        entry = self.index.get(cid)
+        return None if entry is None else self.map[entry[0]:entry[0] + entry[1]]
+
+    def verify(self, processes: Optional[int] = None) -> Set[bytes]:
+        """CIDs of the blocks that do not hash to their CID
+
+        The sections are split into one range per process. `processes=0`
+        verifies in this process, the default uses one process per CPU for
+        archives over PARALLEL_VERIFY_BYTES.
+        """
+        if processes is None:
+            processes = 0 if len(self.map) < PARALLEL_VERIFY_BYTES else os.cpu_count() or 1
+        if processes <= 1 or len(self.sections) < 2:
+            return set(_verify_range(self.path, self.sections[0], len(self.map))) if self.sections else set()
+        step = -(-len(self.sections) // processes)
+        bounds = self.sections[::step] + [len(self.map)]
+        with ProcessPoolExecutor(processes) as pool:
+            results = pool.map(_verify_range, [self.path] * (len(bounds) - 1), bounds[:-1], bounds[1:])
+            return {cid for bad in results for cid in bad}
+
+    def close(self) -> None:
+        self.map.close()
+        self._file.close()
+
+    def __enter__(self) -> "CarReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _payload(cid: bytes, get) -> Optional[Dict[str, Any]]:
+    """Decoded payload of a commit block: the linked block of a signed commit, the block itself otherwise"""
+    data = get(cid)
+    if data is None:
+        return None
+    block = dag_cbor.decode(data)
+    codec, _, _ = varint.decode_raw(cid[1:])
+    if codec != DAG_JOSE_CODEC_CODE:
+        return block
+    linked = get(bytes(block["payload"]))
+    return None if linked is None else dag_cbor.decode(linked)
+
+
+def export_streams(ceramic_client: CeramicClient, stream_ids: Iterable[str], path: str, concurrency: int = 8,
+                   batch_size: int = 100) -> Dict[str, Any]:
+    """Write the commit history of `stream_ids` to a CARv1 archive at `path`
+
+    The archive holds every commit of each stream (genesis, updates and
+    anchor commits, signed commits with their linked payload block) and
+    names the tip commit of each exported stream as a root. States are loaded with
+    one multiquery per `batch_size` streams and histories with `concurrency`
+    parallel requests, read from the client's block store when it has them.
+    Streams whose history cannot be re-encoded to the CIDs the node reports
+    are left out and listed under "failed".
+    """
+    started = time.perf_counter()
+    stream_ids = list(dict.fromkeys(stream_ids))
+    states = {}
+    for i in range(0, len(stream_ids), batch_size):
+        states.update(ceramic_client.multi_query(stream_ids[i:i + batch_size]))
+    failed = {stream_id: "not found" for stream_id in stream_ids if not (states.get(stream_id) or {}).get("log")}
+    logs = {stream_id: [str(entry["cid"]) for entry in states[stream_id]["log"]]
+            for stream_id in stream_ids if stream_id not in failed}
+
+    def load(stream_id: str) -> List[Tuple[bytes, bytes]]:
+        blocks = []
+        for cid, commit in ceramic_client.load_commits(stream_id, logs[stream_id]):
+            if commit is None:
+                raise ValueError(f"commit {cid} is not available")
+            encoded = commit_blocks(commit)
+            if encoded[0][0] != parse_cid(cid):
+                raise ValueError(f"commit {cid} does not re-encode to its CID")
+            blocks.extend(encoded)
+        return blocks
+
+    exported = 0
+    workers = max(1, concurrency)
+    remaining = iter(logs)
+    # Roots are named once the histories are written, so streams that failed are not listed
+    with ThreadPoolExecutor(workers) as pool, CarWriter(path) as car:
+        # At most twice `concurrency` loaded histories are held at once; the next stream is
+        # submitted as each one is written
+        futures = {pool.submit(load, stream_id): stream_id for stream_id in islice(remaining, 2 * workers)}
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                stream_id = futures.pop(future)
+                for next_id in islice(remaining, 1):
+                    futures[pool.submit(load, next_id)] = next_id
+                try:
+                    blocks = future.result()
+                except Exception as e:
+                    failed[stream_id] = str(e)
+                    continue
+                for cid, data in blocks:
+                    car.put(cid, data)
+                exported += 1
+        for stream_id, log in logs.items():
+            if stream_id not in failed:
+                car.add_root(parse_cid(log[-1]))
+    if failed:
+        logging.warning(f"{len(failed)} streams were not exported to {path}")
+    return {"streams": exported, "blocks": car.blocks, "bytes": car.bytes,
+            "seconds": time.perf_counter() - started, "failed": failed}
+
+
+def import_car(ceramic_client: CeramicClient, path: str, concurrency: int = 8, processes: Optional[int] = None,
+               stream_type: int = 3) -> Dict[str, Any]:
+    """Replay the streams of a CARv1 archive written by `export_streams` on the client's node
+
+    Every block is verified against its CID first (see `CarReader.verify`
+    for `processes`). Each root is then followed back through the `prev`
+    links of its commits to the genesis commit, and the stream is created
+    from the genesis and its updates applied in order. Anchor commits are
+    not replayed, the node anchors the imported tip itself. Streams are
+    replayed `concurrency` at a time, the commits of one stream one after
+    the other. Verified blocks are also kept in the client's block store
+    when it has one. Streams whose history is incomplete, corrupt or refused
+    by the node are listed under "failed" by their tip CID.
+    """
+    started = time.perf_counter()
+    with CarReader(path) as car:
+        corrupt = car.verify(processes)
+
+        def get(cid: bytes) -> Optional[bytes]:
+            return None if cid in corrupt else car.get(cid)
+
+        def chain(root: bytes) -> List[Dict[str, Any]]:
+            commits, cid = [], root
+            while cid is not None:
+                payload = _payload(cid, get)
+                commit = commit_from_blocks(cid, get)
+                if payload is None or commit is None:
+                    raise ValueError(f"block {format_cid(cid)} is missing or corrupt")
+                if "proof" not in payload:
+                    commits.append(commit)
+                cid = bytes(payload["prev"]) if payload.get("prev") is not None else None
+            return commits[::-1]
+
+        def replay(root: bytes) -> Tuple[str, int]:
+            genesis, *updates = chain(root)
+            stream_id = ceramic_client.create_stream_from_genesis(
+                stream_type, genesis, IMPORT_TIP_OPTS if not updates else IMPORT_OPTS)
+            for n, commit in enumerate(updates, start=1):
+                ceramic_client.apply_commit(stream_id, commit, IMPORT_TIP_OPTS if n == len(updates) else IMPORT_OPTS)
+            return stream_id, len(updates) + 1
+
+        stream_ids, commits, failed = [], 0, {}
+        with ThreadPoolExecutor(max(1, concurrency)) as pool:
+            futures = {pool.submit(replay, root): root for root in dict.fromkeys(car.roots)}
+            for future in as_completed(futures):
+                try:
+                    stream_id, count = future.result()
+                except Exception as e:
+                    failed[format_cid(futures[future])] = str(e)
+                    continue
+                stream_ids.append(stream_id)
+                commits += count
+        if ceramic_client.blocks is not None:
+            for cid in car.index:
+                if cid not in corrupt and cid[:1] == b"\x01":
+                    ceramic_client.blocks.put(cid, car.get(cid))
+        if failed:
+            logging.warning(f"{len(failed)} streams of {path} were not imported")
+        return {"streams": len(stream_ids), "commits": commits, "blocks": len(car), "bytes": len(car.map),
+                "corrupt": len(corrupt), "seconds": time.perf_counter() - started, "stream_ids": stream_ids,
+                "failed": failed}
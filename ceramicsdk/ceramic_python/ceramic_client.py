@@ -1,18 +1,31 @@
 # ceramic/ceramic_client.py
 
 import requests
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 import logging
 
+from .blocks import BlockStore
+from .helper import commit_blocks, commit_from_blocks, parse_cid
+from .history import StreamHistory
+from .metrics import timed
+
 # Configure logging
 logging.basicConfig(level=logging.ERROR)
 
 
 class CeramicClient:
-    def __init__(self, url: str, did):
+    def __init__(self, url: str, did, session: Optional[requests.Session] = None, blocks: Optional[BlockStore] = None,
+                 history: Optional[StreamHistory] = None):
         self.url = url.rstrip("/")
         self.did = did
+        # Reuse connections across calls; pass a shared session to pool them between clients
+        self.session = session or requests.Session()
+        # Optional local store of commit blocks, commits are immutable once written
+        self.blocks = blocks
+        # Snapshots of past stream content for reads at a commit or time, see `ModelInstanceDocument.load`
+        self.history = history if history is not None else StreamHistory()
 
+    @timed("stream_create")
     def create_stream_from_genesis(
         self, stream_type_id: int, commit: Dict[str, Any], opts: Dict[str, Any]
     ) -> str:
@@ -22,7 +35,7 @@ class CeramicClient:
             "opts": opts,
         }
         try:
-            response = requests.post(f"{self.url}/api/v0/streams", json=payload, timeout=5)
+            response = self.session.post(f"{self.url}/api/v0/streams", json=payload, timeout=5)
             logging.debug(f"Request URL: {f'{self.url}/api/v0/streams'}")
             logging.debug(f"Request Data: {payload}")
             logging.debug(f"Response Status Code: {response.status_code}")
@@ -37,9 +50,10 @@ class CeramicClient:
             logging.error(error_message)
             raise Exception(error_message) from e
 
+    @timed("state_fetch")
     def get_stream_state(self, stream_id: str) -> Dict[str, Any]:
         try:
-            response = requests.get(f"{self.url}/api/v0/streams/{stream_id}")
+            response = self.session.get(f"{self.url}/api/v0/streams/{stream_id}")
             response.raise_for_status()
             res = response.json()
             return res.get("state")
@@ -51,23 +65,61 @@ class CeramicClient:
             raise Exception(error_message) from e
 
     def get_stream_commits(self, stream_id: str) -> Dict[str, Any]:
+        commits = self._fetch_commits(stream_id)
+        genesis_cid_str = commits[0]["cid"]
+        previous_cid_str = commits[-1]["cid"]
+        return genesis_cid_str, previous_cid_str
+
+    def load_commits(self, stream_id: str, log: Optional[List[str]] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """(CID, commit) of every commit of a stream, oldest first
+
+        With a block store and `log`, the stream's commit CIDs as listed in its
+        state, the commits are read from the store and the node is only asked
+        when one of them is missing.
+        """
+        if self.blocks is not None and log is not None:
+            commits = []
+            for cid in log:
+                commit = commit_from_blocks(parse_cid(str(cid)), self.blocks.get)
+                if commit is None:
+                    break
+                commits.append((str(cid), commit))
+            else:
+                return commits
+        return [(str(entry["cid"]), entry.get("value")) for entry in self._fetch_commits(stream_id)]
+
+    @timed("commit_log_fetch")
+    def _fetch_commits(self, stream_id: str) -> List[Dict[str, Any]]:
         try:
-            response = requests.get(f"{self.url}/api/v0/commits/{stream_id}")
+            response = self.session.get(f"{self.url}/api/v0/commits/{stream_id}")
             response.raise_for_status()
-            res = response.json()
-            genesis_cid_str = res["commits"][0]["cid"]
-            previous_cid_str = res["commits"][-1]["cid"]
-            return genesis_cid_str, previous_cid_str
+            commits = response.json()["commits"]
         except requests.exceptions.RequestException as e:
             error_message = f"Error getting stream commits: {str(e)}"
             if response.content:
                 error_message += f"\nResponse body: {response.content.decode('utf-8')}"
             logging.error(error_message)
             raise Exception(error_message) from e
+        if self.blocks is not None:
+            self.store_commits(commits)
+        return commits
+
+    def store_commits(self, commits: List[Dict[str, Any]]) -> None:
+        """Keep the blocks of `{"cid", "value"}` commits in the block store. Blocks that do not match their CID are skipped"""
+        for entry in commits:
+            if entry.get("value") is None or parse_cid(str(entry["cid"])) in self.blocks:
+                continue
+            blocks = commit_blocks(entry["value"])
+            if blocks[0][0] != parse_cid(str(entry["cid"])):
+                logging.debug(f"Commit {entry['cid']} does not re-encode to its CID, not storing it")
+                continue
+            for cid, data in blocks:
+                self.blocks.put(cid, data)
 
+    @timed("state_fetch")
     def load_stream(self, stream_id: str, opts: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            response = requests.get(f"{self.url}/api/v0/streams/{stream_id}")
+            response = self.session.get(f"{self.url}/api/v0/streams/{stream_id}")
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -77,6 +129,7 @@ class CeramicClient:
             logging.error(error_message)
             raise Exception(error_message) from e
 
+    @timed("commit_apply")
     def apply_commit(self, stream_id: str, commit: Dict[str, Any], opts: Dict[str, Any]):
         payload = {
             "streamId": stream_id,
@@ -84,7 +137,7 @@ class CeramicClient:
             "opts": opts,
         }
         try:
-            response = requests.post(f"{self.url}/api/v0/commits", json=payload)
+            response = self.session.post(f"{self.url}/api/v0/commits", json=payload)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -92,4 +145,20 @@ class CeramicClient:
             if response.content:
                 error_message += f"\nResponse body: {response.content.decode('utf-8')}"
             logging.error(error_message)
+            raise Exception(error_message) from e
+
+    @timed("multi_query")
+    def multi_query(self, stream_ids: List[str], opts: Dict[str, Any] = None) -> Dict[str, Dict[str, Any]]:
+        """Load the state of many streams in one request. Streams that cannot be loaded are left out"""
+        payload = {"queries": [{"streamId": stream_id, **(opts or {})} for stream_id in stream_ids]}
+        response = None
+        try:
+            response = self.session.post(f"{self.url}/api/v0/multiqueries", json=payload)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            error_message = f"Error loading streams: {str(e)}"
+            if response is not None and response.content:
+                error_message += f"\nResponse body: {response.content.decode('utf-8')}"
+            logging.error(error_message)
             raise Exception(error_message) from e
\ No newline at end of file
@@ -9,6 +9,7 @@ from cryptography.hazmat.primitives.asymmetric import ed25519
 import os
 from .utils import encode_did
 from .helper import sign_ed25519
+from .metrics import timed
 from multiformats import CID
 
 
@@ -83,6 +84,7 @@ class DID:
     def as_controller(self):
         return self.id
 
+    @timed("sign")
     def create_dag_jws(self, payload: dict) -> dict:
         
         encoded_bytes = dag_cbor.encode(data=payload)
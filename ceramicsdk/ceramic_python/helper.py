@@ -1,15 +1,22 @@
 # ceramic/helper.py
 
+import hashlib
 from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import dag_cbor
+from multiformats import CID, varint
 from multiformats.multibase import base36
-from base64 import urlsafe_b64encode
+from base64 import b32decode, b32encode, b64decode, b64encode, urlsafe_b64encode
 from jwcrypto import jwk, jws
 from jwcrypto.common import json_encode, base64url_encode, base64url_decode
 from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
 from cryptography.hazmat.primitives import serialization
 
 DAG_CBOR_CODEC_CODE = 113
+DAG_JOSE_CODEC_CODE = 0x85
 SHA2_256_CODE = 18
+STREAMID_CODEC_CODE = 0xce
+BASE36_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
 
 
 def encode_cid(
@@ -42,6 +49,11 @@ def base64UrlEncode(data):
     return urlsafe_b64encode(data).rstrip(b"=")
 
 
+def b64decode_unpadded(encoded: str) -> bytes:
+    """Decode standard base64 whose trailing "=" padding may have been stripped"""
+    return b64decode(encoded + "=" * (-len(encoded) % 4))
+
+
 def sign_ed25519(payload: dict, did: str, seed: str):
     """Sign a payload using EdDSA (ed25519)"""
 
@@ -121,4 +133,139 @@ def base36_decode_with_prefix(encoded_str):
     return decoded_bytes
 
 def get_iso_timestamp():
-    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f%z")
\ No newline at end of file
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f%z")
+
+
+def _commit_block(commit: Dict[str, Any]) -> Tuple[int, bytes]:
+    """(codec, encoded block) of a commit: the dag-jose envelope of a signed commit, the dag-cbor genesis otherwise"""
+    if "jws" in commit:
+        jws = commit["jws"]
+        block = {
+            "payload": base64url_decode(jws["payload"]),
+            "signatures": [
+                {"protected": base64url_decode(s["protected"]), "signature": base64url_decode(s["signature"])}
+                for s in jws["signatures"]
+            ],
+        }
+        return DAG_JOSE_CODEC_CODE, dag_cbor.encode(block)
+    # Unsigned commits (anchor commits, unsigned genesis) come from the node in dag-json form
+    return DAG_CBOR_CODEC_CODE, dag_cbor.encode(from_dag_json(commit))
+
+
+def block_cid(data: bytes, codec: int = DAG_CBOR_CODEC_CODE) -> bytes:
+    """Binary CIDv1 of a block, with a sha2-256 multihash"""
+    digest = hashlib.sha256(data).digest()
+    return b"\x01" + varint.encode(codec) + bytes([SHA2_256_CODE, len(digest)]) + digest
+
+
+def _commit_cid_bytes(commit: Dict[str, Any]) -> bytes:
+    codec, data = _commit_block(commit)
+    return block_cid(data, codec)
+
+
+def format_cid(cid: bytes) -> str:
+    """Base32 string form of a binary CID"""
+    return "b" + b32encode(cid).decode().lower().rstrip("=")
+
+
+def parse_cid(cid: Union[str, bytes, CID]) -> bytes:
+    """Binary form of a CID given as a string, a CID object or bytes"""
+    if isinstance(cid, bytes):
+        return cid
+    if isinstance(cid, str) and cid.startswith("b"):
+        encoded = cid[1:].upper()
+        return b32decode(encoded + "=" * (-len(encoded) % 8))
+    cid = CID.decode(cid) if isinstance(cid, str) else cid
+    return bytes(cid.set(version=1)) if cid.version == 0 else bytes(cid)
+
+
+def verify_block(cid: bytes, data: bytes) -> bool:
+    """Whether `data` hashes to the multihash in `cid`. Only sha2-256 CIDs can be verified"""
+    if cid[:1] != b"\x01":
+        return False
+    _, codec_size, _ = varint.decode_raw(cid[1:])
+    multihash = cid[1 + codec_size:]
+    if multihash[:2] != bytes([SHA2_256_CODE, 32]):
+        return False
+    return hashlib.sha256(data).digest() == multihash[2:]
+
+
+def from_dag_json(value: Any) -> Any:
+    """Turn the `{"/": cid}` links and `{"/": {"bytes": ...}}` values of a dag-json document into CIDs and bytes"""
+    if isinstance(value, dict):
+        if set(value) == {"/"}:
+            link = value["/"]
+            if isinstance(link, dict):
+                return b64decode_unpadded(link["bytes"])
+            return CID.decode(link)
+        return {key: from_dag_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [from_dag_json(item) for item in value]
+    return value
+
+
+def to_dag_json(value: Any) -> Any:
+    """Inverse of `from_dag_json`"""
+    if isinstance(value, CID):
+        return {"/": format_cid(bytes(value))}
+    if isinstance(value, bytes):
+        return {"/": {"bytes": b64encode(value).decode().rstrip("=")}}
+    if isinstance(value, dict):
+        return {key: to_dag_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_dag_json(item) for item in value]
+    return value
+
+
+def commit_blocks(commit: Dict[str, Any]) -> List[Tuple[bytes, bytes]]:
+    """(CID, block) pairs a commit is stored as: the envelope, plus the linked payload block of a signed commit"""
+    codec, data = _commit_block(commit)
+    blocks = [(block_cid(data, codec), data)]
+    if "jws" in commit and commit.get("linkedBlock"):
+        linked = b64decode_unpadded(commit["linkedBlock"])
+        blocks.append((base64url_decode(commit["jws"]["payload"]), linked))
+    return blocks
+
+
+def commit_from_blocks(cid: bytes, get: Callable[[bytes], Optional[bytes]]) -> Optional[Dict[str, Any]]:
+    """Rebuild the JSON form of a commit from its blocks, None when one of them is missing"""
+    data = get(cid)
+    if data is None:
+        return None
+    codec, _, _ = varint.decode_raw(cid[1:])
+    if codec != DAG_JOSE_CODEC_CODE:
+        return to_dag_json(dag_cbor.decode(data))
+    envelope = dag_cbor.decode(data)
+    linked = get(envelope["payload"])
+    if linked is None:
+        return None
+    return {
+        "jws": {
+            "payload": base64url_encode(envelope["payload"]),
+            "link": format_cid(envelope["payload"]),
+            "signatures": [
+                {"protected": base64url_encode(s["protected"]), "signature": base64url_encode(s["signature"])}
+                for s in envelope["signatures"]
+            ],
+        },
+        "linkedBlock": b64encode(linked).decode("utf-8"),
+    }
+
+
+def commit_cid(commit: Dict[str, Any]) -> str:
+    """CID of a commit as the node stores it: dag-jose for signed commits, dag-cbor for unsigned genesis commits
+
+    Built by hand rather than with `multiformats.CID`, whose argument validation costs more than the hashing.
+    """
+    return format_cid(_commit_cid_bytes(commit))
+
+
+def stream_id_from_genesis(stream_type: int, genesis: Dict[str, Any]) -> str:
+    """The stream ID a node assigns to a stream created from `genesis`, computed locally"""
+    encoded = varint.encode(STREAMID_CODEC_CODE) + varint.encode(stream_type) + _commit_cid_bytes(genesis)
+    number = int.from_bytes(encoded, "big")
+    digits = []
+    while number:
+        number, digit = divmod(number, 36)
+        digits.append(BASE36_ALPHABET[digit])
+    return "k" + "".join(reversed(digits))
@@ -0,0 +1,122 @@
+# ceramic/history.py
+
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Union
+
+import dag_cbor
+import jsonpatch
+
+from .helper import b64decode_unpadded
+
+
+def commit_payload(commit: Dict[str, Any]) -> Dict[str, Any]:
+    """Payload of a commit in JSON form: the decoded linked block of a signed commit, the commit itself otherwise"""
+    if "jws" in commit:
+        return dag_cbor.decode(b64decode_unpadded(commit["linkedBlock"]))
+    return commit
+
+
+def log_index(log: List[Dict[str, Any]], at_commit: Optional[str] = None,
+              at_time: Union[None, int, float, datetime] = None) -> int:
+    """Position in a stream state's log of the commit named by `at_commit`, or of the last one anchored at `at_time`
+
+    `at_time` is a datetime or Unix seconds. A datetime without a timezone
+    is taken as UTC, like the anchor times. A log entry carries the time of
+    the anchor that covers it, so commits that are not anchored yet are never
+    selected by time. Raises ValueError when no commit matches.
+    """
+    if at_commit is not None:
+        for index, entry in enumerate(log):
+            if str(entry["cid"]) == str(at_commit):
+                return index
+        raise ValueError(f"Commit {at_commit} is not in the stream log")
+    if isinstance(at_time, datetime):
+        if at_time.tzinfo is None:
+            at_time = at_time.replace(tzinfo=timezone.utc)
+        at_time = at_time.timestamp()
+    index = -1
+    for position, entry in enumerate(log):
+        if entry.get("timestamp") is not None and entry["timestamp"] <= at_time:
+            index = position
+    if index < 0:
+        raise ValueError(f"The stream has no anchored commit at or before {at_time}")
+    return index
+
+
+class StreamHistory:
+    """Rebuilds the content of streams at past commits by replaying their JSON patches
+
+    Commits come from `CeramicClient.load_commits`, so with a block store
+    they are read from local disk. Every `interval` commits the replay keeps
+    a snapshot of the content, keyed by the CID of the commit it was taken
+    at. A commit CID fixes the whole history before it, so a snapshot is
+    valid for any later read. A read then replays at most `interval` commits
+    from the nearest snapshot before it, however long the history is. At
+    most `max_snapshots` snapshots are kept, the least recently used are
+    dropped first.
+
+    Example:
+        history = StreamHistory(interval=50)
+        client = CeramicClient(url, did, blocks=BlockStore("blocks"), history=history)
+        doc = ModelInstanceDocument.load(client, stream_id, at_commit=cid)
+    """
+
+    def __init__(self, interval: int = 50, max_snapshots: int = 4096) -> None:
+        if interval < 1:
+            raise ValueError("StreamHistory interval must be at least 1")
+        self.interval = interval
+        self.max_snapshots = max_snapshots
+        self.replayed = 0
+        self._lock = threading.Lock()
+        # Commit CID -> content after that commit, as JSON
+        self._snapshots: "OrderedDict[str, str]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    def _snapshot(self, cid: str) -> Optional[str]:
+        with self._lock:
+            snapshot = self._snapshots.get(cid)
+            if snapshot is not None:
+                self._snapshots.move_to_end(cid)
+            return snapshot
+
+    def _keep(self, cid: str, content: Any) -> None:
+        encoded = json.dumps(content)
+        with self._lock:
+            self._snapshots[cid] = encoded
+            self._snapshots.move_to_end(cid)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+
+    def content_at(self, ceramic_client, stream_id: str, log: List[str], index: int) -> Any:
+        """Content of `stream_id` right after the commit at `index` of `log`, the stream's commit CIDs oldest first"""
+        log = [str(cid) for cid in log[:index + 1]]
+        # The read itself, then every snapshot position before it, nearest first
+        start, content = 0, None
+        for position in [index] + list(range(index - index % self.interval, -1, -self.interval)):
+            snapshot = self._snapshot(log[position])
+            if snapshot is not None:
+                start, content = position + 1, json.loads(snapshot)
+                break
+        if start > index:
+            return content
+        commits = dict(ceramic_client.load_commits(stream_id, log[start:]))
+        for position in range(start, index + 1):
+            commit = commits.get(log[position])
+            if commit is None:
+                raise ValueError(f"Commit {log[position]} of {stream_id} could not be loaded")
+            payload = commit_payload(commit)
+            if position == 0:
+                content = payload.get("data")
+            elif "proof" not in payload:
+                # Anchor commits leave the content as it is
+                content = jsonpatch.apply_patch(content or {}, payload.get("data") or [], in_place=True)
+            self.replayed += 1
+            if position % self.interval == 0 and position:
+                self._keep(log[position], content)
+        self._keep(log[index], content)
+        return content
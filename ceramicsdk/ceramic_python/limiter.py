@@ -0,0 +1,193 @@
+# ceramic/limiter.py
+
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from .metrics import metrics
+
+
+# Responses that mean the node is overloaded rather than that the request was wrong
+OVERLOAD_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class TokenBucket:
+    """Hard ceiling of `rate` requests per second, allowing bursts of up to `burst` requests"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError("TokenBucket rate must be positive")
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Take a token, sleeping until one is available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """Concurrency limit for one upstream endpoint, adjusted by additive increase, multiplicative decrease
+
+    `acquire` blocks until fewer than `limit` requests are in flight (and, with
+    `rate`, until the token bucket allows another request). `release` reports
+    how the request went. While responses succeed and their smoothed latency
+    stays within `tolerance` times the baseline, the limit grows by about one
+    per round trip. An error or a latency spike multiplies it by `backoff`.
+    Requests that started before the last decrease do not decrease it again,
+    so one overload episode backs off once.
+
+    The baseline is the lowest latency seen in the last `window` responses,
+    so it follows the node when it gets slower or faster for good.
+
+    Example:
+        limiter = AdaptiveLimiter(initial=4, max_limit=64, rate=50)
+        started = limiter.acquire()
+        ok = send_request().status_code < 500
+        limiter.release(started, ok)
+    """
+
+    def __init__(
+        self,
+        initial: float = 4,
+        min_limit: float = 1,
+        max_limit: float = 256,
+        backoff: float = 0.7,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+        window: int = 500,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+    ) -> None:
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("AdaptiveLimiter needs 1 <= min_limit <= max_limit")
+        if not 0 < backoff < 1:
+            raise ValueError("AdaptiveLimiter backoff must be between 0 and 1")
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.window = window
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.in_flight = 0
+        self.decreases = 0
+        self.baseline: Optional[float] = None
+        self.latency: Optional[float] = None
+        self._window_min = float("inf")
+        self._samples = 0
+        self._decreased_at = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> float:
+        """Wait for a token and a free slot. Returns the start time to pass to `release`"""
+        if self.bucket:
+            self.bucket.acquire()
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, started: float, ok: bool = True) -> None:
+        """Free the slot taken at `started`. `ok` is False when the node failed or refused the request"""
+        latency = time.monotonic() - started
+        with self._cond:
+            self.in_flight -= 1
+            if ok:
+                self._observe(latency)
+            if not ok or self.latency > self.baseline * self.tolerance:
+                self._decrease(started)
+            elif 2 * (self.in_flight + 1) >= self.limit:
+                # Grow only while the limit is being used, otherwise it grows without bound at low load
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def _observe(self, latency: float) -> None:
+        self.latency = latency if self.latency is None else self.latency + self.smoothing * (latency - self.latency)
+        self.baseline = latency if self.baseline is None else min(self.baseline, latency)
+        self._window_min = min(self._window_min, latency)
+        self._samples += 1
+        if self._samples >= self.window:
+            self.baseline, self._window_min, self._samples = self._window_min, float("inf"), 0
+
+    def _decrease(self, started: float) -> None:
+        if started < self._decreased_at:
+            return
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        # Let the latency average recover from the spike instead of backing off again right away
+        self.latency = self.baseline
+        self._decreased_at = time.monotonic()
+        self.decreases += 1
+
+
+def origin(url: str) -> str:
+    """scheme://host[:port] of a URL, the key limiters are kept under"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class LimitedSession(requests.Session):
+    """requests.Session sending each request through the AdaptiveLimiter of its endpoint
+
+    One limiter is created per origin (scheme, host and port), with the
+    keyword arguments of AdaptiveLimiter given here, overridden by the entry
+    for that endpoint in `endpoints`. Responses with status 429 or 5xx and
+    connection errors count as failures. Each limiter reports its current
+    limit, the requests in flight and its decreases as metrics labelled with
+    the endpoint.
+
+    Example:
+        session = LimitedSession(max_limit=64, endpoints={CERAMIC_ENDPOINT: {"rate": 20}})
+        CeramicClient(CERAMIC_ENDPOINT, did, session=session)
+    """
+
+    def __init__(self, endpoints: Optional[Dict[str, Dict[str, Any]]] = None, **defaults: Any) -> None:
+        super().__init__()
+        self.defaults = defaults
+        self.endpoints = {origin(url): options for url, options in (endpoints or {}).items()}
+        self.limiters: Dict[str, AdaptiveLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, url: str) -> AdaptiveLimiter:
+        key = origin(url)
+        limiter = self.limiters.get(key)
+        if limiter is None:
+            with self._lock:
+                limiter = self.limiters.get(key)
+                if limiter is None:
+                    limiter = AdaptiveLimiter(**{**self.defaults, **self.endpoints.get(key, {})})
+                    self.limiters[key] = limiter
+                    metrics.gauge("upstream_concurrency_limit", lambda: int(limiter.limit),
+                                  help="Requests allowed in flight per upstream endpoint", endpoint=key)
+                    metrics.gauge("upstream_in_flight", lambda: limiter.in_flight, endpoint=key)
+                    metrics.counter("upstream_limit_decreases_total", lambda: limiter.decreases,
+                                    help="Times the concurrency limit backed off after errors or latency spikes",
+                                    endpoint=key)
+        return limiter
+
+    def request(self, method, url, *args, **kwargs):
+        limiter = self.limiter(url)
+        started = limiter.acquire()
+        ok = False
+        try:
+            response = super().request(method, url, *args, **kwargs)
+            ok = response.status_code not in OVERLOAD_STATUSES
+            return response
+        finally:
+            limiter.release(started, ok)
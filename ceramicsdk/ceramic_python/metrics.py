@@ -0,0 +1,208 @@
+# ceramic/metrics.py
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+# Upper bounds in seconds, from sub-millisecond signing to slow Ceramic round trips
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Time spent in calls to Ceramic and OrbisDB and in local signing, labelled by `op`
+UPSTREAM_SECONDS = "ceramic_upstream_seconds"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Fixed-bucket latency histogram. `observe` is a bisect and one short lock"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.sum = 0.0
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        """Cumulative bucket counts (the last one is +Inf) and the sum"""
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by interpolating inside its bucket. None when empty"""
+        cumulative, _ = self.snapshot()
+        if not cumulative[-1]:
+            return None
+        rank = q * cumulative[-1]
+        for index, count in enumerate(cumulative):
+            if count >= rank:
+                break
+        if index == len(self.buckets):
+            return self.buckets[-1]
+        lower = self.buckets[index - 1] if index else 0.0
+        below = cumulative[index - 1] if index else 0
+        in_bucket = cumulative[index] - below
+        return lower + (self.buckets[index] - lower) * ((rank - below) / in_bucket if in_bucket else 1.0)
+
+
+class _Timer:
+    __slots__ = ("histogram", "started_at")
+
+    def __init__(self, histogram: Histogram) -> None:
+        self.histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.started_at)
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metrics:
+    """Process-wide histograms and gauges, rendered in the Prometheus text format
+
+    Example:
+        with metrics.timer(UPSTREAM_SECONDS, op="sign"):
+            ...
+        metrics.gauge("write_queue_depth", lambda: queue.depth)
+        metrics.render()
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._gauges: Dict[str, Dict[Labels, Callable[[], float]]] = {}
+        self._help: Dict[str, str] = {}
+        self._types: Dict[str, str] = {}
+        # (name, labels in call order) -> histogram, skips sorting labels on the hot path
+        self._lookup: Dict[tuple, Histogram] = {}
+
+    def histogram(self, name: str, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS,
+                  **labels: str) -> Histogram:
+        """Get or create the histogram for `name` and `labels`"""
+        fast_key = (name, *labels.items())
+        histogram = self._lookup.get(fast_key)
+        if histogram is None:
+            with self._lock:
+                series = self._histograms.setdefault(name, {})
+                histogram = series.setdefault(_labels(labels), Histogram(buckets))
+                self._lookup[fast_key] = histogram
+                if help:
+                    self._help[name] = help
+        return histogram
+
+    def describe(self, name: str, help: str) -> None:
+        self._help[name] = help
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        self.histogram(name, **labels).observe(seconds)
+
+    def timer(self, name: str, **labels: str) -> _Timer:
+        """Context manager observing the duration of its block"""
+        return _Timer(self.histogram(name, **labels))
+
+    def gauge(self, name: str, fn: Callable[[], float], help: str = "", **labels: str) -> None:
+        """Register a gauge whose value is read from `fn` at render time"""
+        self._register(name, fn, help, "gauge", labels)
+
+    def counter(self, name: str, fn: Callable[[], float], help: str = "", **labels: str) -> None:
+        """Like `gauge`, for a total that only goes up (rendered as a counter)"""
+        self._register(name, fn, help, "counter", labels)
+
+    def _register(self, name: str, fn: Callable[[], float], help: str, kind: str, labels: Dict[str, str]) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_labels(labels)] = fn
+            self._types[name] = kind
+            if help:
+                self._help[name] = help
+
+    def render(self) -> str:
+        with self._lock:
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+        lines = []
+        for name, series in sorted(histograms.items()):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in sorted(series.items(), key=lambda item: item[0]):
+                cumulative, total = histogram.snapshot()
+                for bound, count in zip(histogram.buckets + (float("inf"),), cumulative):
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', le))} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative[-1]}")
+        for name, series in sorted(gauges.items()):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {self._types[name]}")
+            for labels, fn in sorted(series.items(), key=lambda item: item[0]):
+                try:
+                    value = float(fn())
+                except Exception:
+                    value = float("nan")
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Zero every histogram and drop the registered gauges"""
+        with self._lock:
+            for series in self._histograms.values():
+                for histogram in series.values():
+                    histogram.clear()
+            self._gauges.clear()
+
+
+metrics = Metrics()
+metrics.describe(UPSTREAM_SECONDS, "Duration of Ceramic and OrbisDB calls and local signing by operation")
+
+
+def timed(op: str, name: str = UPSTREAM_SECONDS):
+    """Decorator recording every call of the function in the `name` histogram under `op`"""
+    def decorator(fn):
+        histogram = metrics.histogram(name, op=op)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started_at)
+        return wrapper
+    return decorator
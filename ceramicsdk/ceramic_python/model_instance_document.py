@@ -2,14 +2,16 @@
 
 import json
 import os
+from datetime import datetime
 import dag_cbor
 import jsonpatch
 from multiformats import CID
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 from base64 import urlsafe_b64encode,b64encode
 from .ceramic_client import CeramicClient
 from .did import DID
 from .helper import validate_content_length, base36_decode_with_prefix
+from .history import log_index
 
 
 DEFAULT_CREATE_OPTS = {
@@ -128,7 +130,16 @@ class ModelInstanceDocument:
         ceramic_client: CeramicClient,
         stream_id: str,
         opts: Optional[Dict[str, Any]] = None,
+        at_commit: Optional[str] = None,
+        at_time: Union[None, int, float, datetime] = None,
     ):
+        """Load a document, or a read-only view of it at a past commit
+
+        `at_commit` is the CID of a commit in the stream log. `at_time`
+        (a datetime or Unix seconds) selects the last commit anchored at or
+        before that time. Past content is rebuilt locally from the commit
+        blocks, see `StreamHistory`.
+        """
         if opts is None:
             opts = DEFAULT_LOAD_OPTS.copy()
         else:
@@ -136,7 +147,38 @@ class ModelInstanceDocument:
 
         stream = ceramic_client.load_stream(stream_id, opts)
         state = stream.get("state")
-        content = state.get("content")
+        if at_commit is None and at_time is None:
+            return cls._from_state(ceramic_client, stream_id, state)
+
+        index = log_index(state["log"], at_commit, at_time)
+        log = [entry["cid"] for entry in state["log"]]
+        content = ceramic_client.history.content_at(ceramic_client, stream_id, log, index)
+        document = cls._from_state(ceramic_client, stream_id, {**state, "content": content,
+                                                               "log": state["log"][:index + 1]})
+        document.make_read_only()
+        return document
+
+    @classmethod
+    def load_many(
+        cls,
+        ceramic_client: CeramicClient,
+        stream_ids: List[str],
+        chunk_size: int = 100,
+    ) -> Dict[str, "ModelInstanceDocument"]:
+        """Load several documents with batched multi-queries instead of one request each
+
+        Returns a dict keyed by stream ID; streams the node could not load are missing from it.
+        """
+        documents = {}
+        unique_ids = list(dict.fromkeys(stream_ids))
+        for start in range(0, len(unique_ids), chunk_size):
+            states = ceramic_client.multi_query(unique_ids[start:start + chunk_size])
+            for stream_id, state in states.items():
+                documents[stream_id] = cls._from_state(ceramic_client, stream_id, state)
+        return documents
+
+    @classmethod
+    def _from_state(cls, ceramic_client: CeramicClient, stream_id: str, state: Dict[str, Any]):
         metadata_state = state.get("metadata", {})
         metadata = ModelInstanceDocumentMetadata(
             controller=metadata_state.get("controllers", [None])[0],
@@ -147,7 +189,7 @@ class ModelInstanceDocument:
         )
         return cls(
             ceramic_client=ceramic_client,
-            content=content,
+            content=state.get("content"),
             metadata=metadata,
             state=state,
             stream_id=stream_id,
@@ -207,17 +249,11 @@ class ModelInstanceDocument:
 
         genesis_cid_str, previous_cid_str = self.ceramic_client.get_stream_commits(self.stream_id)
 
-        raw_commit = {
-            "data": json_patch,
-            "prev": CID.decode(previous_cid_str),
-            "id": CID.decode(genesis_cid_str),
-        }
-
-
+        header = None
         if metadata_args and metadata_args.shouldIndex is not None:
-            raw_commit["header"] = {"shouldIndex": metadata_args.shouldIndex}
-            
-        commit = signer.create_dag_jws(raw_commit)
+            header = {"shouldIndex": metadata_args.shouldIndex}
+
+        commit = self.make_patch_commit(signer, genesis_cid_str, previous_cid_str, json_patch, header)
         self.ceramic_client.apply_commit(self.stream_id, commit, opts)
         patched_content = jsonpatch.apply_patch(self.content, json_patch)
         self.content = patched_content
@@ -228,6 +264,11 @@ class ModelInstanceDocument:
     def should_index(self, should_index: bool, opts: Optional[Dict[str, Any]] = None):
         self.patch([], ModelInstanceDocumentMetadataArgs(None, None, shouldIndex=should_index), opts)
 
+    def commits(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """(CID, commit) of every commit in the document's log, from the client's block store when it has them"""
+        log = [entry["cid"] for entry in (self.state or {}).get("log", [])]
+        return self.ceramic_client.load_commits(self.stream_id, log or None)
+
     def make_read_only(self):
         self._is_read_only = True
 
@@ -323,4 +364,24 @@ class ModelInstanceDocument:
             raw_commit["header"] = header
 
         signed_commit = signer.create_dag_jws(raw_commit)
-        return signed_commit
\ No newline at end of file
+        return signed_commit
+
+    @staticmethod
+    def make_patch_commit(
+        signer: DID,
+        genesis_cid: Union[str, CID],
+        previous_cid: Union[str, CID],
+        json_patch: List[Dict[str, Any]],
+        header: Optional[Dict[str, Any]] = None,
+    ):
+        """Signed update commit applying `json_patch` on top of the commit `previous_cid`"""
+        raw_commit = {
+            "data": json_patch,
+            "prev": CID.decode(str(previous_cid)),
+            "id": CID.decode(str(genesis_cid)),
+        }
+
+        if header:
+            raw_commit["header"] = header
+
+        return signer.create_dag_jws(raw_commit)
@@ -0,0 +1,435 @@
+# ceramic/outbox.py
+
+import logging
+import os
+import queue
+import random
+import struct
+import threading
+import zlib
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import dag_cbor
+from multiformats import CID
+
+from .helper import b64decode_unpadded, commit_cid, stream_id_from_genesis
+
+
+GENESIS = "genesis"
+UPDATE = "update"
+# Length and CRC-32 of the dag-cbor record that follows
+RECORD_HEADER = struct.Struct(">II")
+SEGMENT_SUFFIX = ".seg"
+ACK_SUFFIX = ".ack"
+ACK = struct.Struct(">Q")
+_STOPPED = object()
+
+
+class OutboxEntry:
+    """A signed commit stored in the outbox, waiting to be submitted"""
+
+    def __init__(self, seq: int, kind: str, stream_id: str, commit: Dict[str, Any], opts: Dict[str, Any],
+                 stream_type: int = 3) -> None:
+        self.seq = seq
+        self.kind = kind
+        self.stream_id = stream_id
+        self.commit = commit
+        self.opts = opts
+        self.stream_type = stream_type
+        self.cid = commit_cid(commit)
+        self.segment: Optional["_Segment"] = None
+
+    def to_record(self) -> dict:
+        return {"seq": self.seq, "kind": self.kind, "streamId": self.stream_id, "type": self.stream_type,
+                "commit": self.commit, "opts": self.opts}
+
+    @classmethod
+    def from_record(cls, record: dict) -> "OutboxEntry":
+        return cls(record["seq"], record["kind"], record["streamId"], record["commit"], record["opts"], record["type"])
+
+    def genesis_cid(self) -> str:
+        if self.kind == GENESIS:
+            return self.cid
+        payload = dag_cbor.decode(b64decode_unpadded(self.commit["linkedBlock"]))
+        return str(payload["id"])
+
+
+class _Segment:
+    def __init__(self, directory: str, first_seq: int) -> None:
+        self.first_seq = first_seq
+        self.path = os.path.join(directory, f"{first_seq:020d}{SEGMENT_SUFFIX}")
+        self.ack_path = os.path.join(directory, f"{first_seq:020d}{ACK_SUFFIX}")
+        self.entries = 0
+        self.acked = 0
+        self.sealed = False
+        self.ack_file = None
+
+
+class Outbox:
+    """Durable local log of signed commits, submitted to the node later by an OutboxDrainer
+
+    Commits are appended to segment files in `directory` as length-prefixed,
+    checksummed dag-cbor records. `add_genesis` and `add_update` return once
+    the record is fsynced. Concurrent appends share one fsync. Submitted
+    commits are acknowledged in a file next to their segment, and a segment
+    is deleted once all its commits are acknowledged. On open, the
+    commits that were not acknowledged are loaded again, and a record torn
+    by a crash at the end of the last segment is dropped.
+
+    The stream ID of a new stream is computed from its genesis commit, so
+    producers get it without waiting for the node. `tip` returns the last
+    queued commit of a stream, so further updates can be chained on top of
+    commits the node has not seen yet. Hold `lock_for(stream_id)` while reading the tip and
+    appending, so two producers do not build on the same commit.
+
+    Example:
+        outbox = Outbox("outbox")
+        drainer = OutboxDrainer(outbox, ceramic_client).start()
+        db = OrbisDB(..., outbox=outbox)
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 64 << 20, fsync: bool = True) -> None:
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.appended = threading.Condition(self._lock)
+        self._stream_locks = [threading.Lock() for _ in range(64)]
+        self._pending: Dict[int, OutboxEntry] = {}
+        # stream ID -> (genesis CID, last queued commit CID, queued commits)
+        self._tips: Dict[str, Tuple[str, str, int]] = {}
+        self._segments: List[_Segment] = []
+        self._next_seq = 0
+        self._written = 0
+        self._synced = 0
+        self._file = None
+        self._load()
+
+    # Recovery
+
+    def _load(self) -> None:
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        for position, name in enumerate(names):
+            segment = _Segment(self.directory, int(name[:-len(SEGMENT_SUFFIX)]))
+            acked = self._read_acks(segment)
+            entries, valid = self._read_segment(segment.path)
+            size = os.path.getsize(segment.path)
+            if valid < size:
+                if position < len(names) - 1:
+                    raise ValueError(f"Corrupt outbox segment {segment.path} at byte {valid}")
+                logging.warning(f"Dropping a torn record at the end of {segment.path}")
+                with open(segment.path, "r+b") as file:
+                    file.truncate(valid)
+            segment.entries = len(entries)
+            segment.acked = sum(entry.seq in acked for entry in entries)
+            segment.sealed = position < len(names) - 1
+            self._segments.append(segment)
+            for entry in entries:
+                self._next_seq = max(self._next_seq, entry.seq + 1)
+                if entry.seq not in acked:
+                    entry.segment = segment
+                    self._track(entry)
+            if segment.sealed and segment.acked == segment.entries:
+                self._remove_segment(segment)
+        if self._segments:
+            self._file = open(self._segments[-1].path, "ab")
+
+    @staticmethod
+    def _read_segment(path: str) -> Tuple[List[OutboxEntry], int]:
+        """Entries of a segment and the length of its valid prefix"""
+        entries = []
+        with open(path, "rb") as file:
+            data = file.read()
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            length, crc = RECORD_HEADER.unpack_from(data, offset)
+            body = data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + length]
+            if len(body) < length or zlib.crc32(body) != crc:
+                break
+            entries.append(OutboxEntry.from_record(dag_cbor.decode(body)))
+            offset += RECORD_HEADER.size + length
+        return entries, offset
+
+    @staticmethod
+    def _read_acks(segment: _Segment) -> set:
+        if not os.path.exists(segment.ack_path):
+            return set()
+        with open(segment.ack_path, "rb") as file:
+            data = file.read()
+        usable = len(data) - len(data) % ACK.size
+        return {ACK.unpack_from(data, offset)[0] for offset in range(0, usable, ACK.size)}
+
+    def _remove_segment(self, segment: _Segment) -> None:
+        if segment.ack_file is not None:
+            segment.ack_file.close()
+        for path in (segment.path, segment.ack_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._segments.remove(segment)
+
+    # Producers
+
+    def lock_for(self, stream_id: str) -> threading.Lock:
+        """Lock to hold while reading `tip(stream_id)` and appending the commit built on it"""
+        return self._stream_locks[hash(stream_id) % len(self._stream_locks)]
+
+    def tip(self, stream_id: str) -> Optional[Tuple[str, str]]:
+        """(genesis CID, last queued commit CID) of a stream with commits waiting, or None"""
+        with self._lock:
+            tip = self._tips.get(stream_id)
+        return tip[:2] if tip else None
+
+    def add_genesis(self, commit: Dict[str, Any], opts: Dict[str, Any], stream_type: int = 3) -> OutboxEntry:
+        """Queue a genesis commit. The entry's `stream_id` is the ID the new stream will have"""
+        return self._append(GENESIS, stream_id_from_genesis(stream_type, commit), commit, opts, stream_type)
+
+    def add_update(self, stream_id: str, commit: Dict[str, Any], opts: Dict[str, Any]) -> OutboxEntry:
+        """Queue an update commit for `stream_id`"""
+        return self._append(UPDATE, stream_id, commit, opts)
+
+    def _append(self, kind: str, stream_id: str, commit: Dict[str, Any], opts: Dict[str, Any],
+                stream_type: int = 3) -> OutboxEntry:
+        with self._lock:
+            entry = OutboxEntry(self._next_seq, kind, stream_id, commit, opts, stream_type)
+            body = dag_cbor.encode(entry.to_record())
+            segment = self._segments[-1] if self._segments else None
+            if segment is None or self._file.tell() >= self.segment_bytes:
+                segment = self._roll()
+            self._file.write(RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body)
+            self._next_seq += 1
+            segment.entries += 1
+            entry.segment = segment
+            self._track(entry)
+            self._written += 1
+            position = self._written
+        self._sync(position)
+        with self._lock:
+            self.appended.notify_all()
+        return entry
+
+    def _roll(self) -> _Segment:
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            previous = self._segments[-1]
+            previous.sealed = True
+            if previous.acked == previous.entries:
+                self._remove_segment(previous)
+        segment = _Segment(self.directory, self._next_seq)
+        self._segments.append(segment)
+        self._file = open(segment.path, "ab")
+        return segment
+
+    def _sync(self, position: int) -> None:
+        """Make appends up to `position` durable. One fsync covers every append made before it started"""
+        with self._sync_lock:
+            if self._synced >= position:
+                return
+            with self._lock:
+                self._file.flush()
+                target = self._written
+                # A descriptor of our own, so a concurrent _roll closing the segment cannot invalidate it
+                fileno = os.dup(self._file.fileno()) if self.fsync else None
+            if fileno is not None:
+                try:
+                    os.fsync(fileno)
+                finally:
+                    os.close(fileno)
+            self._synced = target
+
+    def _track(self, entry: OutboxEntry) -> None:
+        self._pending[entry.seq] = entry
+        genesis, _, count = self._tips.get(entry.stream_id, (None, None, 0))
+        self._tips[entry.stream_id] = (genesis or entry.genesis_cid(), entry.cid, count + 1)
+
+    # Drainer
+
+    def pending(self, after: int = -1) -> List[OutboxEntry]:
+        """Entries not acknowledged yet with a sequence number above `after`, oldest first"""
+        with self._lock:
+            entries = []
+            for seq, entry in reversed(self._pending.items()):
+                if seq <= after:
+                    break
+                entries.append(entry)
+        return entries[::-1]
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def wait_empty(self, timeout: Optional[float] = None) -> bool:
+        """Block until every entry is acknowledged. Returns False on timeout"""
+        with self._lock:
+            return self.appended.wait_for(lambda: not self._pending, timeout)
+
+    def ack(self, entry: OutboxEntry) -> None:
+        """Record that `entry` reached the node, or was given up on"""
+        with self._lock:
+            if self._pending.pop(entry.seq, None) is None:
+                return
+            genesis, cid, count = self._tips[entry.stream_id]
+            if count == 1:
+                del self._tips[entry.stream_id]
+            else:
+                self._tips[entry.stream_id] = (genesis, cid, count - 1)
+            segment = entry.segment
+            if segment.ack_file is None:
+                segment.ack_file = open(segment.ack_path, "ab")
+            # Not fsynced: a lost acknowledgement only means the commit is submitted again
+            segment.ack_file.write(ACK.pack(entry.seq))
+            segment.ack_file.flush()
+            segment.acked += 1
+            if segment.sealed and segment.acked == segment.entries:
+                self._remove_segment(segment)
+            self.appended.notify_all()
+
+    def wait(self, after: int, timeout: Optional[float] = None) -> bool:
+        """Block until an entry above `after` is appended. Returns False on timeout"""
+        with self._lock:
+            return self.appended.wait_for(lambda: self._next_seq - 1 > after, timeout)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+            for segment in self._segments:
+                if segment.ack_file is not None:
+                    segment.ack_file.close()
+                    segment.ack_file = None
+
+
+class OutboxDrainer:
+    """Submits the commits of an Outbox to a Ceramic node from background threads
+
+    Commits of the same stream are submitted one at a time in the order they
+    were queued. Different streams are submitted in parallel by `workers`
+    threads. Failed submissions are retried with exponential backoff and
+    jitter, from `retry_base` up to `retry_max` seconds. After
+    `max_attempts` failures the commit is given up on. So are the commits
+    queued after it for the same stream, which build on it. Each one is passed
+    to `on_failure`. Before an update is retried, the stream's log is checked
+    for it, in case the node applied it but the response was lost.
+    """
+
+    def __init__(self, outbox: Outbox, ceramic_client, workers: int = 4, max_attempts: Optional[int] = 8,
+                 retry_base: float = 0.5, retry_max: float = 30.0,
+                 on_failure: Optional[Callable[[OutboxEntry, Exception], None]] = None) -> None:
+        self.outbox = outbox
+        self.ceramic_client = ceramic_client
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.on_failure = on_failure
+        self.submitted = 0
+        self.failed = 0
+        self._lanes: Dict[str, Deque[OutboxEntry]] = {}
+        self._ready: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> "OutboxDrainer":
+        if self._threads:
+            raise RuntimeError("OutboxDrainer is already running")
+        # Entries left in flight by `stop` are still pending in the outbox and are dispatched again
+        self._lanes = {}
+        self._ready = queue.Queue()
+        self._stopping.clear()
+        self._threads = [threading.Thread(target=self._dispatch, daemon=True)]
+        self._threads += [threading.Thread(target=self._work, daemon=True) for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop after the commits being submitted right now. The rest stay in the outbox"""
+        self._stopping.set()
+        for _ in range(self.workers):
+            self._ready.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Block until the outbox is empty. Returns False on timeout"""
+        return self.outbox.wait_empty(timeout)
+
+    def _dispatch(self) -> None:
+        last = -1
+        while not self._stopping.is_set():
+            for entry in self.outbox.pending(after=last):
+                last = entry.seq
+                with self._lock:
+                    lane = self._lanes.get(entry.stream_id)
+                    if lane is None:
+                        self._lanes[entry.stream_id] = deque([entry])
+                        self._ready.put(entry.stream_id)
+                    else:
+                        lane.append(entry)
+            self.outbox.wait(last, timeout=0.5)
+
+    def _work(self) -> None:
+        while True:
+            stream_id = self._ready.get()
+            if stream_id is None:
+                return
+            with self._lock:
+                entry = self._lanes[stream_id][0]
+            error = self._submit(entry)
+            if error is _STOPPED:
+                return
+            with self._lock:
+                lane = self._lanes[stream_id]
+                # On failure, the commits queued after this one build on it and cannot be applied either
+                finished = [lane.popleft()] if error is None else list(lane)
+                if error is not None:
+                    lane.clear()
+                if lane:
+                    self._ready.put(stream_id)
+                else:
+                    del self._lanes[stream_id]
+                if error is None:
+                    self.submitted += 1
+                else:
+                    self.failed += len(finished)
+            if error is not None:
+                for dropped in finished:
+                    logging.error(f"Giving up on {dropped.kind} commit {dropped.cid} for {dropped.stream_id}: {error}")
+                    if self.on_failure:
+                        self.on_failure(dropped, error)
+            for done in finished:
+                self.outbox.ack(done)
+
+    def _submit(self, entry: OutboxEntry) -> Any:
+        """Submit one commit, retrying. Returns None, the last error if it was given up on, or _STOPPED"""
+        attempt = 0
+        while True:
+            try:
+                if attempt and entry.kind == UPDATE and self._applied(entry):
+                    return None
+                if entry.kind == GENESIS:
+                    self.ceramic_client.create_stream_from_genesis(entry.stream_type, entry.commit, entry.opts)
+                else:
+                    self.ceramic_client.apply_commit(entry.stream_id, entry.commit, entry.opts)
+                return None
+            except Exception as e:
+                attempt += 1
+                if self.max_attempts is not None and attempt >= self.max_attempts:
+                    return e
+                delay = min(self.retry_max, self.retry_base * 2 ** (attempt - 1))
+                if self._stopping.wait(random.uniform(delay / 2, delay)):
+                    # Leave it in the outbox for the next run
+                    return _STOPPED
+
+    def _applied(self, entry: OutboxEntry) -> bool:
+        state = self.ceramic_client.get_stream_state(entry.stream_id) or {}
+        cid = CID.decode(entry.cid)
+        return any(CID.decode(str(log_entry["cid"])) == cid for log_entry in state.get("log", []))
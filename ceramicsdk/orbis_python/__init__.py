@@ -1 +1,11 @@
-from .orbis_db import OrbisDB
\ No newline at end of file
+from .orbis_db import OrbisDB
+from .cache import QueryCache
+from .replica import OrbisReplica
+from .views import AggregateView
+from .registry import ClientRegistry
+from .jobs import WriteQueue
+from .ingest import ingest, read_csv
+from .ledger import CheckpointLedger
+from .scheduler import CommitScheduler
+from .watch import StreamWatcher
+from .shared import SharedMemoryCache
@@ -0,0 +1,233 @@
+# orbis_python/cache.py
+
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .shared import SharedMemoryCache
+
+
+# Ceramic stream IDs (models, contexts) are base36 strings with a "k" prefix
+STREAM_ID_PATTERN = re.compile(r"\bk[0-9a-z]{40,}\b")
+
+
+def normalize_sql(query: str) -> str:
+    """Collapse whitespace and drop a trailing semicolon so equivalent queries share a key"""
+    return " ".join(query.split()).rstrip(";").rstrip()
+
+
+def referenced_tables(query: str) -> frozenset:
+    """Stream IDs of the tables a query reads from"""
+    return frozenset(STREAM_ID_PATTERN.findall(query))
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into a single execution
+
+    The first caller runs the function; callers arriving while it is in flight
+    wait for it and receive the same result (or exception).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run `fn` once per in-flight key. Returns (result, shared)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "tables", "shared_generations")
+
+    def __init__(self, value: bytes, expires_at: float, tables: frozenset,
+                 shared_generations: Optional[Dict[str, int]] = None) -> None:
+        self.value = value
+        self.expires_at = expires_at
+        self.tables = tables
+        self.shared_generations = shared_generations
+
+
+class QueryCache:
+    """TTL + byte-bounded LRU cache for raw OrbisDB query responses
+
+    Entries are keyed by (env, normalized SQL, params) and remember which
+    tables they read, so a write to a table drops every cached result that
+    depends on it. Identical queries that miss at the same time share one
+    upstream call. A cache can be shared by several OrbisDB instances.
+
+    With `shared`, local misses are looked up in a SharedMemoryCache before
+    going upstream and loaded results are stored in it, so worker processes
+    on one host fill a common cache. Invalidations bump the table's shared
+    counter, which drops the results other workers hold for it as well.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_bytes: int = 64 * 1024 * 1024,
+                 shared: Optional["SharedMemoryCache"] = None) -> None:
+        if ttl <= 0:
+            raise ValueError("QueryCache ttl must be positive")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._bytes = 0
+        # Bumped on invalidation so a load that started before a write is not stored
+        self._generations: Dict[str, int] = {}
+        self._flight = SingleFlight()
+        self._stats = {
+            "hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "shared": 0,
+            "expirations": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def make_key(env_id: str, query: str, params: Iterable[Any] = ()) -> Tuple[str, str, str]:
+        return (env_id, normalize_sql(query), json.dumps(list(params), sort_keys=True, default=str))
+
+    def get_or_load(self, env_id: str, query: str, params: Iterable[Any], loader: Callable[[], bytes]) -> bytes:
+        """Return the cached response for the query, calling `loader` on a miss"""
+        params = list(params)
+        key = self.make_key(env_id, query, params)
+        value = self._get(key)
+        if value is not None:
+            return value
+
+        tables = referenced_tables(query)
+        shared_generations = shared_key = None
+        from_shared = []
+        if self.shared is not None:
+            # Read before loading, so a write elsewhere during the load makes the result unreachable
+            shared_generations = {table: self.shared.generation(table) for table in sorted(tables)}
+            shared_key = json.dumps([key, shared_generations]).encode()
+
+        def load() -> bytes:
+            with self._lock:
+                generations = {table: self._generations.get(table, 0) for table in tables}
+            if shared_key is not None:
+                value = self.shared.get(shared_key)
+                if value is not None:
+                    from_shared.append(True)
+                    self._put(key, value, tables, generations, shared_generations)
+                    return value
+            value = loader()
+            self._put(key, value, tables, generations, shared_generations)
+            if shared_key is not None:
+                self.shared.put(shared_key, value, self.ttl)
+            return value
+
+        value, shared = self._flight.do(key, load)
+        with self._lock:
+            self._stats["shared" if shared else "shared_hits" if from_shared else "misses"] += 1
+        return value
+
+    def _get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self._stats["expirations"] += 1
+                return None
+            if entry.shared_generations and any(self.shared.generation(table) != generation
+                                                for table, generation in entry.shared_generations.items()):
+                # Another worker wrote to one of the tables
+                self._remove(key)
+                self._stats["invalidations"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry.value
+
+    def _put(self, key: Hashable, value: bytes, tables: frozenset, generations: Dict[str, int],
+             shared_generations: Optional[Dict[str, int]] = None) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if any(self._generations.get(table, 0) != gen for table, gen in generations.items()):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, time.monotonic() + self.ttl, tables, shared_generations)
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.value)
+
+    def invalidate(self, table: str) -> int:
+        """Drop every entry that reads from `table`, in every worker when the cache is shared. Returns the local entries dropped"""
+        if self.shared is not None:
+            self.shared.bump(table)
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            stale = [key for key, entry in self._entries.items() if table in entry.tables]
+            for key in stale:
+                self._remove(key)
+            self._stats["invalidations"] += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            for table in self._generations:
+                self._generations[table] += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for tuning the TTL and size bound"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"] + stats["shared"]
+        stats["hit_ratio"] = (stats["hits"] + stats["shared_hits"] + stats["shared"]) / lookups if lookups else 0.0
+        stats["in_flight"] = self._flight.in_flight
+        stats["ttl"] = self.ttl
+        stats["max_bytes"] = self.max_bytes
+        return stats
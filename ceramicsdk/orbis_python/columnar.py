@@ -0,0 +1,320 @@
+# orbis_python/columnar.py
+
+import json
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+from dateutil.parser import isoparse
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class DictionaryColumn:
+    """A string column stored as integer codes into a table of distinct values
+
+    Repeated values such as page paths or addresses are kept once in
+    ``dictionary``; every row only holds an int32 code (-1 for null).
+    """
+
+    def __init__(self, codes: np.ndarray, dictionary: np.ndarray) -> None:
+        self.codes = codes
+        self.dictionary = dictionary
+
+    @classmethod
+    def from_values(cls, values: Iterable[Optional[str]]):
+        """Dictionary-encode an iterable of strings"""
+        lookup: Dict[str, int] = {}
+        codes = []
+        for value in values:
+            if value is None:
+                codes.append(-1)
+                continue
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(lookup)
+            codes.append(code)
+        dictionary = np.empty(len(lookup), dtype=object)
+        dictionary[:] = list(lookup)
+        return cls(np.asarray(codes, dtype=np.int32), dictionary)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            code = self.codes[index]
+            return None if code < 0 else self.dictionary[code]
+        return DictionaryColumn(self.codes[index], self.dictionary)
+
+    def __eq__(self, value) -> np.ndarray:
+        """Vectorized equality against a single value, compared on codes"""
+        matches = np.flatnonzero(self.dictionary == value)
+        if not len(matches):
+            return np.zeros(len(self.codes), dtype=bool)
+        return self.codes == matches[0]
+
+    def decode(self) -> np.ndarray:
+        """Materialize the column as an object array of strings"""
+        values = np.empty(len(self.codes), dtype=object)
+        valid = self.codes >= 0
+        values[valid] = self.dictionary[self.codes[valid]]
+        return values
+
+    def value_counts(self) -> Dict[str, int]:
+        """Count rows per distinct (non-null) value"""
+        counts = np.bincount(self.codes[self.codes >= 0], minlength=len(self.dictionary))
+        return {value: int(n) for value, n in zip(self.dictionary, counts)}
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + sum(len(value) for value in self.dictionary)
+
+
+Column = Union[np.ndarray, DictionaryColumn]
+
+_WHITESPACE = re.compile(r"\s*")
+
+
+def iter_rows(raw: Union[bytes, str], key: str = "data") -> Iterator[Dict[str, Any]]:
+    """Yield the rows of the ``key`` array of a JSON response one at a time
+
+    Unlike ``json.loads``, this never holds every row dict at once.
+    """
+    text = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+    decoder = json.JSONDecoder()
+
+    def skip(i: int, expected: Optional[str] = None) -> int:
+        i = _WHITESPACE.match(text, i).end()
+        if expected is not None:
+            if text[i:i + 1] != expected:
+                raise ValueError(f"Expected {expected!r} at position {i} of the response")
+            i = _WHITESPACE.match(text, i + 1).end()
+        return i
+
+    found = False
+    i = skip(0, "{")
+    while text[i:i + 1] != "}":
+        name, i = decoder.raw_decode(text, i)
+        i = skip(i, ":")
+        if name == key and text[i:i + 1] == "[":
+            found = True
+            i = skip(i + 1)
+            while text[i:i + 1] != "]":
+                row, i = decoder.raw_decode(text, i)
+                yield row
+                i = skip(i)
+                if text[i:i + 1] == ",":
+                    i = skip(i + 1)
+            i = skip(i + 1)
+        else:
+            _, i = decoder.raw_decode(text, i)
+            i = skip(i)
+        if text[i:i + 1] == ",":
+            i = skip(i + 1)
+    if not found:
+        raise ValueError(f"The response has no {key!r} array")
+
+
+def _to_datetime64(values: Sequence[Optional[str]]) -> np.ndarray:
+    """Parse ISO 8601 strings into a UTC datetime64[us] array"""
+    micros = np.empty(len(values), dtype=np.int64)
+    null = np.iinfo(np.int64).min  # NaT
+    for i, value in enumerate(values):
+        if value is None:
+            micros[i] = null
+            continue
+        parsed = isoparse(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        delta = parsed - EPOCH
+        micros[i] = (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return micros.view("datetime64[us]")
+
+
+def _to_column(values: List[Any]) -> Column:
+    """Pick the narrowest column type that holds every value"""
+    kinds = {type(value) for value in values if value is not None}
+    has_null = any(value is None for value in values)
+    if kinds == {str}:
+        return DictionaryColumn.from_values(values)
+    if kinds == {int} and not has_null:
+        return np.asarray(values, dtype=np.int64)
+    if kinds and kinds <= {int, float}:
+        return np.asarray([np.nan if value is None else value for value in values], dtype=np.float64)
+    if kinds == {bool} and not has_null:
+        return np.asarray(values, dtype=bool)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+class ColumnarResult:
+    """Query result stored column by column instead of one dict per row"""
+
+    def __init__(self, columns: Dict[str, Column]) -> None:
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]], datetime_columns: Iterable[str] = ()):
+        """Transpose row dicts into columns in one pass
+
+        Columns listed in ``datetime_columns`` are parsed into datetime64[us].
+        ``rows`` can be an iterator such as ``iter_rows``, so only one row
+        dict is alive at a time.
+        """
+        values: Dict[str, List[Any]] = {}
+        for n, row in enumerate(rows):
+            for name, value in row.items():
+                column = values.get(name)
+                if column is None:
+                    # Rows before the first one with this key did not have it
+                    column = values[name] = [None] * n
+                column.append(value)
+            for name, column in values.items():
+                if len(column) == n:
+                    column.append(None)
+
+        datetime_columns = set(datetime_columns)
+        columns: Dict[str, Column] = {}
+        for name in list(values):
+            column = values.pop(name)
+            columns[name] = _to_datetime64(column) if name in datetime_columns else _to_column(column)
+        return cls(columns)
+
+    def __getitem__(self, name: str) -> Column:
+        return self.columns[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def __len__(self) -> int:
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.columns)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns.values())
+
+    def filter(self, mask: np.ndarray):
+        """Keep only the rows where ``mask`` is true"""
+        return ColumnarResult({name: column[mask] for name, column in self.columns.items()})
+
+    def to_rows(self) -> List[Dict[str, Any]]:
+        """Convert back to the list-of-dicts shape returned by OrbisDB.query"""
+        decoded = {
+            name: column.decode() if isinstance(column, DictionaryColumn) else column
+            for name, column in self.columns.items()
+        }
+        return [
+            {name: _to_python(values[i]) for name, values in decoded.items()}
+            for i in range(len(self))
+        ]
+
+    def count(self, name: str, value: Any = None) -> int:
+        return count(self.columns[name], value)
+
+    def group_count(self, *names: str) -> "ColumnarResult":
+        return group_count(*(self.columns[name] for name in names), names=names)
+
+
+def _to_python(value: Any) -> Any:
+    if isinstance(value, np.datetime64):
+        return None if np.isnat(value) else str(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def count(column: Column, value: Any = None) -> int:
+    """Count non-null rows, or the rows equal to ``value``"""
+    if isinstance(column, DictionaryColumn):
+        if value is None:
+            return int(np.count_nonzero(column.codes >= 0))
+        return int(np.count_nonzero(column == value))
+    if value is None:
+        if column.dtype.kind == "M":
+            return int(np.count_nonzero(~np.isnat(column)))
+        if column.dtype.kind == "f":
+            return int(np.count_nonzero(~np.isnan(column)))
+        return len(column)
+    return int(np.count_nonzero(column == value))
+
+
+def time_bucket(column: np.ndarray, interval: Union[str, np.timedelta64]) -> np.ndarray:
+    """Floor a datetime64 column to fixed-width buckets
+
+    ``interval`` is a numpy timedelta or a string such as ``"15m"``, ``"1h"`` or ``"1D"``.
+    """
+    if isinstance(interval, str):
+        interval = np.timedelta64(int(interval[:-1] or 1), interval[-1])
+    step = interval.astype("timedelta64[us]").astype(np.int64)
+    if step <= 0:
+        raise ValueError("time_bucket interval must be positive")
+    micros = column.astype("datetime64[us]").astype(np.int64)
+    buckets = micros - micros % step
+    buckets[np.isnat(column)] = np.iinfo(np.int64).min
+    return buckets.view("datetime64[us]")
+
+
+def _factorize(column: Column):
+    """Return (codes, uniques) for a column"""
+    if isinstance(column, DictionaryColumn):
+        return column.codes, column.dictionary
+    if column.dtype == object:
+        # np.unique sorts, which fails on None next to other values; number values in order of appearance
+        lookup: Dict[Any, int] = {}
+        uniques = []
+        codes = np.empty(len(column), dtype=np.int64)
+        for i, value in enumerate(column):
+            key = (type(value), value) if isinstance(value, Hashable) else (type(value), json.dumps(value, sort_keys=True))
+            code = lookup.get(key)
+            if code is None:
+                code = lookup[key] = len(uniques)
+                uniques.append(value)
+            codes[i] = code
+        unique_values = np.empty(len(uniques), dtype=object)
+        unique_values[:] = uniques
+        return codes, unique_values
+    uniques, codes = np.unique(column, return_inverse=True)
+    return codes.ravel(), uniques
+
+
+def group_count(*columns: Column, names: Optional[Sequence[str]] = None) -> ColumnarResult:
+    """Count rows per distinct combination of the given columns
+
+    Returns a ColumnarResult with one column per key plus a ``count`` column.
+    """
+    if not columns:
+        raise ValueError("group_count needs at least one column")
+    names = list(names or (f"key_{i}" for i in range(len(columns))))
+    factorized = [_factorize(column) for column in columns]
+
+    # Null dictionary codes (-1) are shifted to 0 so every code is a valid index
+    codes = [codes + 1 if isinstance(column, DictionaryColumn) else codes
+             for (codes, _), column in zip(factorized, columns)]
+    dims = [int(c.max()) + 1 if len(c) else 1 for c in codes]
+
+    if np.prod(dims, dtype=np.float64) < 2 ** 62:
+        flat = np.ravel_multi_index(codes, dims)
+        keys, counts = np.unique(flat, return_counts=True)
+        key_codes = np.unravel_index(keys, dims)
+    else:
+        keys, counts = np.unique(np.stack(codes, axis=1), axis=0, return_counts=True)
+        key_codes = keys.T
+
+    result: Dict[str, Column] = {}
+    for name, (_, uniques), column, group_codes in zip(names, factorized, columns, key_codes):
+        if isinstance(column, DictionaryColumn):
+            result[name] = DictionaryColumn(group_codes.astype(np.int32) - 1, uniques)
+        else:
+            result[name] = uniques[group_codes]
+    result["count"] = counts.astype(np.int64)
+    return ColumnarResult(result)
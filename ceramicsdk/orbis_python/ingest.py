@@ -0,0 +1,197 @@
+# orbis_python/ingest.py
+
+import csv
+import json
+import time
+from collections import deque
+from typing import Any, Callable, Deque, IO, Iterable, Iterator, Optional, Tuple, Union
+from pathlib import Path
+
+from .ledger import CheckpointLedger, row_digest
+
+
+TRUE_STRINGS = {"true", "t", "yes", "y", "1"}
+FALSE_STRINGS = {"false", "f", "no", "n", "0"}
+
+
+def resolve(spec: dict, schema: dict) -> dict:
+    """Follow a local `$ref` such as `#/$defs/DateTime` within the model schema"""
+    ref = spec.get("$ref")
+    while ref:
+        if not ref.startswith("#/"):
+            raise ValueError(f"Unsupported schema reference: {ref}")
+        spec = schema
+        for part in ref[2:].split("/"):
+            spec = spec.get(part, {})
+        ref = spec.get("$ref")
+    return spec
+
+
+def coerce_value(value: Any, spec: dict, schema: dict) -> Any:
+    """Convert a text value (e.g. a CSV cell) to the JSON type its schema property declares
+
+    Values that are not strings are returned unchanged.
+    """
+    if not isinstance(value, str):
+        return value
+    spec = resolve(spec, schema)
+    types = spec.get("type", "string")
+    for kind in ([types] if isinstance(types, str) else types):
+        if kind == "string":
+            return value
+        text = value.strip()
+        try:
+            if kind == "integer":
+                return int(text)
+            if kind == "number":
+                try:
+                    return int(text)
+                except ValueError:
+                    return float(text)
+            if kind == "boolean" and text.lower() in TRUE_STRINGS | FALSE_STRINGS:
+                return text.lower() in TRUE_STRINGS
+            if kind == "null" and text == "":
+                return None
+            if kind in ("object", "array"):
+                parsed = json.loads(text)
+                if isinstance(parsed, dict if kind == "object" else list):
+                    return parsed
+        except ValueError:
+            pass
+    raise ValueError(f"Cannot convert {value!r} to {types}")
+
+
+def coerce_row(row: dict, schema: dict) -> dict:
+    """Convert the text values of `row` to the types declared by the model schema, raising ValueError
+
+    Empty cells for non-string properties are dropped, so a missing required
+    value is reported by validation rather than as a conversion error.
+    Properties the schema does not declare are left as they are.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("A row must be a JSON object")
+    properties = schema.get("properties", {})
+    coerced = {}
+    for name, value in row.items():
+        spec = properties.get(name)
+        if spec is None:
+            coerced[name] = value
+            continue
+        if value == "" and resolve(spec, schema).get("type", "string") != "string":
+            continue
+        try:
+            coerced[name] = coerce_value(value, spec, schema)
+        except ValueError as e:
+            raise ValueError(f"{name}: {e}") from None
+    return coerced
+
+
+def read_csv(source: Union[str, Path, IO[str]], buffer_size: int = 1 << 20, **reader_args) -> Iterator[dict]:
+    """Yield the rows of a CSV file with a header line as dicts of strings, one at a time
+
+    The file is read through a buffer of `buffer_size` bytes, so memory use
+    does not depend on the size of the file.
+    """
+    if not isinstance(source, (str, Path)):
+        yield from csv.DictReader(source, **reader_args)
+        return
+    with open(source, newline="", encoding="utf-8-sig", buffering=buffer_size) as file:
+        yield from csv.DictReader(file, **reader_args)
+
+
+class IngestStats:
+    """Counters of a running ingestion, passed to the progress callback of `ingest`"""
+
+    def __init__(self) -> None:
+        self.started_at = time.monotonic()
+        self.created = 0
+        self.failed = 0
+        self.skipped = 0
+
+    @property
+    def done(self) -> int:
+        return self.created + self.failed + self.skipped
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def rate(self) -> float:
+        """Rows finished per second since the start"""
+        return self.done / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        skipped = f", {self.skipped} already written" if self.skipped else ""
+        return f"{self.done} rows ({self.created} created, {self.failed} failed{skipped}) in {self.elapsed:.1f}s, {self.rate:.1f} rows/s"
+
+
+def ingest(
+    db,
+    rows: Iterable[dict],
+    concurrency: int = 8,
+    report_every: float = 5.0,
+    on_progress: Optional[Callable[[IngestStats], None]] = None,
+    on_result: Optional[Callable[[dict], None]] = None,
+    ledger: Optional[CheckpointLedger] = None,
+) -> IngestStats:
+    """Create a document for every row with `OrbisDB.add_rows`, converting values to the model's types
+
+    Rows are pulled from `rows` as writes complete, so a generator such as
+    `read_csv` is consumed with constant memory. `on_result` gets each
+    `{"index", "stream_id" | "error"}` result and `on_progress` the running
+    counters every `report_every` seconds and once at the end.
+
+    With a `ledger`, every created row is recorded there, and rows the ledger
+    already holds are skipped. Their result is `{"index", "stream_id",
+    "skipped": True}`, so running the same input again after an interruption
+    only writes the rows that were not written yet. Results keep the input
+    order.
+
+    Example:
+        stats = ingest(db, read_csv("pageviews.csv"), concurrency=16, on_progress=print)
+    """
+    stats = IngestStats()
+    next_report = stats.started_at + report_every
+    # Input index and digest of the rows handed to add_rows that were not reported yet, oldest first.
+    # Skipped rows that follow one of them wait here too, with their stream ID instead of a digest.
+    written: Deque[Tuple[int, Any]] = deque()
+
+    def report(result):
+        nonlocal next_report
+        if "skipped" in result:
+            stats.skipped += 1
+        elif "error" in result:
+            stats.failed += 1
+        else:
+            stats.created += 1
+        if on_result:
+            on_result(result)
+        if on_progress and time.monotonic() >= next_report:
+            next_report = time.monotonic() + report_every
+            on_progress(stats)
+
+    def pending_rows():
+        for index, row in enumerate(rows):
+            digest = row_digest(row) if ledger is not None else None
+            stream_id = ledger.get(digest) if ledger is not None else None
+            if stream_id is None:
+                written.append((index, digest))
+                yield row
+            elif written:
+                written.append((index, stream_id))
+            else:
+                report({"index": index, "stream_id": stream_id, "skipped": True})
+
+    for result in db.add_rows(pending_rows(), concurrency=concurrency, coerce=True):
+        index, digest = written.popleft()
+        result = {**result, "index": index}
+        if ledger is not None and "stream_id" in result:
+            ledger.add(digest, str(result["stream_id"]))
+        report(result)
+        while written and isinstance(written[0][1], str):
+            index, stream_id = written.popleft()
+            report({"index": index, "stream_id": stream_id, "skipped": True})
+    if on_progress:
+        on_progress(stats)
+    return stats
@@ -0,0 +1,175 @@
+# orbis_python/jobs.py
+
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, Iterable, List, Optional
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFull(Exception):
+    """Raised by WriteQueue.submit when `max_pending` jobs are already waiting"""
+    pass
+
+
+class Job:
+    """A write accepted by a WriteQueue. `status()` is safe to serialize as JSON"""
+
+    def __init__(self, fn: Callable[[], Any], keys: Iterable[Hashable], seq: int) -> None:
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.keys = list(dict.fromkeys(keys))
+        self.seq = seq
+        self.state = QUEUED
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._waiting = 0
+        self._dependents: List["Job"] = []
+        self._done = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job finished. Returns False on timeout"""
+        return self._done.wait(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "state": self.state,
+            "result": self.result,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class WriteQueue:
+    """Runs writes in a background thread pool so request handlers can answer right away
+
+    Jobs that share a key (a stream ID) run one after another in submission
+    order; a job with several keys waits for the earlier jobs on every one of
+    them. Jobs without common keys run concurrently, at most `workers` at a
+    time. At most `max_pending` jobs may wait; further submits raise
+    QueueFull. The last `keep` finished jobs stay available to `get`.
+
+    Example:
+        queue = WriteQueue(workers=4)
+        job = queue.submit(lambda: db.update_row(stream_id, {"page": "/about"}), keys=[stream_id])
+        queue.get(job.id).status()
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int = 1000, keep: int = 10000) -> None:
+        if workers < 1:
+            raise ValueError("WriteQueue needs at least one worker")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.keep = keep
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="orbis-write")
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._jobs: Dict[str, Job] = {}
+        # IDs of finished jobs, oldest first; jobs still queued or running are never forgotten
+        self._finished: Deque[str] = deque()
+        self._tails: Dict[Hashable, Job] = {}
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+
+    def submit(self, fn: Callable[[], Any], keys: Iterable[Hashable] = ()) -> Job:
+        """Enqueue `fn`. It runs after every earlier job that shares one of `keys`"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"{self._pending} writes are already queued")
+            job = Job(fn, keys, next(self._seq))
+            for predecessor in {id(p): p for p in (self._tails.get(key) for key in job.keys) if p}.values():
+                predecessor._dependents.append(job)
+                job._waiting += 1
+            for key in job.keys:
+                self._tails[key] = job
+            self._jobs[job.id] = job
+            self._pending += 1
+            ready = job._waiting == 0
+        if ready:
+            self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job: Job) -> None:
+        with self._lock:
+            job.state = RUNNING
+            job.started_at = time.time()
+            self._pending -= 1
+            self._running += 1
+        try:
+            result, error, state = job.fn(), None, DONE
+        except Exception as e:
+            logging.error(f"Write job {job.id} failed: {e}")
+            result, error, state = None, str(e), FAILED
+
+        with self._lock:
+            job.result, job.error, job.state = result, error, state
+            job.finished_at = time.time()
+            self._running -= 1
+            self._completed += 1
+            self._failed += state == FAILED
+            for key in job.keys:
+                if self._tails.get(key) is job:
+                    del self._tails[key]
+            ready = []
+            for dependent in job._dependents:
+                dependent._waiting -= 1
+                if dependent._waiting == 0:
+                    ready.append(dependent)
+            job._dependents = []
+            job.fn = None
+            self._finished.append(job.id)
+            self._trim()
+        job._done.set()
+        for dependent in ready:
+            self._executor.submit(self._run, dependent)
+
+    def _trim(self) -> None:
+        """Forget the oldest finished jobs beyond `keep`"""
+        while len(self._finished) > self.keep:
+            del self._jobs[self._finished.popleft()]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    @property
+    def depth(self) -> int:
+        """Jobs accepted but not started yet"""
+        return self._pending
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting work. With `wait`, block until every accepted job finished"""
+        if wait:
+            with self._lock:
+                jobs = list(self._jobs.values())
+            for job in jobs:
+                job.wait()
+        self._executor.shutdown(wait=wait)
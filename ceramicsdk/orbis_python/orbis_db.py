@@ -1,10 +1,45 @@
 from ceramic_python.did import DID
 from ceramic_python.ceramic_client import CeramicClient
-from ceramic_python.model_instance_document import ModelInstanceDocument, ModelInstanceDocumentMetadataArgs
+from ceramic_python.model_instance_document import ModelInstanceDocument, ModelInstanceDocumentMetadataArgs, DEFAULT_CREATE_OPTS
+from ceramic_python.outbox import Outbox
+from ceramic_python.blocks import BlockStore
+from ceramic_python.car import export_streams
+from ceramic_python.limiter import LimitedSession
+from ceramic_python.metrics import timed
+from .cache import QueryCache, referenced_tables
+from .ingest import coerce_row, coerce_value
+from .replica import OrbisReplica
+from .scheduler import CommitScheduler, default_scheduler
+from .views import AggregateView
+from .watch import StreamWatcher, WatchCallback
+from .sql import OrderBy, build_select, chunk_filters, parse_order_by, sort_rows, split_range
 import requests
-from typing import Optional
+from requests.adapters import HTTPAdapter
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 from pathlib import Path
 import json
+import re
+
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_PARALLELISM = 8
+
+
+_OBJECT_START = re.compile(rb"\s*\{")
+_DATA_ARRAY = re.compile(rb'"data"\s*:\s*\[')
+
+
+def _check_query_response(body: bytes) -> None:
+    """Raise ValueError unless `body` is shaped like a JSON object with a `data` array
+
+    Only the outline is checked, so the body is still decoded once, by its
+    reader, which raises on anything the outline let through.
+    """
+    if not (_OBJECT_START.match(body) and body[-64:].rstrip().endswith(b"}") and _DATA_ARRAY.search(body)):
+        raise ValueError(f"OrbisDB returned a response without data: {body[:200]!r}")
+
 
 class OrbisDB:
     """A relational database stored on OrbisDB/Ceramic"""
@@ -15,7 +50,13 @@ class OrbisDB:
         o_endpoint: str,
         context_stream: Optional[str] = None,
         table_stream: Optional[str] = None,
-        controller_private_key: Optional[str] = None
+        controller_private_key: Optional[str] = None,
+        cache: Optional[QueryCache] = None,
+        session: Optional[requests.Session] = None,
+        model_cache: Optional[Dict[str, dict]] = None,
+        outbox: Optional[Outbox] = None,
+        scheduler: Optional[CommitScheduler] = None,
+        blocks: Optional[BlockStore] = None
     ) -> None:
 
         if not table_stream and not controller_private_key:
@@ -26,7 +67,36 @@ class OrbisDB:
         self.context_stream = context_stream
         self.table_stream = table_stream
         self.controller = DID(private_key=controller_private_key)
-        self.ceramic_client = CeramicClient(c_endpoint, self.controller if self.controller else "")
+        # Pooled HTTP connections to Ceramic and the Orbis query endpoint, shared by concurrent requests
+        self.session = session or self._make_session()
+        # `blocks` keeps commits fetched from Ceramic on local disk, see `BlockStore`
+        self.ceramic_client = CeramicClient(c_endpoint, self.controller if self.controller else "", session=self.session,
+                                            blocks=blocks)
+        # Model stream ID -> model definition, can be shared between instances
+        self.model_cache = {} if model_cache is None else model_cache
+        # Optional query-result cache, can be shared between instances
+        self.cache = cache
+        # Optional local SQLite mirror of the table, see `replicate`
+        self.replica: Optional[OrbisReplica] = None
+        # Materialized aggregates registered with `register_view`
+        self.views: Dict[str, AggregateView] = {}
+        # Stream watchers started by `watch`, one per environment
+        self.watchers: Dict[str, StreamWatcher] = {}
+        # Optional durable queue for signed commits; writes return once the commit is queued, see `Outbox`
+        self.outbox = outbox
+        # Orders update commits per stream while updating different streams concurrently. Handles
+        # created without one share a process-wide scheduler, so they do not each start lane threads
+        self.scheduler = scheduler or default_scheduler()
+
+
+    @staticmethod
+    def _make_session(pool_size: int = DEFAULT_POOL_SIZE, limits: Optional[Dict[str, Any]] = None) -> requests.Session:
+        """Pooled session. With `limits` (LimitedSession arguments), requests go through adaptive limiters"""
+        session = LimitedSession(**limits) if limits is not None else requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
 
 
     @classmethod
@@ -43,7 +113,67 @@ class OrbisDB:
         """Read the db from Ceramic"""
         if not self.table_stream:
             raise ValueError("OrbisDB table stream has not being specified. Cannot read the database.")
-        return self.query(env_id, f"SELECT * FROM {self.table_stream}")
+        return self._read_rows(env_id, f"SELECT * FROM {self.table_stream}")
+
+
+    def get_row(self, env_id: str, stream_id: str):
+        """Read a single row by its stream ID"""
+        if not self.table_stream:
+            raise ValueError("OrbisDB table stream has not being specified. Cannot read the database.")
+        rows = self._read_rows(env_id, f"SELECT * FROM {self.table_stream} WHERE stream_id = $1", [stream_id])
+        return rows[0] if rows else None
+
+
+    def replicate(self, env_id: str, path: str = "orbis_replica.db", max_staleness: float = 60.0,
+                  watermark_column: str = "indexed_at", sync: bool = True) -> OrbisReplica:
+        """Mirror the table into a local SQLite file and serve reads from it
+
+        `read`, `get_row` and `filter` for `env_id` run locally afterwards,
+        syncing new rows first whenever the copy is older than `max_staleness`
+        seconds. Call `refresh()` on the returned replica to sync explicitly.
+        Filter values are bound as given, so text from a query string should
+        go through `coerce_filters` first. Rows deleted upstream stay in the
+        local copy, see `OrbisReplica`.
+        """
+        self.replica = OrbisReplica(self, env_id, path, max_staleness, watermark_column)
+        if sync:
+            self.replica.refresh()
+        return self.replica
+
+
+    def register_view(self, env_id: str, name: str, group_by: Sequence[str] = (), count_distinct: Optional[str] = None,
+                      time_bucket: Optional[Tuple[str, int]] = None, path: str = "orbis_views.db") -> AggregateView:
+        """Register a materialized aggregate over the table
+
+        The view is computed on the first refresh and afterwards only folds in
+        rows indexed since the last one. State is kept in the SQLite file at
+        `path`, so a restart picks up where it left off.
+
+        Example: db.register_view(env_id, "views_per_page_hour", group_by=["page"], time_bucket=("timestamp", 3600))
+        """
+        view = AggregateView(self, env_id, name, group_by, count_distinct, time_bucket, path)
+        self.views[name] = view
+        return view
+
+
+    def watch(self, env_id: str, stream_ids: Iterable[str], callback: WatchCallback, **options) -> StreamWatcher:
+        """Call `callback(stream_id, patch, content)` whenever one of `stream_ids` gets a new commit
+
+        Tips are checked in batches against the table and only streams that
+        moved are loaded from Ceramic, see `StreamWatcher` for the `options`.
+        Watches on the same environment share one watcher and its thread. Once
+        that watcher is closed, the next watch starts a new one.
+        """
+        watcher = self.watchers.get(env_id)
+        if watcher is None or watcher.closed:
+            watcher = self.watchers[env_id] = StreamWatcher(self, env_id, **options)
+        watcher.watch(stream_ids, callback)
+        return watcher
+
+
+    def refresh_views(self) -> Dict[str, int]:
+        """Bring every registered view up to date. Returns the rows applied per view"""
+        return {name: view.refresh() for name, view in self.views.items()}
 
 
     def dump(self, file_path: Path = Path("orbis_db.json")):
@@ -53,14 +183,115 @@ class OrbisDB:
             json.dump(table, file, indent=4)
 
 
+    def export_car(self, env_id: str, path: str, **options) -> Dict[str, Any]:
+        """Write the commit history of every stream in the table to a CARv1 archive, see `export_streams`"""
+        if not self.table_stream:
+            raise ValueError("OrbisDB table stream has not being specified. Cannot export the database.")
+        rows = self._read_rows(env_id, f"SELECT stream_id FROM {self.table_stream}")
+        return export_streams(self.ceramic_client, [row["stream_id"] for row in rows], path, **options)
+
+
+    @timed("model_lookup")
+    def model_definition(self) -> dict:
+        """The table's model definition, loaded from Ceramic once and then served from the model cache
+
+        With a shared query cache, a definition another worker process loaded is read from shared memory.
+        """
+        definition = self.model_cache.get(self.table_stream)
+        if definition is None:
+            shared = self.cache.shared if self.cache is not None else None
+            key = f"model:{self.table_stream}".encode()
+            encoded = shared.get(key) if shared is not None else None
+            if encoded is not None:
+                definition = json.loads(encoded)
+            else:
+                definition = self.ceramic_client.load_stream(self.table_stream, opts={"sync": 0})["state"]["content"]
+                if shared is not None:
+                    # Model definitions are immutable
+                    shared.put(key, json.dumps(definition).encode())
+            self.model_cache[self.table_stream] = definition
+        return definition
+
+
     def add_row(self, entry_data):
-        """Add a new row to the table"""
+        """Add a new row to the table
+
+        With an `outbox`, the signed genesis commit is queued and the new stream ID
+        is returned before the node has seen it. Models with a `set` or `single`
+        account relation are always written directly.
+        """
 
         if not self.controller:
             raise ValueError("Read-only database. OrbisDB controller has not being specified. Cannot write to the database.")
 
+        try:
+            return self._create_row(entry_data)
+        finally:
+            self._invalidate()
+
+
+    def add_rows(self, rows: Iterable[dict], concurrency: int = DEFAULT_PARALLELISM,
+                 validate: bool = True, coerce: bool = False) -> Iterator[dict]:
+        """Add rows from any iterable, `concurrency` at a time, yielding one result per row in input order
+
+        Results are `{"index": i, "stream_id": ...}` or `{"index": i, "error": ...}`
+        for rows that failed conversion (with `coerce`, see `coerce_row`),
+        validation (see `validate_row`) or creation. Rows
+        are pulled from `rows` only as results are consumed, so at most about
+        twice `concurrency` rows are held at once.
+
+        Example:
+            for result in db.add_rows(json.loads(line) for line in open("rows.ndjson")):
+                print(result)
+        """
+        if not self.controller:
+            raise ValueError("Read-only database. OrbisDB controller has not being specified. Cannot write to the database.")
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+        # Checked above rather than on the first next(), so misuse fails at the call
+        return self._add_rows(rows, concurrency, validate, coerce)
+
+
+    def _add_rows(self, rows: Iterable[dict], concurrency: int, validate: bool, coerce: bool) -> Iterator[dict]:
+        window = 2 * concurrency
+        pending: Deque[Tuple[int, Any]] = deque()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            try:
+                for index, row in enumerate(rows):
+                    try:
+                        if coerce:
+                            row = self.coerce_row(row)
+                        if validate:
+                            self.validate_row(row)
+                        pending.append((index, executor.submit(self._create_row, row)))
+                    except ValueError as e:
+                        pending.append((index, e))
+                    while pending and (len(pending) >= window or not isinstance(pending[0][1], Future)
+                                       or pending[0][1].done()):
+                        yield self._row_result(*pending.popleft())
+                while pending:
+                    yield self._row_result(*pending.popleft())
+            finally:
+                for _, outcome in pending:
+                    if isinstance(outcome, Future):
+                        outcome.cancel()
+                self._invalidate()
+
+
+    @staticmethod
+    def _row_result(index: int, outcome: Any) -> dict:
+        try:
+            stream_id = outcome.result() if isinstance(outcome, Future) else None
+        except Exception as e:
+            outcome = e
+        if isinstance(outcome, Exception):
+            return {"index": index, "error": str(outcome)}
+        return {"index": index, "stream_id": stream_id}
+
+
+    def _create_row(self, entry_data):
         # Check if model requires deterministic (set or single relation)
-        model_type = self.ceramic_client.load_stream(self.table_stream, opts={"sync": 0})["state"]["content"]["accountRelation"]["type"]
+        model_type = self.model_definition()["accountRelation"]["type"]
         is_set_or_single = model_type in ["set", "single"]
         
         metadata_args = ModelInstanceDocumentMetadataArgs(
@@ -75,6 +306,10 @@ class OrbisDB:
             deterministic=True
         )
 
+        if self.outbox is not None and not is_set_or_single:
+            genesis = ModelInstanceDocument.make_genesis(self.controller, entry_data, metadata_args)
+            return self.outbox.add_genesis(genesis, DEFAULT_CREATE_OPTS.copy()).stream_id
+
         doc = ModelInstanceDocument.create(self.ceramic_client, entry_data, metadata_args) if not is_set_or_single else ModelInstanceDocument.create(
             ceramic_client=self.ceramic_client,
             content=None,  # Must be None for deterministic creation
@@ -85,39 +320,124 @@ class OrbisDB:
         return doc.stream_id
 
 
+    def coerce_row(self, entry_data: dict) -> dict:
+        """Convert text values, e.g. from a CSV file, to the types declared by the model schema, raising ValueError"""
+        return coerce_row(entry_data, self.model_definition().get("schema", {}))
+
+
+    def coerce_filters(self, filters: dict) -> dict:
+        """Convert text filter values, e.g. from a query string, to the types declared by the model schema
+
+        Scalars, IN lists and operator dicts are converted value by value, so
+        `{"customer_user_id": "3"}` matches the integer column on OrbisDB and
+        on a local replica alike. Columns the schema does not declare are left
+        as they are. Raises ValueError for values that cannot be converted.
+        """
+        schema = self.model_definition().get("schema", {})
+        properties = schema.get("properties", {})
+
+        def convert(value: Any, spec: dict) -> Any:
+            if isinstance(value, dict):
+                return {op: convert(operand, spec) for op, operand in value.items()}
+            if isinstance(value, list):
+                return [convert(item, spec) for item in value]
+            return coerce_value(value, spec, schema)
+
+        return {name: convert(value, properties[name]) if name in properties else value
+                for name, value in filters.items()}
+
+
+    def validate_row(self, entry_data, partial: bool = False) -> None:
+        """Check a row against the model schema's required and allowed fields, raising ValueError
+
+        With `partial` only the fields present are checked, as for an update.
+        """
+        if not isinstance(entry_data, dict):
+            raise ValueError("A row must be a JSON object")
+        schema = self.model_definition().get("schema", {})
+        missing = [] if partial else [name for name in schema.get("required", []) if name not in entry_data]
+        if missing:
+            raise ValueError(f"Missing required fields: {', '.join(missing)}")
+        if schema.get("additionalProperties") is False:
+            unknown = [name for name in entry_data if name not in schema.get("properties", {})]
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+
     def update_rows(self, env_id: str, filters: dict, new_content: dict):
-        """Update rows"""
+        """Update the rows matching `filters`, which must not be empty"""
+
+        if not self.controller:
+            raise ValueError("Read-only database. OrbisDB controller has not being specified. Cannot write to the database.")
+        if not filters:
+            # Without a WHERE clause every row of the table would be patched
+            raise ValueError("update_rows needs at least one filter. Use update_streams to update rows by stream ID.")
+
+        document_ids = [row["stream_id"] for row in self.filter(env_id, filters, columns=["stream_id"])]
+        return self.update_streams(document_ids, new_content)
+
+
+    def update_streams(self, stream_ids: Sequence[str], new_content: dict) -> list:
+        """Update rows by stream ID, concurrently across streams, returning the results in input order
+
+        Commits go through `scheduler`, so updates to the same stream, from
+        this call or from others sharing the scheduler, are applied one at a time in order.
+        If any update fails, the first error is raised once all of them finished.
+        Raises RuntimeError when called from work running on the scheduler, which would deadlock.
+        """
+
+        if not self.controller:
+            raise ValueError("Read-only database. OrbisDB controller has not being specified. Cannot write to the database.")
+        self._check_not_on_lane()
+
+        try:
+            futures = self.scheduler.map(list(stream_ids), lambda stream_id: self._patch_row(stream_id, new_content))
+            wait(futures)
+            return [future.result() for future in futures]
+        finally:
+            self._invalidate()
+
+
+    def update_row(self, stream_id: str, new_content: dict):
+        """Update a single row by its stream ID
+
+        With an `outbox`, the signed commit is queued and the stream ID is returned.
+        Raises RuntimeError when called from work running on the scheduler, which would deadlock.
+        """
 
         if not self.controller:
             raise ValueError("Read-only database. OrbisDB controller has not being specified. Cannot write to the database.")
+        self._check_not_on_lane()
+
+        try:
+            return self.scheduler.submit(stream_id, lambda: self._patch_row(stream_id, new_content)).result()
+        finally:
+            self._invalidate()
 
-        document_ids = [row["stream_id"] for row in self.filter(env_id, filters)]
 
+    def _check_not_on_lane(self) -> None:
+        # Waiting on the scheduler from one of its lanes can wait on that same lane forever
+        if self.scheduler.on_lane():
+            raise RuntimeError("Cannot wait for an update from a commit scheduler lane. "
+                               "Submit it to the scheduler without waiting for the result instead.")
+
+
+    def _patch_row(self, stream_id: str, new_content: dict):
         metadata_args = ModelInstanceDocumentMetadataArgs(
             controller=self.controller.public_key,
             model=self.table_stream,
             context=self.context_stream,
         )
-        return_vals = []
-        
-        for document_id in document_ids:
-            patch = []
-
-            modelInstance = ModelInstanceDocument.load(self.ceramic_client, stream_id=document_id)
-            new_doc = modelInstance.content.copy()
-
-            for key, value in new_content.items():
-                new_doc[key] = value
-                patch.append({
-                    "op": "replace",
-                    "path": f"/{key}",
-                    "value": value
-                })
-
-            item = modelInstance.patch(json_patch=patch, metadata_args=metadata_args, opts={'anchor': True, 'publish': True, 'sync': 0})
-            return_vals.append(item)
-            
-        return return_vals
+        patch = [{"op": "replace", "path": f"/{key}", "value": value} for key, value in new_content.items()]
+        if self.outbox is not None:
+            # Build on the last queued commit of the stream if there is one, otherwise on the node's tip
+            with self.outbox.lock_for(stream_id):
+                genesis_cid, previous_cid = self.outbox.tip(stream_id) or self.ceramic_client.get_stream_commits(stream_id)
+                commit = ModelInstanceDocument.make_patch_commit(self.controller, genesis_cid, previous_cid, patch)
+                self.outbox.add_update(stream_id, commit, {'anchor': True, 'publish': True, 'sync': 0})
+            return stream_id
+        modelInstance = ModelInstanceDocument.load(self.ceramic_client, stream_id=stream_id)
+        return modelInstance.patch(json_patch=patch, metadata_args=metadata_args, opts={'anchor': True, 'publish': True, 'sync': 0})
 
 
     def query(self, env_id: str, query: str):
@@ -125,35 +445,185 @@ class OrbisDB:
 
         Example: SELECT * FROM {TABLE_ID}
         """
+        return self._fetch(env_id, query)["data"]
 
-        body = {
-            "jsonQuery": {
-                "$raw": {
-                    "query": query,
-                    "params": []
-                }
-            },
-            "env": env_id
-        }
-        headers = {
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url=self.read_endpoint, headers=headers, json=body)
-        return response.json()["data"]
 
+    def query_columnar(self, env_id: str, query: str, datetime_columns: Iterable[str] = ()):
+        """Query the database and return the rows as NumPy-backed columns
+
+        String columns are dictionary-encoded and the columns listed in
+        `datetime_columns` are parsed into datetime64. Requires numpy
+        (`pip install ceramicsdk[columnar]`).
+
+        Example:
+            result = db.query_columnar(env_id, f"SELECT * FROM {TABLE_ID}", datetime_columns=["timestamp"])
+            views = result.group_count("customer_user_id", "page")
+        """
+        from .columnar import ColumnarResult, iter_rows
+
+        # Rows go from the response text into the columns one by one, never all as dicts at once
+        return ColumnarResult.from_rows(iter_rows(self._fetch_raw(env_id, query)), datetime_columns)
+
+
+    def filter(self, env_id: str, filters: dict, columns: Optional[Sequence[str]] = None,
+               order_by: Optional[OrderBy] = None, limit: Optional[int] = None, chunk_size: int = 1000):
+        """Filter rows
 
-    def filter(self, env_id: str, filters):
-        """Filter"""
+        Filter values can be scalars (equality), lists (IN) or dicts of
+        operators (eq, ne, gt, gte, lt, lte, in) for ranges. `columns` limits
+        the selected columns and `order_by` takes column names, prefixed with
+        "-" for descending order. Values are sent as bound parameters.
 
-        filter_list = [f'{key} = {f"'{value}'" if isinstance(value, str) else value}' for key, value in filters.items()]  # strings need to be wrapped around single quotes
-        joined_filters = " AND ".join(filter_list)
-        query = f"SELECT * FROM {self.table_stream} WHERE {joined_filters}"
+        Example:
+            db.filter(env_id, {
+                "customer_user_id": [3, 8, 12],
+                "timestamp": {"gte": "2024-09-25T15:00:00Z", "lt": "2024-09-25T16:00:00Z"},
+            }, columns=["stream_id", "page"], order_by="-timestamp", limit=100)
 
+        IN lists longer than `chunk_size` are split over several queries and
+        the results merged, re-sorted and truncated client-side.
+        """
+        chunks = chunk_filters(filters, chunk_size)
+        if len(chunks) == 1:
+            query, params = build_select(self.table_stream, filters, columns, order_by, limit)
+            return self._read_rows(env_id, query, params)
+
+        # Ordering columns must come back with the rows to merge the chunks
+        extra = [name for name, _ in parse_order_by(order_by) if columns and name not in columns]
+        select = list(columns) + extra if columns else None
+        queries = [build_select(self.table_stream, chunk, select, order_by, limit) for chunk in chunks]
+        rows = [row for part in self._run_queries(env_id, queries) for row in part]
+        if order_by:
+            rows = sort_rows(rows, order_by)
+        if limit is not None:
+            rows = rows[:limit]
+        for row in rows if extra else ():
+            for name in extra:
+                del row[name]
+        return rows
+
+
+    def load_related(self, env_id: str, rows: List[dict], column: str, table: Optional[str] = None,
+                     attach_as: Optional[str] = None, columns: Optional[Sequence[str]] = None,
+                     identity_map: Optional[Dict[str, dict]] = None, chunk_size: int = 1000) -> List[dict]:
+        """Attach the rows referenced by stream ID in `column`, fetched in batches
+
+        Instead of one query per reference, the distinct IDs are collected and
+        fetched with chunked IN queries against `table` (this table by
+        default). Each referenced row is attached to the referencing rows under
+        `attach_as` (`author_id` -> `author`, otherwise `<column>_row`), or
+        None if it was not found.
+
+        `identity_map` (stream ID -> row) is consulted before fetching and
+        filled afterwards; pass the same dict to several calls to never fetch
+        a row twice.
+
+        Example:
+            posts = db.filter(env_id, {"channel": "general"}, limit=1000)
+            db.load_related(env_id, posts, "author_id", table=PROFILE_TABLE)
+            posts[0]["author"]["name"]
+        """
+        table = table or self.table_stream
+        if attach_as is None:
+            attach_as = column[:-3] if column.endswith("_id") else f"{column}_row"
+        identity_map = {} if identity_map is None else identity_map
+
+        wanted = {row[column] for row in rows if row.get(column) is not None}
+        missing = [stream_id for stream_id in wanted if stream_id not in identity_map]
+        if missing:
+            select = list(columns) + (["stream_id"] if "stream_id" not in columns else []) if columns else None
+            queries = [build_select(table, chunk, select) for chunk in chunk_filters({"stream_id": missing}, chunk_size)]
+            for part in self._run_queries(env_id, queries):
+                for related in part:
+                    identity_map[related["stream_id"]] = related
+
+        for row in rows:
+            row[attach_as] = identity_map.get(row.get(column))
+        return rows
+
+
+    def scan_range(self, env_id: str, column: str, start: Any, end: Any, partitions: int = DEFAULT_PARALLELISM,
+                   parallelism: Optional[int] = None, filters: Optional[dict] = None,
+                   columns: Optional[Sequence[str]] = None) -> List[dict]:
+        """Read rows with `start <= column < end`, split into concurrent sub-range queries
+
+        The range (timestamps as ISO strings or datetimes, or numbers) is cut
+        into `partitions` equal sub-ranges that run `parallelism` at a time
+        over the pooled session. Rows come back ordered by `column`.
+
+        Example: db.scan_range(env_id, "timestamp", "2024-06-01T00:00:00+00:00", "2024-09-01T00:00:00+00:00", partitions=16)
+        """
+        return list(self.iter_range(env_id, column, start, end, partitions, parallelism, filters, columns))
+
+
+    def iter_range(self, env_id: str, column: str, start: Any, end: Any, partitions: int = DEFAULT_PARALLELISM,
+                   parallelism: Optional[int] = None, filters: Optional[dict] = None,
+                   columns: Optional[Sequence[str]] = None, ordered: bool = True) -> Iterator[dict]:
+        """Stream the rows of a range scan as the sub-range queries complete
+
+        With `ordered=True` rows are yielded in `column` order, each partition
+        as soon as it and every partition before it are done. With
+        `ordered=False` each partition is yielded as soon as it completes.
+        """
+        bounds = split_range(start, end, partitions)
+        queries = []
+        for low, high in zip(bounds, bounds[1:]):
+            part = {**(filters or {}), column: {"gte": low, "lt": high}}
+            queries.append(build_select(self.table_stream, part, columns, column if ordered else None))
+        for rows in self._run_queries(env_id, queries, parallelism, ordered):
+            yield from rows
+
+
+    def _run_queries(self, env_id: str, queries: List[Tuple[str, list]], parallelism: Optional[int] = None,
+                     ordered: bool = True) -> Iterator[list]:
+        """Run table reads concurrently, yielding each result in submission or completion order"""
+        parallelism = min(parallelism or DEFAULT_PARALLELISM, len(queries))
+        if parallelism <= 1:
+            for query, params in queries:
+                yield self._read_rows(env_id, query, params)
+            return
+
+        with ThreadPoolExecutor(max_workers=parallelism) as executor:
+            futures = [executor.submit(self._read_rows, env_id, query, params) for query, params in queries]
+            try:
+                for future in (futures if ordered else as_completed(futures)):
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+
+    def _read_rows(self, env_id: str, query: str, params: Optional[list] = None) -> list:
+        """Run a table read against the local replica if there is one, otherwise against OrbisDB"""
+        if (self.replica is not None and self.replica.env_id == env_id
+                and referenced_tables(query) == {self.replica.table}):
+            return self.replica.query(query, params)
+        return self._fetch(env_id, query, params)["data"]
+
+
+    def _fetch(self, env_id: str, query: str, params: Optional[list] = None, use_cache: bool = True) -> dict:
+        """Run a raw SQL query, through the query cache when one is configured"""
+        payload = json.loads(self._fetch_raw(env_id, query, params, use_cache))
+        if not isinstance(payload, dict) or not isinstance(payload.get("data"), list):
+            raise ValueError("OrbisDB returned a response without data")
+        return payload
+
+
+    def _fetch_raw(self, env_id: str, query: str, params: Optional[list] = None, use_cache: bool = True) -> bytes:
+        """Response body of a raw SQL query, through the query cache when one is configured"""
+        params = params or []
+        if self.cache is None or not use_cache:
+            return self._post_query(env_id, query, params)
+        return self.cache.get_or_load(env_id, query, params, lambda: self._post_query(env_id, query, params))
+
+
+    @timed("orbis_query")
+    def _post_query(self, env_id: str, query: str, params: list) -> bytes:
         body = {
             "jsonQuery": {
                 "$raw": {
                     "query": query,
-                    "params": []
+                    "params": params
                 }
             },
             "env": env_id
@@ -161,7 +631,15 @@ class OrbisDB:
         headers = {
             "Content-Type": "application/json"
         }
-        response = requests.post(url=self.read_endpoint, headers=headers, json=body)
-        return response.json().get("data", [])
-
-
+        response = self.session.post(url=self.read_endpoint, headers=headers, json=body)
+        response.raise_for_status()
+        _check_query_response(response.content)
+        return response.content
+
+
+    def _invalidate(self):
+        """Drop cached results for this table after a write"""
+        if self.cache is not None and self.table_stream:
+            self.cache.invalidate(self.table_stream)
+        if self.replica is not None:
+            self.replica.mark_stale()
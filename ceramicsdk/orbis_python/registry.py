@@ -0,0 +1,116 @@
+# orbis_python/registry.py
+
+import threading
+from typing import Any, Dict, List, Optional
+
+from .cache import QueryCache
+from .orbis_db import DEFAULT_PARALLELISM, DEFAULT_POOL_SIZE, OrbisDB
+from .scheduler import CommitScheduler
+
+
+class ClientRegistry:
+    """Process-wide OrbisDB handles, one per agent, built once and shared by every request
+
+    Building an OrbisDB derives the controller's Ed25519 keys and did:key and
+    sets up a Ceramic client, which is wasted work when repeated per request.
+    The registry builds a handle per agent seed up front. All handles share one
+    pooled HTTP session, one model-definition cache, the optional query
+    cache and one commit scheduler with `lanes` lanes, so updates to a
+    stream are ordered across agents. They are safe to use from concurrent
+    request threads. With `limits`, the session is a LimitedSession built
+    from those arguments, and every call to Ceramic and OrbisDB waits for
+    its endpoint's adaptive concurrency limit.
+
+    Unknown agents (and `None`) get the default handle, whose controller is
+    `default_seed` or a random DID generated once at startup.
+
+    Example:
+        registry = ClientRegistry(CERAMIC_ENDPOINT, ORBIS_ENDPOINT, {"agent_one": AGENT_ONE_SEED},
+                                  context_stream=CONTEXT_ID, table_stream=TABLE_ID)
+        registry.get("agent_one").read(ENV_ID)
+    """
+
+    def __init__(
+        self,
+        c_endpoint: str,
+        o_endpoint: str,
+        seeds: Dict[str, Optional[str]],
+        context_stream: Optional[str] = None,
+        table_stream: Optional[str] = None,
+        cache: Optional[QueryCache] = None,
+        default_seed: Optional[str] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        lanes: int = DEFAULT_PARALLELISM,
+        limits: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.c_endpoint = c_endpoint
+        self.o_endpoint = o_endpoint
+        self.context_stream = context_stream
+        self.table_stream = table_stream
+        self.cache = cache
+        self.pool_size = pool_size
+        self.lanes = lanes
+        self.limits = limits
+        self.session = OrbisDB._make_session(pool_size, limits)
+        self.scheduler = CommitScheduler(lanes)
+        self.model_cache: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._handles = {agent: self._build(seed) for agent, seed in seeds.items()}
+        self.default = self._build(default_seed)
+
+    def _build(self, seed: Optional[str]) -> OrbisDB:
+        return OrbisDB(
+            c_endpoint=self.c_endpoint,
+            o_endpoint=self.o_endpoint,
+            context_stream=self.context_stream,
+            table_stream=self.table_stream,
+            controller_private_key=seed,
+            cache=self.cache,
+            session=self.session,
+            model_cache=self.model_cache,
+            scheduler=self.scheduler,
+        )
+
+    def get(self, agent: Optional[str]) -> OrbisDB:
+        """The handle for `agent`, or the default handle for unknown agents"""
+        return self._handles.get(agent, self.default)
+
+    def register(self, agent: str, seed: Optional[str]) -> OrbisDB:
+        """Add or replace the handle for `agent`"""
+        handle = self._build(seed)
+        with self._lock:
+            self._handles = {**self._handles, agent: handle}
+        return handle
+
+    @property
+    def agents(self) -> List[str]:
+        return list(self._handles)
+
+    def handles(self) -> List[OrbisDB]:
+        return [*self._handles.values(), self.default]
+
+    def reopen(self) -> None:
+        """Give every handle a new connection pool and commit scheduler, e.g. in a worker process after fork
+
+        Connections opened before a fork would otherwise be shared by every
+        child process, and scheduler threads do not survive a fork.
+        """
+        self.session = OrbisDB._make_session(self.pool_size, self.limits)
+        self.scheduler = CommitScheduler(self.lanes)
+        for handle in self.handles():
+            handle.session = self.session
+            handle.ceramic_client.session = self.session
+            handle.scheduler = self.scheduler
+
+    def warm_up(self, env_id: Optional[str] = None) -> None:
+        """Load the model definition and open connections to Ceramic and OrbisDB before the first request
+
+        Controller keys are already derived when the registry is built. With
+        `env_id`, a one-row query opens the connection to the Orbis query
+        endpoint as well.
+        """
+        if not self.table_stream:
+            return
+        self.default.model_definition()
+        if env_id:
+            self.default._fetch(env_id, f"SELECT stream_id FROM {self.table_stream} LIMIT 1", use_cache=False)
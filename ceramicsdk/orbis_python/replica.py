@@ -0,0 +1,234 @@
+# orbis_python/replica.py
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .sql import quote_identifier
+
+if TYPE_CHECKING:
+    from .orbis_db import OrbisDB
+
+
+META_TABLE = "_orbis_replica_meta"
+
+
+def bind_params(params: Iterable[Any]) -> Dict[str, Any]:
+    """Map Postgres-style positional params ($1, $2, ...) onto SQLite named params"""
+    return {str(i): _to_sqlite(value) for i, value in enumerate(params, start=1)}
+
+
+def _to_sqlite(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"))
+    return value
+
+
+def iter_pages(db: "OrbisDB", env_id: str, table: str, watermark_column: str, cursor: tuple, page_size: int,
+               columns: Optional[Sequence[str]] = None) -> Iterator[Tuple[List[Dict[str, Any]], tuple]]:
+    """Yield `(rows, cursor)` for each page of rows past a `(watermark, stream_id)` cursor
+
+    Pages are read in (watermark, stream_id) order, uncached, until one comes
+    back short. A `(None, None)` cursor starts from the first row.
+
+    A full page whose last row has a NULL watermark raises ValueError: no
+    cursor can page past it, and restarting from the first row would loop.
+    """
+    quoted = quote_identifier(table)
+    watermark = quote_identifier(watermark_column)
+    select = ", ".join(quote_identifier(column) for column in columns) if columns else "*"
+    while True:
+        cursor_watermark, cursor_id = cursor
+        if cursor_watermark is None:
+            query = f"SELECT {select} FROM {quoted} ORDER BY {watermark}, stream_id LIMIT $1"
+            params = [page_size]
+        else:
+            query = (
+                f"SELECT {select} FROM {quoted} WHERE {watermark} > $1 OR ({watermark} = $1 AND stream_id > $2) "
+                f"ORDER BY {watermark}, stream_id LIMIT $3"
+            )
+            params = [cursor_watermark, cursor_id, page_size]
+        rows = db._fetch(env_id, query, params, use_cache=False)["data"]
+        if rows:
+            last = rows[-1]
+            cursor = (last.get(watermark_column), last["stream_id"])
+            if len(rows) == page_size and cursor[0] is None:
+                raise ValueError(f"Cannot page {table} past row {cursor[1]}: its {watermark_column} is NULL")
+            yield rows, cursor
+        if len(rows) < page_size:
+            return
+
+
+class OrbisReplica:
+    """A local SQLite mirror of one OrbisDB table
+
+    The first sync bulk-loads the table; later syncs only pull rows whose
+    watermark column (``indexed_at`` by default) is at or past the last one
+    seen, paging with a (watermark, stream_id) cursor. Reads run against the
+    local file and trigger a sync first when the data is older than
+    ``max_staleness`` seconds.
+
+    Syncs only add and update rows: a row deleted from the OrbisDB table is
+    never removed from the local copy. Rebuild the replica from an empty
+    file to drop such rows.
+
+    SQLite compares values by type, so a text param such as ``'3'`` does not
+    match an integer column. Bind params with the column's type, e.g. filters
+    converted by ``OrbisDB.coerce_filters``.
+    """
+
+    def __init__(
+        self,
+        db: "OrbisDB",
+        env_id: str,
+        path: str = "orbis_replica.db",
+        max_staleness: float = 60.0,
+        watermark_column: str = "indexed_at",
+        page_size: int = 5000,
+    ) -> None:
+        if not db.table_stream:
+            raise ValueError("OrbisDB table stream has not being specified. Cannot replicate the database.")
+        self.db = db
+        self.env_id = env_id
+        self.table = db.table_stream
+        self.path = path
+        self.max_staleness = max_staleness
+        self.watermark_column = watermark_column
+        self.page_size = page_size
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {META_TABLE} ("
+            "table_id TEXT, env_id TEXT, cursor_watermark, cursor_stream_id TEXT, "
+            "synced_at REAL, json_columns TEXT, PRIMARY KEY (table_id, env_id))"
+        )
+        self._columns = self._load_columns()
+        self._load_meta()
+
+    def _load_meta(self) -> None:
+        row = self._conn.execute(
+            f"SELECT * FROM {META_TABLE} WHERE table_id = ? AND env_id = ?", (self.table, self.env_id)
+        ).fetchone()
+        if row is None:
+            self.cursor = (None, None)
+            self.synced_at = 0.0
+            self._json_columns = set()
+        else:
+            self.cursor = (row["cursor_watermark"], row["cursor_stream_id"])
+            self.synced_at = row["synced_at"]
+            self._json_columns = set(json.loads(row["json_columns"]))
+
+    def _save_meta(self) -> None:
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO {META_TABLE} VALUES (?, ?, ?, ?, ?, ?)",
+            (self.table, self.env_id, self.cursor[0], self.cursor[1], self.synced_at,
+             json.dumps(sorted(self._json_columns))),
+        )
+
+    def _load_columns(self) -> List[str]:
+        rows = self._conn.execute(f"PRAGMA table_info({quote_identifier(self.table)})").fetchall()
+        return [row["name"] for row in rows]
+
+    def _ensure_columns(self, names: Iterable[str]) -> None:
+        table = quote_identifier(self.table)
+        if not self._columns:
+            self._conn.execute(f"CREATE TABLE {table} (stream_id TEXT PRIMARY KEY)")
+            self._columns = ["stream_id"]
+        for name in names:
+            if name not in self._columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {quote_identifier(name)}")
+                self._columns.append(name)
+                if name == self.watermark_column:
+                    self._conn.execute(
+                        f"CREATE INDEX {quote_identifier(self.table + '_watermark')} "
+                        f"ON {table} ({quote_identifier(name)})"
+                    )
+
+    @property
+    def staleness(self) -> float:
+        """Seconds since the last successful sync"""
+        return time.time() - self.synced_at
+
+    def refresh(self) -> int:
+        """Pull new and updated rows from OrbisDB. Returns the number of rows applied"""
+        with self._lock:
+            applied = 0
+            started_at = time.time()
+            for rows, cursor in iter_pages(self.db, self.env_id, self.table, self.watermark_column, self.cursor,
+                                           self.page_size):
+                self._apply(rows, cursor)
+                applied += len(rows)
+            self.synced_at = started_at
+            self._conn.execute("BEGIN")
+            self._save_meta()
+            self._conn.execute("COMMIT")
+            logging.debug(f"Replica of {self.table} applied {applied} rows")
+            return applied
+
+    def _apply(self, rows: List[Dict[str, Any]], cursor: tuple) -> None:
+        """Upsert a page of rows and advance the cursor in one transaction"""
+        names: Dict[str, None] = {}
+        for row in rows:
+            names.update(dict.fromkeys(row))
+            for name, value in row.items():
+                if isinstance(value, (dict, list)):
+                    self._json_columns.add(name)
+        previous = self.cursor
+        self._conn.execute("BEGIN")
+        try:
+            self._ensure_columns(names)
+            columns = list(names)
+            statement = (
+                f"INSERT OR REPLACE INTO {quote_identifier(self.table)} "
+                f"({', '.join(quote_identifier(name) for name in columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})"
+            )
+            self._conn.executemany(statement, [[_to_sqlite(row.get(name)) for name in columns] for row in rows])
+            self.cursor = cursor
+            self._save_meta()
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            self.cursor = previous
+            self._columns = self._load_columns()
+            raise
+
+    def mark_stale(self) -> None:
+        """Force a sync before the next read, e.g. after this client wrote to the table"""
+        self.synced_at = 0.0
+
+    def ensure_fresh(self) -> None:
+        """Sync first if the local copy is older than the staleness bound"""
+        if self.staleness > self.max_staleness:
+            self.refresh()
+
+    def query(self, query: str, params: Optional[Iterable[Any]] = None) -> List[Dict[str, Any]]:
+        """Run SQL against the local copy. Positional params use the $1, $2 style"""
+        self.ensure_fresh()
+        with self._lock:
+            if not self._columns:
+                return []
+            rows = self._conn.execute(query, bind_params(params or [])).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def get(self, stream_id: str) -> Optional[Dict[str, Any]]:
+        """Look up a single row by stream ID"""
+        rows = self.query(f"SELECT * FROM {quote_identifier(self.table)} WHERE stream_id = $1", [stream_id])
+        return rows[0] if rows else None
+
+    def _decode(self, row: sqlite3.Row) -> Dict[str, Any]:
+        decoded = dict(row)
+        for name in self._json_columns.intersection(decoded):
+            if decoded[name] is not None:
+                decoded[name] = json.loads(decoded[name])
+        return decoded
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
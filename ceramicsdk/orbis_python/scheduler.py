@@ -0,0 +1,135 @@
+# orbis_python/scheduler.py
+
+import logging
+import os
+import queue
+import threading
+import zlib
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+
+class CommitScheduler:
+    """Runs commits on `lanes` worker threads, one lane per stream, in the order they were submitted
+
+    Each update commit builds on the previous tip of its stream, so two commits
+    to the same stream must not run at the same time. The scheduler hashes the
+    stream ID onto a lane, and each lane runs its work strictly first in,
+    first out. Work for streams on different lanes runs concurrently. The
+    hash is stable across processes, so a stream always lands on the same
+    lane. `depths()` reports the work waiting on each lane.
+
+    Work running on a lane must not wait for other work of the same
+    scheduler: the lane it waits on may be its own, or busy waiting in turn.
+    `on_lane()` tells whether the calling thread is one of the lanes.
+
+    Example:
+        scheduler = CommitScheduler(lanes=8)
+        future = scheduler.submit(stream_id, lambda: ceramic_client.apply_commit(stream_id, commit, opts))
+        future.result()
+    """
+
+    def __init__(self, lanes: int = 8, name: str = "orbis-commit") -> None:
+        if lanes < 1:
+            raise ValueError("CommitScheduler needs at least one lane")
+        self.lanes = lanes
+        self.name = name
+        self._queues: List["queue.SimpleQueue"] = [queue.SimpleQueue() for _ in range(lanes)]
+        self._depths = [0] * lanes
+        self._lock = threading.Lock()
+        self._threads: Optional[List[threading.Thread]] = None
+        self._closed = False
+        self._local = threading.local()
+
+    def lane(self, stream_id: str) -> int:
+        return zlib.crc32(str(stream_id).encode()) % self.lanes
+
+    def _start(self) -> None:
+        self._threads = [threading.Thread(target=self._run, args=(index,), name=f"{self.name}-{index}", daemon=True)
+                         for index in range(self.lanes)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, stream_id: str, fn: Callable[[], Any]) -> Future:
+        """Run `fn` on the lane of `stream_id`, after the work submitted to that lane before it"""
+        future: Future = Future()
+        lane = self.lane(stream_id)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("CommitScheduler is shut down")
+            if self._threads is None:
+                # Threads start with the first commit, so idle handles cost nothing
+                self._start()
+            self._depths[lane] += 1
+        self._queues[lane].put((future, fn))
+        return future
+
+    def map(self, stream_ids: List[str], fn: Callable[[str], Any]) -> List[Future]:
+        """Submit `fn(stream_id)` for each stream. The futures are returned in input order"""
+        return [self.submit(stream_id, lambda stream_id=stream_id: fn(stream_id)) for stream_id in stream_ids]
+
+    def on_lane(self) -> bool:
+        """Whether the calling thread is one of this scheduler's lanes"""
+        return getattr(self._local, "lane", None) is not None
+
+    def _run(self, lane: int) -> None:
+        self._local.lane = lane
+        work = self._queues[lane]
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            future, fn = item
+            with self._lock:
+                self._depths[lane] -= 1
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                logging.debug(f"Commit on lane {lane} failed: {e}")
+                future.set_exception(e)
+
+    def depths(self) -> List[int]:
+        """Work waiting on each lane, not counting the commit each lane is running"""
+        with self._lock:
+            return list(self._depths)
+
+    @property
+    def depth(self) -> int:
+        with self._lock:
+            return sum(self._depths)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting work. Lanes finish the work already submitted"""
+        with self._lock:
+            self._closed = True
+            threads = self._threads or []
+        for work in self._queues:
+            work.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+_default: Optional[CommitScheduler] = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler() -> CommitScheduler:
+    """The scheduler shared by OrbisDB handles created without one, so each handle does not start its own lanes"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = CommitScheduler(name="orbis-commit-default")
+        return _default
+
+
+def _forget_default() -> None:
+    # Lane threads do not survive a fork; the child starts a scheduler of its own
+    global _default, _default_lock
+    _default, _default_lock = None, threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_default)
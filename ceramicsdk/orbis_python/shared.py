@@ -0,0 +1,306 @@
+# orbis_python/shared.py
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: orbis_python still imports, SharedMemoryCache cannot be opened
+    fcntl = None
+
+
+MAGIC = b"OSHM\x01\x00\x00\x00"
+# Magic, slot count, slot size, arena size, arena write position (bytes ever allocated), evictions, writes
+HEADER = struct.Struct("<8sIIQQQQ")
+HEADER_BYTES = 64
+ARENA_WRITE_OFFSET = 24
+# Invalidation counters, a table is bumped in the counter its name hashes to
+COUNTERS = 1024
+COUNTER = struct.Struct("<Q")
+# Sequence, flags, referenced, key hash, expiry (Unix time, 0 for never), key length, value length,
+# arena position, CRC-32 of key and value
+SLOT_HEADER = struct.Struct("<IBBxxQdIIQI")
+SLOT_HEADER_BYTES = 48
+SEQUENCE = struct.Struct("<I")
+HASH_OFFSET = 8
+REFERENCED_OFFSET = 5
+USED = 1
+IN_ARENA = 2
+# Slots looked at for one key, starting at the one its hash points to
+PROBE = 8
+
+
+def _hash(key: bytes) -> int:
+    # Not hash(): it is seeded differently in every process that is not forked from the same parent
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+class SharedMemoryCache:
+    """Cache of bytes values in a memory-mapped file, shared by every process on a host that opens the same path
+
+    The file holds a hash table of `slots` fixed-size slots and an overflow
+    arena of `arena_bytes`. A key and value that fit in a slot are stored in
+    it. Larger ones go to the arena, a ring that is overwritten from the
+    start once it is full. A key is looked up in the PROBE slots after the
+    one its hash selects.
+
+    Reads take no lock. Each slot has a sequence number that writers make
+    odd while they change the slot (a seqlock). A reader copies the slot and
+    keeps it only if the sequence was even and unchanged around the copy.
+    Arena data is kept only if the ring did not wrap over it while it was
+    copied. The CRC-32 of key and value is checked as well. A read that races
+    a write is a miss, never a torn value.
+
+    Writers are serialized by a POSIX lock on the file and a thread lock.
+    Eviction is coordinated through the shared slots: every read marks its
+    slot as referenced, and a writer that finds no free or expired slot in
+    the probe window takes the first unreferenced one, clearing the marks it
+    passes (CLOCK). Each process keeps its own hit and miss counters.
+
+    `bump(name)` increments a shared invalidation counter and
+    `generation(name)` reads it. Callers put the generations of what a value
+    depends on into its key, so a bump in one worker makes every worker miss
+    the stale entries, which then age out.
+
+    Example:
+        shared = SharedMemoryCache("/dev/shm/orbis-cache", slots=65536, arena_bytes=64 << 20)
+        cache = QueryCache(ttl=10, shared=shared)
+    """
+
+    def __init__(self, path: str, slots: int = 65536, slot_bytes: int = 512, arena_bytes: int = 64 << 20) -> None:
+        if slot_bytes <= SLOT_HEADER_BYTES or slot_bytes % 8:
+            raise ValueError(f"SharedMemoryCache slot_bytes must be a multiple of 8 over {SLOT_HEADER_BYTES}")
+        if slots < PROBE:
+            raise ValueError(f"SharedMemoryCache needs at least {PROBE} slots")
+        if fcntl is None:
+            raise RuntimeError("SharedMemoryCache needs POSIX file locks (fcntl), which this platform lacks")
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = HEADER_BYTES + COUNTERS * COUNTER.size + slots * slot_bytes + arena_bytes
+        with self._write_lock():
+            header = os.pread(self._fd, HEADER.size, 0)
+            if len(header) == HEADER.size and header.startswith(MAGIC):
+                # Attach with the geometry of the process that created the file
+                _, slots, slot_bytes, arena_bytes, _, _, _ = HEADER.unpack(header)
+                size = HEADER_BYTES + COUNTERS * COUNTER.size + slots * slot_bytes + arena_bytes
+            else:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, HEADER.pack(MAGIC, slots, slot_bytes, arena_bytes, 0, 0, 0), 0)
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.arena_bytes = arena_bytes
+        self.map = mmap.mmap(self._fd, size)
+        self._counters = HEADER_BYTES
+        self._table = self._counters + COUNTERS * COUNTER.size
+        self._arena = self._table + slots * slot_bytes
+
+    def _write_lock(self):
+        return _WriteLock(self._lock, self._fd)
+
+    def _slot(self, index: int) -> int:
+        return self._table + index * self.slot_bytes
+
+    def _begin_write(self, offset: int) -> int:
+        # Odd whatever the slot held before, even if a writer died halfway through it
+        writing = SEQUENCE.unpack_from(self.map, offset)[0] | 1
+        SEQUENCE.pack_into(self.map, offset, writing)
+        return writing
+
+    def _end_write(self, offset: int, writing: int) -> None:
+        SEQUENCE.pack_into(self.map, offset, (writing + 1) & 0xFFFFFFFF)
+
+    def _arena_write(self) -> int:
+        return struct.unpack_from("<Q", self.map, ARENA_WRITE_OFFSET)[0]
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        """The value stored under `key`, None when it is missing, expired or being written"""
+        value = self._read(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def _read(self, key: bytes) -> Optional[bytes]:
+        key_hash = _hash(key)
+        for index in self._window(key_hash):
+            offset = self._slot(index)
+            if struct.unpack_from("<Q", self.map, offset + HASH_OFFSET)[0] != key_hash:
+                continue
+            sequence = SEQUENCE.unpack_from(self.map, offset)[0]
+            if sequence & 1:
+                return None
+            raw = self.map[offset:offset + self.slot_bytes]
+            _, flags, _, stored_hash, expires, key_length, value_length, position, crc = SLOT_HEADER.unpack_from(raw)
+            if not flags & USED or stored_hash != key_hash:
+                continue
+            if flags & IN_ARENA:
+                data = self._read_arena(position, key_length + value_length)
+                if data is None:
+                    return None
+            else:
+                data = raw[SLOT_HEADER_BYTES:SLOT_HEADER_BYTES + key_length + value_length]
+            if SEQUENCE.unpack_from(self.map, offset)[0] != sequence or zlib.crc32(data) != crc:
+                return None
+            if data[:key_length] != key:
+                continue
+            if expires and expires <= time.time():
+                return None
+            self.map[offset + REFERENCED_OFFSET] = 1
+            return data[key_length:]
+        return None
+
+    def _read_arena(self, position: int, length: int) -> Optional[bytes]:
+        start = self._arena + position % self.arena_bytes
+        data = self.map[start:start + length]
+        # Overwritten once the ring has gone round past it, possibly while it was being copied
+        if self._arena_write() - self.arena_bytes > position:
+            return None
+        return data
+
+    def _window(self, key_hash: int):
+        first = key_hash % self.slots
+        return [(first + i) % self.slots for i in range(PROBE)]
+
+    def put(self, key: bytes, value: bytes, ttl: Optional[float] = None) -> bool:
+        """Store `value` under `key` for `ttl` seconds (forever when None). False when it is too large to cache"""
+        data = key + value
+        inline = len(data) <= self.slot_bytes - SLOT_HEADER_BYTES
+        if not inline and len(data) > self.arena_bytes // 4:
+            return False
+        key_hash = _hash(key)
+        expires = time.time() + ttl if ttl is not None else 0.0
+        with self._write_lock():
+            index = self._victim(key, key_hash)
+            offset = self._slot(index)
+            position = 0
+            if not inline:
+                position = self._allocate(len(data))
+                start = self._arena + position % self.arena_bytes
+                self.map[start:start + len(data)] = data
+            writing = self._begin_write(offset)
+            SLOT_HEADER.pack_into(self.map, offset, writing, USED | (0 if inline else IN_ARENA), 0, key_hash,
+                                  expires, len(key), len(value), position, zlib.crc32(data))
+            if inline:
+                self.map[offset + SLOT_HEADER_BYTES:offset + SLOT_HEADER_BYTES + len(data)] = data
+            self._end_write(offset, writing)
+            self._count(40)
+        return True
+
+    def _allocate(self, length: int) -> int:
+        """Reserve `length` bytes of the arena. The write position moves before the data is written"""
+        position = self._arena_write()
+        if position % self.arena_bytes + length > self.arena_bytes:
+            # Never wrap a value around the end of the ring
+            position += self.arena_bytes - position % self.arena_bytes
+        struct.pack_into("<Q", self.map, ARENA_WRITE_OFFSET, position + length)
+        return position
+
+    def _count(self, offset: int) -> None:
+        struct.pack_into("<Q", self.map, offset, struct.unpack_from("<Q", self.map, offset)[0] + 1)
+
+    def _victim(self, key: bytes, key_hash: int) -> int:
+        """Slot to write `key` to: its current slot, a free or expired one, else one picked by CLOCK"""
+        window = self._window(key_hash)
+        now = time.time()
+        free = None
+        for index in window:
+            offset = self._slot(index)
+            _, flags, _, stored_hash, expires, key_length, _, position, _ = SLOT_HEADER.unpack_from(self.map, offset)
+            if flags & USED and stored_hash == key_hash and self._stored_key(offset, flags, key_length, position) == key:
+                return index
+            if free is None and (not flags & USED or (expires and expires <= now)
+                                 or flags & IN_ARENA and self._arena_write() - self.arena_bytes > position):
+                free = index
+        if free is not None:
+            return free
+        for index in window:
+            offset = self._slot(index)
+            if not self.map[offset + REFERENCED_OFFSET]:
+                self._count(32)
+                return index
+            self.map[offset + REFERENCED_OFFSET] = 0
+        self._count(32)
+        return window[0]
+
+    def _stored_key(self, offset: int, flags: int, key_length: int, position: int) -> Optional[bytes]:
+        if flags & IN_ARENA:
+            return self._read_arena(position, key_length)
+        return self.map[offset + SLOT_HEADER_BYTES:offset + SLOT_HEADER_BYTES + key_length]
+
+    def delete(self, key: bytes) -> bool:
+        key_hash = _hash(key)
+        with self._write_lock():
+            for index in self._window(key_hash):
+                offset = self._slot(index)
+                _, flags, _, stored_hash, _, key_length, _, position, _ = SLOT_HEADER.unpack_from(self.map, offset)
+                if flags & USED and stored_hash == key_hash and self._stored_key(offset, flags, key_length, position) == key:
+                    writing = self._begin_write(offset)
+                    SLOT_HEADER.pack_into(self.map, offset, writing, 0, 0, 0, 0.0, 0, 0, 0, 0)
+                    self._end_write(offset, writing)
+                    return True
+        return False
+
+    def _counter(self, name: str) -> int:
+        return self._counters + (_hash(name.encode()) % COUNTERS) * COUNTER.size
+
+    def generation(self, name: str) -> int:
+        """Current value of the invalidation counter of `name`"""
+        return COUNTER.unpack_from(self.map, self._counter(name))[0]
+
+    def bump(self, name: str) -> int:
+        """Increment the invalidation counter of `name` in every process. Returns the new value"""
+        offset = self._counter(name)
+        with self._write_lock():
+            value = COUNTER.unpack_from(self.map, offset)[0] + 1
+            COUNTER.pack_into(self.map, offset, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Hits and misses of this process, evictions and writes of all of them"""
+        _, _, _, _, arena_write, evictions, writes = HEADER.unpack_from(self.map, 0)
+        used = sum(1 for index in range(self.slots) if self.map[self._slot(index) + 4] & USED)
+        return {"hits": self.hits, "misses": self.misses, "entries": used, "slots": self.slots,
+                "arena_bytes": self.arena_bytes, "arena_written": arena_write, "evictions": evictions, "writes": writes}
+
+    def close(self) -> None:
+        self.map.close()
+        os.close(self._fd)
+
+    def __enter__(self) -> "SharedMemoryCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class _WriteLock:
+    """Thread lock, then a POSIX lock on the file: POSIX locks belong to the process and do not exclude its threads"""
+
+    def __init__(self, lock: threading.Lock, fd: int) -> None:
+        self.lock = lock
+        self.fd = fd
+
+    def __enter__(self) -> None:
+        self.lock.acquire()
+        try:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX)
+        except BaseException:
+            self.lock.release()
+            raise
+
+    def __exit__(self, *exc) -> None:
+        try:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN)
+        finally:
+            self.lock.release()
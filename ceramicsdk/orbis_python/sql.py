@@ -0,0 +1,167 @@
+# orbis_python/sql.py
+
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from dateutil.parser import isoparse
+
+
+IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# Operators accepted in range filters, e.g. {"timestamp": {"gte": start, "lt": end}}
+OPERATORS = {
+    "eq": "=",
+    "ne": "!=",
+    "gt": ">",
+    "gte": ">=",
+    "lt": "<",
+    "lte": "<=",
+    "in": "IN",
+}
+
+OrderBy = Union[str, Sequence[str]]
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a column or table name for SQL"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def column(name: str) -> str:
+    """Validate and quote a column name coming from a filter, projection or ordering"""
+    if not IDENTIFIER_PATTERN.match(name):
+        raise ValueError(f"Invalid column name: {name!r}")
+    return quote_identifier(name)
+
+
+class Params:
+    """Collects bound parameter values and hands out their $n placeholders"""
+
+    def __init__(self) -> None:
+        self.values: List[Any] = []
+
+    def add(self, value: Any) -> str:
+        self.values.append(value)
+        return f"${len(self.values)}"
+
+
+def _predicate(name: str, op: str, value: Any, params: Params) -> str:
+    if op not in OPERATORS:
+        raise ValueError(f"Unsupported filter operator {op!r} for {name!r}, expected one of {sorted(OPERATORS)}")
+    if op == "in" or (op == "eq" and isinstance(value, (list, tuple, set, frozenset))):
+        values = list(value)
+        if not values:
+            return "FALSE"
+        return f"{column(name)} IN ({', '.join(params.add(v) for v in values)})"
+    if value is None and op in ("eq", "ne"):
+        return f"{column(name)} IS {'NOT ' if op == 'ne' else ''}NULL"
+    return f"{column(name)} {OPERATORS[op]} {params.add(value)}"
+
+
+def build_where(filters: Dict[str, Any], params: Params) -> str:
+    """Translate a filters dict into a WHERE clause with bound parameters
+
+    - `{"page": "/home"}` becomes `"page" = $1`
+    - a list, tuple or set becomes an IN list
+    - a dict of operators becomes range comparisons, e.g. `{"gte": start, "lt": end}`
+    - `None` becomes `IS NULL`
+    """
+    predicates = []
+    for name, value in filters.items():
+        if isinstance(value, dict):
+            predicates.extend(_predicate(name, op, v, params) for op, v in value.items())
+        else:
+            predicates.append(_predicate(name, "eq", value, params))
+    return " AND ".join(predicates)
+
+
+def parse_order_by(order_by: Optional[OrderBy]) -> List[Tuple[str, bool]]:
+    """Normalize ordering to [(column, descending)]. A leading "-" means descending"""
+    if not order_by:
+        return []
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    return [(key[1:], True) if key.startswith("-") else (key, False) for key in order_by]
+
+
+def build_select(
+    table: str,
+    filters: Optional[Dict[str, Any]] = None,
+    columns: Optional[Iterable[str]] = None,
+    order_by: Optional[OrderBy] = None,
+    limit: Optional[int] = None,
+) -> Tuple[str, List[Any]]:
+    """Build a SELECT over `table`. Returns (sql, params)"""
+    params = Params()
+    projection = ", ".join(column(name) for name in columns) if columns else "*"
+    query = f"SELECT {projection} FROM {table}"
+    if filters:
+        query += f" WHERE {build_where(filters, params)}"
+    ordering = parse_order_by(order_by)
+    if ordering:
+        query += " ORDER BY " + ", ".join(f"{column(name)}{' DESC' if desc else ''}" for name, desc in ordering)
+    if limit is not None:
+        query += f" LIMIT {params.add(int(limit))}"
+    return query, params.values
+
+
+def chunk_filters(filters: Optional[Dict[str, Any]], chunk_size: int) -> List[Dict[str, Any]]:
+    """Split the largest IN list of `filters` so no single query carries more than `chunk_size` values"""
+    filters = filters or {}
+    largest, values = None, []
+    for name, value in filters.items():
+        if isinstance(value, dict):
+            value = value.get("in", ())
+        if isinstance(value, (list, tuple, set, frozenset)) and len(value) > len(values):
+            largest, values = name, list(value)
+    if largest is None or len(values) <= chunk_size:
+        return [filters]
+
+    chunks = []
+    for start in range(0, len(values), chunk_size):
+        chunk = dict(filters)
+        part = values[start:start + chunk_size]
+        if isinstance(filters[largest], dict):
+            chunk[largest] = {**filters[largest], "in": part}
+        else:
+            chunk[largest] = part
+        chunks.append(chunk)
+    return chunks
+
+
+def sort_rows(rows: List[Dict[str, Any]], order_by: Optional[OrderBy]) -> List[Dict[str, Any]]:
+    """Apply an ORDER BY client-side, e.g. when merging results of several queries (nulls last)"""
+    for name, desc in reversed(parse_order_by(order_by)):
+        present = [row for row in rows if row.get(name) is not None]
+        missing = [row for row in rows if row.get(name) is None]
+        rows = sorted(present, key=lambda row: row[name], reverse=desc) + missing
+    return rows
+
+
+def split_range(start: Any, end: Any, partitions: int) -> List[Any]:
+    """Split [start, end) into at most `partitions` contiguous sub-ranges and return the boundaries
+
+    Works for ints, floats, datetimes and ISO 8601 strings (returned as ISO
+    strings, in UTC as "Z" when `start` was written that way).
+    """
+    if partitions < 1:
+        raise ValueError("partitions must be at least 1")
+    if isinstance(start, str) or isinstance(end, str):
+        bounds = split_range(isoparse(start), isoparse(end), partitions)
+        zulu = start.endswith(("Z", "z"))
+        return [start] + [_format_bound(bound, zulu) for bound in bounds[1:-1]] + [end]
+    if not start < end:
+        raise ValueError(f"Empty range: {start!r} to {end!r}")
+    if isinstance(start, int) and isinstance(end, int):
+        partitions = min(partitions, end - start)
+        return [start + (end - start) * i // partitions for i in range(partitions)] + [end]
+    step = (end - start) / partitions
+    return [start + step * i for i in range(partitions)] + [end]
+
+
+def _format_bound(bound: datetime, zulu: bool) -> str:
+    text = bound.isoformat()
+    if zulu and text.endswith("+00:00"):
+        return text[:-len("+00:00")] + "Z"
+    return text
@@ -0,0 +1,228 @@
+# orbis_python/views.py
+
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+from dateutil.parser import isoparse
+
+from .replica import iter_pages
+
+if TYPE_CHECKING:
+    from .orbis_db import OrbisDB
+
+
+def bucket_timestamp(value: Optional[str], seconds: int) -> Optional[str]:
+    """Floor an ISO 8601 timestamp to a bucket of `seconds` and return it in ISO form (UTC)"""
+    if value is None:
+        return None
+    parsed = isoparse(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    epoch = int(parsed.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=timezone.utc).isoformat()
+
+
+class AggregateView:
+    """An aggregate over one OrbisDB table, kept up to date incrementally
+
+    Rows are grouped by `group_by` (plus an optional time bucket over a
+    timestamp column) and each group keeps a row count and, if
+    `count_distinct` is set, the number of distinct values of that column.
+
+    State lives in a local SQLite file: one small record per source row (its
+    group and distinct value) plus the group totals. A refresh only fetches
+    rows whose watermark moved past the stored cursor; rows seen before are
+    retracted from their old group first, so updates are not double counted.
+
+    Example:
+        db.register_view(env_id, "views_per_page_hour", group_by=["page"], time_bucket=("timestamp", 3600))
+        db.register_view(env_id, "addresses_per_customer", group_by=["customer_user_id"], count_distinct="address")
+    """
+
+    def __init__(
+        self,
+        db: "OrbisDB",
+        env_id: str,
+        name: str,
+        group_by: Sequence[str] = (),
+        count_distinct: Optional[str] = None,
+        time_bucket: Optional[Tuple[str, int]] = None,
+        path: str = "orbis_views.db",
+        watermark_column: str = "indexed_at",
+        page_size: int = 5000,
+    ) -> None:
+        if not db.table_stream:
+            raise ValueError("OrbisDB table stream has not being specified. Cannot define a view.")
+        if not group_by and not time_bucket:
+            raise ValueError("An aggregate view needs at least one group_by column or a time_bucket")
+        self.db = db
+        self.env_id = env_id
+        self.name = name
+        self.table = db.table_stream
+        self.group_by = list(group_by)
+        self.count_distinct = count_distinct
+        self.time_bucket = time_bucket
+        self.watermark_column = watermark_column
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS view_meta (
+                view TEXT PRIMARY KEY, definition TEXT, cursor_watermark, cursor_stream_id TEXT);
+            CREATE TABLE IF NOT EXISTS view_rows (
+                view TEXT, stream_id TEXT, group_key TEXT, distinct_value TEXT,
+                PRIMARY KEY (view, stream_id));
+            CREATE TABLE IF NOT EXISTS view_groups (
+                view TEXT, group_key TEXT, count INTEGER, distinct_count INTEGER,
+                PRIMARY KEY (view, group_key));
+            CREATE TABLE IF NOT EXISTS view_distinct (
+                view TEXT, group_key TEXT, value TEXT, n INTEGER,
+                PRIMARY KEY (view, group_key, value));
+            """
+        )
+        self.cursor = self._load_cursor()
+
+    @property
+    def definition(self) -> str:
+        return json.dumps({
+            "table": self.table,
+            "env": self.env_id,
+            "group_by": self.group_by,
+            "count_distinct": self.count_distinct,
+            "time_bucket": self.time_bucket,
+            "watermark": self.watermark_column,
+        }, sort_keys=True)
+
+    def _load_cursor(self) -> Tuple[Any, Optional[str]]:
+        """Load the stored cursor, discarding state built for a different definition"""
+        row = self._conn.execute(
+            "SELECT definition, cursor_watermark, cursor_stream_id FROM view_meta WHERE view = ?", (self.name,)
+        ).fetchone()
+        if row is not None and row[0] == self.definition:
+            return row[1], row[2]
+        self._conn.execute("BEGIN")
+        for table in ("view_rows", "view_groups", "view_distinct"):
+            self._conn.execute(f"DELETE FROM {table} WHERE view = ?", (self.name,))
+        self._conn.execute("INSERT OR REPLACE INTO view_meta VALUES (?, ?, NULL, NULL)", (self.name, self.definition))
+        self._conn.execute("COMMIT")
+        return None, None
+
+    def _columns(self) -> List[str]:
+        columns = ["stream_id", self.watermark_column, *self.group_by]
+        if self.count_distinct:
+            columns.append(self.count_distinct)
+        if self.time_bucket:
+            columns.append(self.time_bucket[0])
+        return list(dict.fromkeys(columns))
+
+    def _group_key(self, row: Dict[str, Any]) -> str:
+        key = [row.get(column) for column in self.group_by]
+        if self.time_bucket:
+            column, seconds = self.time_bucket
+            key.append(bucket_timestamp(row.get(column), seconds))
+        return json.dumps(key, separators=(",", ":"))
+
+    def refresh(self) -> int:
+        """Fold rows added or updated since the last refresh into the view. Returns the rows applied"""
+        with self._lock:
+            applied = 0
+            for rows, cursor in iter_pages(self.db, self.env_id, self.table, self.watermark_column, self.cursor,
+                                           self.page_size, self._columns()):
+                self._apply(rows, cursor)
+                applied += len(rows)
+            return applied
+
+    def _apply(self, rows: List[Dict[str, Any]], cursor: tuple) -> None:
+        conn = self._conn
+        view = self.name
+        conn.execute("BEGIN")
+        try:
+            for row in rows:
+                group_key = self._group_key(row)
+                value = row.get(self.count_distinct) if self.count_distinct else None
+                value = None if value is None else json.dumps(value)
+                previous = conn.execute(
+                    "SELECT group_key, distinct_value FROM view_rows WHERE view = ? AND stream_id = ?",
+                    (view, row["stream_id"]),
+                ).fetchone()
+                if previous is not None:
+                    if previous == (group_key, value):
+                        continue
+                    self._retract(*previous)
+                conn.execute("INSERT OR REPLACE INTO view_rows VALUES (?, ?, ?, ?)",
+                             (view, row["stream_id"], group_key, value))
+                self._add(group_key, value)
+            conn.execute("UPDATE view_meta SET cursor_watermark = ?, cursor_stream_id = ? WHERE view = ?",
+                         (*cursor, view))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.cursor = cursor
+
+    def _add(self, group_key: str, value: Optional[str]) -> None:
+        conn = self._conn
+        new_distinct = 0
+        if value is not None:
+            updated = conn.execute(
+                "UPDATE view_distinct SET n = n + 1 WHERE view = ? AND group_key = ? AND value = ?",
+                (self.name, group_key, value),
+            ).rowcount
+            if not updated:
+                conn.execute("INSERT INTO view_distinct VALUES (?, ?, ?, 1)", (self.name, group_key, value))
+                new_distinct = 1
+        conn.execute(
+            "INSERT INTO view_groups VALUES (?, ?, 1, ?) ON CONFLICT (view, group_key) "
+            "DO UPDATE SET count = count + 1, distinct_count = distinct_count + excluded.distinct_count",
+            (self.name, group_key, new_distinct),
+        )
+
+    def _retract(self, group_key: str, value: Optional[str]) -> None:
+        conn = self._conn
+        lost_distinct = 0
+        if value is not None:
+            conn.execute(
+                "UPDATE view_distinct SET n = n - 1 WHERE view = ? AND group_key = ? AND value = ?",
+                (self.name, group_key, value),
+            )
+            lost_distinct = conn.execute(
+                "DELETE FROM view_distinct WHERE view = ? AND group_key = ? AND value = ? AND n <= 0",
+                (self.name, group_key, value),
+            ).rowcount
+        conn.execute(
+            "UPDATE view_groups SET count = count - 1, distinct_count = distinct_count - ? "
+            "WHERE view = ? AND group_key = ?",
+            (lost_distinct, self.name, group_key),
+        )
+        conn.execute("DELETE FROM view_groups WHERE view = ? AND group_key = ? AND count <= 0",
+                     (self.name, group_key))
+
+    def rows(self, refresh: bool = False) -> List[Dict[str, Any]]:
+        """Return one dict per group with its key columns, `count` and (if defined) `distinct_count`"""
+        if refresh:
+            self.refresh()
+        with self._lock:
+            groups = self._conn.execute(
+                "SELECT group_key, count, distinct_count FROM view_groups WHERE view = ? ORDER BY group_key",
+                (self.name,),
+            ).fetchall()
+        names = list(self.group_by)
+        if self.time_bucket:
+            names.append(f"{self.time_bucket[0]}_bucket")
+        result = []
+        for group_key, count, distinct_count in groups:
+            row = dict(zip(names, json.loads(group_key)))
+            row["count"] = count
+            if self.count_distinct:
+                row["distinct_count"] = distinct_count
+            result.append(row)
+        return result
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,189 @@
+# orbis_python/watch.py
+
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional
+
+import jsonpatch
+
+from .sql import build_select
+
+if TYPE_CHECKING:
+    from .orbis_db import OrbisDB
+
+
+WatchCallback = Callable[[str, List[Dict[str, Any]], Dict[str, Any]], None]
+
+
+class _Watched:
+    __slots__ = ("stream_id", "callbacks", "tip", "cid", "content", "interval", "due", "primed")
+
+    def __init__(self, stream_id: str, interval: float, due: float) -> None:
+        self.stream_id = stream_id
+        self.callbacks: List[WatchCallback] = []
+        self.tip: Any = None
+        self.cid: Optional[str] = None
+        self.content: Dict[str, Any] = {}
+        self.interval = interval
+        self.due = due
+        self.primed = False
+
+
+class StreamWatcher:
+    """Calls back with a JSON patch whenever one of the watched streams gets a new commit
+
+    Each round looks up the `tip_column` (`indexed_at` by default) of the due
+    streams in the OrbisDB table, in queries of up to `batch_size` stream IDs.
+    OrbisDB rewrites it whenever it indexes a new commit. Only streams whose
+    value moved, or that are not in the table, are then loaded from Ceramic
+    with multiqueries. When a stream's latest commit differs from the last one
+    seen, `callback(stream_id, patch, content)` gets the JSON patch from the
+    last known content to the new content. The first load of a stream only
+    records its content. With `tip_column=None` every due stream is loaded
+    from Ceramic.
+
+    A stream that changed is checked again after `min_interval` seconds. Each
+    check that finds it unchanged multiplies its interval by `factor`, up to
+    `max_interval`, so idle streams cost little and busy ones are followed
+    closely. Checks run on one background thread, started by the first `watch`.
+
+    Example:
+        watcher = db.watch(env_id, stream_ids, lambda stream_id, patch, content: print(stream_id, patch))
+        ...
+        watcher.close()
+    """
+
+    def __init__(
+        self,
+        db: "OrbisDB",
+        env_id: str,
+        min_interval: float = 1.0,
+        max_interval: float = 60.0,
+        factor: float = 2.0,
+        batch_size: int = 500,
+        tip_column: Optional[str] = "indexed_at",
+    ) -> None:
+        if not db.table_stream and tip_column:
+            raise ValueError("OrbisDB table stream has not being specified. Cannot look up stream tips.")
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("StreamWatcher needs 0 < min_interval <= max_interval")
+        self.db = db
+        self.env_id = env_id
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.batch_size = batch_size
+        self.tip_column = tip_column
+        self.tip_queries = 0
+        self.state_queries = 0
+        self._watched: Dict[str, _Watched] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._watched)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def watch(self, stream_ids: Iterable[str], callback: WatchCallback) -> None:
+        """Call `callback` on every new commit of `stream_ids`"""
+        now = time.monotonic()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("StreamWatcher is closed")
+            for stream_id in stream_ids:
+                watched = self._watched.get(stream_id)
+                if watched is None:
+                    watched = self._watched[stream_id] = _Watched(stream_id, self.min_interval, now)
+                watched.callbacks.append(callback)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stream-watcher", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def unwatch(self, stream_ids: Iterable[str]) -> None:
+        with self._cond:
+            for stream_id in stream_ids:
+                self._watched.pop(stream_id, None)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed:
+                    now = time.monotonic()
+                    next_due = min((watched.due for watched in self._watched.values()), default=None)
+                    if next_due is not None and next_due <= now:
+                        break
+                    self._cond.wait(next_due - now if next_due is not None else None)
+                if self._closed:
+                    return
+                due = [watched for watched in self._watched.values() if watched.due <= now]
+            try:
+                self._poll(due)
+            except Exception as e:
+                logging.warning(f"Watching {len(due)} streams failed: {e}")
+                with self._cond:
+                    for watched in due:
+                        watched.due = time.monotonic() + watched.interval
+
+    def _poll(self, due: List[_Watched]) -> int:
+        """Check `due` streams once and deliver their changes. Returns the number of changed streams"""
+        moved = self._moved(due) if self.tip_column else {watched.stream_id: None for watched in due}
+        states = self._load(list(moved))
+        now = time.monotonic()
+        changes = []
+        with self._cond:
+            for watched in due:
+                state = states.get(watched.stream_id)
+                changed = False
+                if state is not None and state.get("log"):
+                    cid = str(state["log"][-1]["cid"])
+                    content = state.get("content") or {}
+                    if cid != watched.cid:
+                        if watched.primed:
+                            changes.append((watched, jsonpatch.make_patch(watched.content, content).patch, content))
+                            changed = True
+                        watched.cid, watched.content, watched.primed = cid, content, True
+                    if moved.get(watched.stream_id) is not None:
+                        watched.tip = moved[watched.stream_id]
+                # Busy streams are checked again soon, idle ones less and less often
+                watched.interval = self.min_interval if changed else min(self.max_interval, watched.interval * self.factor)
+                watched.due = now + watched.interval
+        for watched, patch, content in changes:
+            for callback in list(watched.callbacks):
+                try:
+                    callback(watched.stream_id, patch, content)
+                except Exception as e:
+                    logging.error(f"Watch callback for {watched.stream_id} failed: {e}")
+        return len(changes)
+
+    def _moved(self, due: List[_Watched]) -> Dict[str, Any]:
+        """Streams whose tip column changed, or that are not indexed, mapped to their new tip value"""
+        tips: Dict[str, Any] = {}
+        for start in range(0, len(due), self.batch_size):
+            batch = [watched.stream_id for watched in due[start:start + self.batch_size]]
+            query, params = build_select(self.db.table_stream, {"stream_id": batch}, ["stream_id", self.tip_column])
+            self.tip_queries += 1
+            for row in self.db._fetch(self.env_id, query, params, use_cache=False).get("data", []):
+                tips[row["stream_id"]] = row[self.tip_column]
+        return {watched.stream_id: tips.get(watched.stream_id) for watched in due
+                if not watched.primed or watched.stream_id not in tips or tips[watched.stream_id] != watched.tip}
+
+    def _load(self, stream_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        states: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(stream_ids), self.batch_size):
+            self.state_queries += 1
+            states.update(self.db.ceramic_client.multi_query(stream_ids[start:start + self.batch_size]))
+        return states
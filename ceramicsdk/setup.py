@@ -38,4 +38,7 @@ setup(
         "bip44==0.1.4",
         "varint",
     ],
+    extras_require={
+        "columnar": ["numpy"],
+    },
 )
\ No newline at end of file
@@ -0,0 +1,77 @@
+import hashlib
+import json
+import threading
+import time
+
+from ceramic_python import DID
+from ceramic_python.helper import commit_cid
+from orbis_python import OrbisDB
+
+
+TABLE = "kjzl6hvfrbw6cac35814w419t0jesyz5ibs94hxla1fqputf2aazb9do5sxji9f"
+SIGNER = DID("11" * 32)
+
+
+def fake_stream_id(row):
+    """Stream ID FakeWriteOrbis gives a row: the same for equal rows, whatever order they are written in"""
+    return "k" + hashlib.sha256(json.dumps(row, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class FakeWriteOrbis(OrbisDB):
+    """Creates rows of a list model with `schema` in memory, tracking concurrency
+
+    A row whose page is "/fail" is rejected, and so is every row once
+    `fail_at` rows were created. A row with a customer_user_id takes that
+    many milliseconds (mod 5) to create, so rows finish out of order.
+    """
+
+    def __init__(self, schema, fail_at=None):
+        super().__init__("http://ceramic", "http://orbis", table_stream=TABLE, controller_private_key="11" * 32,
+                         model_cache={TABLE: {"accountRelation": {"type": "list"}, "schema": schema}})
+        self.fail_at = fail_at
+        self.created = []
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def _create_row(self, entry_data):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.001 * (entry_data.get("customer_user_id", 0) % 5))
+        with self.lock:
+            self.running -= 1
+            if entry_data.get("page") == "/fail":
+                raise Exception("Ceramic rejected the commit")
+            if self.fail_at is not None and len(self.created) >= self.fail_at:
+                raise Exception("Ceramic node unavailable")
+            self.created.append(entry_data)
+        return fake_stream_id(entry_data)
+
+
+class FakeResponse:
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.content = b"{}"
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """Serves one stream to a CeramicClient: the commits route, and `state` for every other request"""
+
+    def __init__(self, commits, state=None):
+        self.commits = commits
+        self.state = state
+        self.commit_requests = 0
+
+    def get(self, url, **kwargs):
+        if "/commits/" in url:
+            self.commit_requests += 1
+            return FakeResponse({"commits": [{"cid": commit_cid(commit), "value": commit} for commit in self.commits]})
+        return FakeResponse({"streamId": "k1", "state": self.state})
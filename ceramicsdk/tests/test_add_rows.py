@@ -0,0 +1,84 @@
+import json
+import unittest
+from importlib.util import find_spec
+from unittest import mock
+
+from orbis_python import OrbisDB
+
+from .fakes import TABLE, FakeWriteOrbis, fake_stream_id
+from .test_replica import load_server
+
+
+SCHEMA = {
+    "required": ["page", "customer_user_id"],
+    "properties": {"page": {"type": "string"}, "customer_user_id": {"type": "integer"}},
+    "additionalProperties": False,
+}
+
+
+class TestAddRows(unittest.TestCase):
+
+    def test_results_in_input_order(self):
+        db = FakeWriteOrbis(SCHEMA)
+        rows = [{"page": "/home", "customer_user_id": i} for i in range(50)]
+        results = list(db.add_rows(rows, concurrency=4))
+        self.assertEqual([r["index"] for r in results], list(range(50)))
+        self.assertEqual(results[7], {"index": 7, "stream_id": fake_stream_id(rows[7])})
+        self.assertLessEqual(db.peak, 4)
+
+    def test_errors_are_reported_per_row(self):
+        db = FakeWriteOrbis(SCHEMA)
+        rows = [{"page": "/home", "customer_user_id": 1}, "not json", {"page": "/home"},
+                {"page": "/home", "customer_user_id": 2, "extra": True}, {"page": "/fail", "customer_user_id": 3}]
+        results = list(db.add_rows(rows))
+        self.assertIn("stream_id", results[0])
+        self.assertEqual(results[1]["error"], "A row must be a JSON object")
+        self.assertIn("customer_user_id", results[2]["error"])
+        self.assertIn("extra", results[3]["error"])
+        self.assertEqual(results[4]["error"], "Ceramic rejected the commit")
+
+    def test_reads_input_lazily(self):
+        db = FakeWriteOrbis(SCHEMA)
+        consumed = []
+
+        def rows():
+            for i in range(1000):
+                consumed.append(i)
+                yield json.loads(json.dumps({"page": "/home", "customer_user_id": i}))
+
+        results = db.add_rows(rows(), concurrency=2)
+        for _ in range(3):
+            next(results)
+        self.assertLessEqual(len(consumed), 3 + 2 * 2)
+        results.close()
+
+    def test_read_only(self):
+        db = OrbisDB("http://ceramic", "http://orbis", table_stream=TABLE)
+        db.controller = None
+        with self.assertRaises(ValueError):
+            db.add_rows([{}])
+
+    def test_concurrency_must_be_positive(self):
+        db = FakeWriteOrbis(SCHEMA)
+        self.assertRaises(ValueError, db.add_rows, [{"page": "/home", "customer_user_id": 1}], concurrency=0)
+
+
+@unittest.skipUnless(find_spec("flask") and find_spec("dotenv"), "the example server's dependencies are not installed")
+class TestCreateDocumentsRoute(unittest.TestCase):
+
+    def setUp(self):
+        self.server = load_server()
+        self.client = self.server.app.test_client()
+
+    def test_concurrency_out_of_range_is_rejected(self):
+        limit = self.server.INGEST_CONCURRENCY
+        for value in (0, -1, limit + 1):
+            with mock.patch.object(self.server.registry.default, "add_rows") as add_rows:
+                response = self.client.post(f"/create_documents?concurrency={value}", data=b'{"page": "/home"}\n')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(str(limit), response.get_json()["error"])
+            add_rows.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import threading
+import unittest
+
+from ceramic_python import AnchorTracker
+
+
+class FakeCeramic:
+    """Answers multiqueries from a dict of anchor statuses"""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def multi_query(self, stream_ids, opts=None):
+        with self.lock:
+            self.batches.append(list(stream_ids))
+            return {stream_id: {"anchorStatus": self.statuses[stream_id]}
+                    for stream_id in stream_ids if stream_id in self.statuses}
+
+
+class TestAnchorTracker(unittest.TestCase):
+
+    def test_resolves_when_anchored_in_batches(self):
+        ceramic = FakeCeramic({f"k{i}": "PENDING" for i in range(25)})
+        tracker = AnchorTracker(ceramic, batch_size=10, initial_delay=0.05, max_delay=0.05, window=1.0)
+        changes, polled = [], threading.Event()
+
+        def on_change(stream_id, status, state):
+            changes.append((stream_id, status))
+            polled.set()
+
+        futures = tracker.track_many(list(ceramic.statuses), callback=on_change)
+        self.assertIs(tracker.track("k0"), futures[0])
+        self.assertTrue(polled.wait(5))
+        with ceramic.lock:
+            ceramic.statuses = {stream_id: "ANCHORED" for stream_id in ceramic.statuses}
+        states = [future.result(timeout=5) for future in futures]
+        self.assertTrue(all(state["anchorStatus"] == "ANCHORED" for state in states))
+        self.assertEqual(len(tracker), 0)
+        self.assertTrue(all(len(batch) <= 10 for batch in ceramic.batches))
+        # Every poll covers all 25 streams in three multiqueries
+        self.assertEqual(tracker.queries, 3 * tracker.polls)
+        self.assertIn(("k3", "PENDING"), changes)
+        self.assertIn(("k3", "ANCHORED"), changes)
+        tracker.close()
+
+    def test_spacing_grows_while_pending(self):
+        ceramic = FakeCeramic({"k1": "PENDING"})
+        tracker = AnchorTracker(ceramic, initial_delay=0.02, max_delay=10, factor=2, window=0)
+        future = tracker.track("k1")
+        self.assertFalse(future.done())
+        threading.Event().wait(0.5)
+        # Polls at about 0.02, 0.06, 0.14 and 0.30s, rather than every 20ms
+        self.assertLessEqual(tracker.polls, 5)
+        self.assertGreaterEqual(tracker.polls, 3)
+        tracker.close()
+        self.assertTrue(future.cancelled())
+
+    def test_failed_and_timed_out(self):
+        ceramic = FakeCeramic({"k1": "FAILED"})
+        tracker = AnchorTracker(ceramic, initial_delay=0.01, timeout=0.05, window=0)
+        failed, missing = tracker.track("k1"), tracker.track("k2")
+        self.assertEqual(failed.result(timeout=5)["anchorStatus"], "FAILED")
+        with self.assertRaises(TimeoutError):
+            missing.result(timeout=5)
+        tracker.close()
+        with self.assertRaises(RuntimeError):
+            tracker.track("k3")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+
+from ceramic_python import BlockStore, CeramicClient
+from ceramic_python.helper import block_cid, commit_blocks, commit_cid, format_cid
+from ceramic_python.model_instance_document import ModelInstanceDocument, ModelInstanceDocumentMetadataArgs
+
+from .fakes import SIGNER, TABLE, FakeSession
+
+
+def block(n, size=100):
+    data = bytes([n % 256]) * size + str(n).encode()
+    return block_cid(data), data
+
+
+class TestBlockStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = self.dir.name
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_put_get_and_reopen(self):
+        store = BlockStore(self.path)
+        cid, data = block(1)
+        self.assertTrue(store.put(cid, data))
+        self.assertFalse(store.put(cid, data + b"x"))
+        self.assertEqual(store.get(format_cid(cid)), data)
+        self.assertIsNone(store.get(block(2)[0]))
+        store.close()
+
+        reopened = BlockStore(self.path)
+        self.assertIn(cid, reopened)
+        self.assertEqual(reopened.get(cid), data)
+
+    def test_torn_and_corrupt_blocks_are_dropped(self):
+        store = BlockStore(self.path)
+        cids = []
+        for n in range(3):
+            cid, data = block(n)
+            store.put(cid, data)
+            cids.append(cid)
+        store.close()
+        segment = os.path.join(self.path, os.listdir(self.path)[0])
+        with open(segment, "r+b") as file:
+            file.seek(-5, os.SEEK_END)
+            file.write(b"XXXXX")
+        with open(segment, "ab") as file:
+            file.write(b"\x00\x22\x00\x00\x01\x00partial")
+
+        store = BlockStore(self.path)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.get(cids[0]), block(0)[1])
+        self.assertIsNone(store.get(cids[2]))
+        self.assertEqual(store.stats()["corrupt"], 1)
+        self.assertNotIn(cids[2], store)
+
+    def test_size_is_bounded_and_used_blocks_survive(self):
+        store = BlockStore(self.path, max_bytes=8000, segment_bytes=1000)
+        hot, hot_data = block(0)
+        store.put(hot, hot_data)
+        for n in range(1, 200):
+            store.put(*block(n))
+            self.assertEqual(store.get(hot), hot_data)
+        self.assertLessEqual(store.size, 8000 + 1000)
+        self.assertIn(hot, store)
+        self.assertNotIn(block(1)[0], store)
+        self.assertIn(block(199)[0], store)
+
+
+class TestLoadCommits(unittest.TestCase):
+
+    def test_commits_come_from_the_store_after_the_first_fetch(self):
+        genesis = ModelInstanceDocument.make_genesis(SIGNER, {"page": "/"},
+                                                     ModelInstanceDocumentMetadataArgs(SIGNER.public_key, TABLE))
+        update = ModelInstanceDocument.make_patch_commit(SIGNER, commit_cid(genesis), commit_cid(genesis),
+                                                         [{"op": "replace", "path": "/page", "value": "/a"}])
+        self.assertEqual(len(commit_blocks(update)), 2)
+        session = FakeSession([genesis, update])
+        with tempfile.TemporaryDirectory() as path:
+            client = CeramicClient("http://ceramic", SIGNER, session=session, blocks=BlockStore(path))
+            log = [commit_cid(genesis), commit_cid(update)]
+            first = client.load_commits("k1", log)
+            second = client.load_commits("k1", log)
+            self.assertEqual(session.commit_requests, 1)
+            self.assertEqual(first, second)
+            self.assertEqual(second[1], (log[1], update))
+            # A commit the store has not seen yet sends it back to the node
+            client.load_commits("k1", log + [format_cid(block(0)[0])])
+            self.assertEqual(session.commit_requests, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+from orbis_python import OrbisDB
+from orbis_python.cache import QueryCache, SingleFlight, normalize_sql
+
+from .fakes import TABLE
+
+
+class TestQueryCache(unittest.TestCase):
+
+    def test_hit_after_miss(self):
+        cache = QueryCache(ttl=60)
+        calls = []
+        load = lambda: calls.append(1) or b'{"data": []}'
+        cache.get_or_load("env", f"SELECT * FROM {TABLE}", [], load)
+        cache.get_or_load("env", f"SELECT *\n  FROM {TABLE};", [], load)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_key_includes_env_and_params(self):
+        cache = QueryCache(ttl=60)
+        calls = []
+        load = lambda: calls.append(1) or b"{}"
+        cache.get_or_load("env1", "SELECT 1", [], load)
+        cache.get_or_load("env2", "SELECT 1", [], load)
+        cache.get_or_load("env1", "SELECT 1", [3], load)
+        self.assertEqual(len(calls), 3)
+
+    def test_ttl_expiry(self):
+        cache = QueryCache(ttl=0.01)
+        cache.get_or_load("env", "SELECT 1", [], lambda: b"{}")
+        time.sleep(0.02)
+        cache.get_or_load("env", "SELECT 1", [], lambda: b"{}")
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_byte_bounded_lru(self):
+        cache = QueryCache(ttl=60, max_bytes=10)
+        cache.get_or_load("env", "SELECT 1", [], lambda: b"12345")
+        cache.get_or_load("env", "SELECT 2", [], lambda: b"12345")
+        cache.get_or_load("env", "SELECT 1", [], lambda: b"never")  # refresh recency
+        cache.get_or_load("env", "SELECT 3", [], lambda: b"12345")
+        stats = cache.stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["bytes"], 10)
+        self.assertEqual(cache.get_or_load("env", "SELECT 1", [], lambda: b"other"), b"12345")
+
+    def test_invalidate_table(self):
+        cache = QueryCache(ttl=60)
+        cache.get_or_load("env", f"SELECT * FROM {TABLE}", [], lambda: b"old")
+        cache.get_or_load("env", "SELECT 1", [], lambda: b"other")
+        self.assertEqual(cache.invalidate(TABLE), 1)
+        self.assertEqual(cache.get_or_load("env", f"SELECT * FROM {TABLE}", [], lambda: b"new"), b"new")
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_load_racing_invalidation_is_not_stored(self):
+        cache = QueryCache(ttl=60)
+
+        def load():
+            cache.invalidate(TABLE)
+            return b"stale"
+
+        cache.get_or_load("env", f"SELECT * FROM {TABLE}", [], load)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_normalize_sql(self):
+        self.assertEqual(normalize_sql(" SELECT *\n\tFROM t ; "), "SELECT * FROM t")
+
+    def test_failed_query_is_not_cached(self):
+        cache = QueryCache(ttl=60)
+        db = OrbisDB("http://ceramic", "http://orbis", table_stream=TABLE, cache=cache)
+        failed, error, ok = mock.Mock(content=b"upstream error"), mock.Mock(content=b'{"error": "bad query"}'), \
+            mock.Mock(content=b'{"data": [{"page": "/home"}]}')
+        failed.raise_for_status.side_effect = requests.HTTPError("502 Server Error")
+        with mock.patch.object(db.session, "post", side_effect=[failed, error, ok]):
+            self.assertRaises(requests.HTTPError, db.query, "env", f"SELECT * FROM {TABLE}")
+            self.assertRaises(ValueError, db.query, "env", f"SELECT * FROM {TABLE}")
+            self.assertEqual(db.query("env", f"SELECT * FROM {TABLE}"), [{"page": "/home"}])
+        self.assertEqual(cache.stats()["entries"], 1)
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls_share_result(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return "result"
+
+        leader = threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(3)]
+        for t in followers:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in [leader] + followers:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
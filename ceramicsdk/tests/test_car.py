@@ -0,0 +1,157 @@
+import os
+import tempfile
+import time
+import unittest
+from base64 import b64decode
+from unittest import mock
+
+import dag_cbor
+
+from ceramic_python import BlockStore, CarReader, CarWriter, export_streams, import_car
+from ceramic_python.helper import block_cid, commit_cid, parse_cid, stream_id_from_genesis
+from ceramic_python.model_instance_document import ModelInstanceDocument, ModelInstanceDocumentMetadataArgs
+
+from .fakes import SIGNER, TABLE
+
+
+class FakeCeramic:
+    """Keeps stream logs and commits like a node and checks that commits build on the tip"""
+
+    def __init__(self, blocks=None):
+        self.blocks = blocks
+        self.logs = {}
+        self.commits = {}
+        self.opts = []
+
+    def create_stream_from_genesis(self, stream_type, genesis, opts):
+        stream_id = stream_id_from_genesis(stream_type, genesis)
+        self.commits[commit_cid(genesis)] = genesis
+        self.logs.setdefault(stream_id, [commit_cid(genesis)])
+        self.opts.append(opts)
+        return stream_id
+
+    def apply_commit(self, stream_id, commit, opts):
+        payload = dag_cbor.decode(b64decode(commit["linkedBlock"]))
+        if parse_cid(payload["prev"]) != parse_cid(self.logs[stream_id][-1]):
+            raise ValueError("commit does not build on the tip")
+        self.commits[commit_cid(commit)] = commit
+        self.logs[stream_id].append(commit_cid(commit))
+        self.opts.append(opts)
+
+    def multi_query(self, stream_ids, opts=None):
+        return {stream_id: {"log": [{"cid": cid, "type": 1} for cid in self.logs[stream_id]]}
+                for stream_id in stream_ids if stream_id in self.logs}
+
+    def load_commits(self, stream_id, log=None):
+        return [(cid, self.commits[cid]) for cid in self.logs[stream_id]]
+
+
+def write_streams(ceramic, streams, updates):
+    metadata = ModelInstanceDocumentMetadataArgs(SIGNER.public_key, TABLE)
+    stream_ids = []
+    for i in range(streams):
+        genesis = ModelInstanceDocument.make_genesis(SIGNER, {"page": f"/{i}"}, metadata)
+        stream_id = ceramic.create_stream_from_genesis(3, genesis, {})
+        previous = commit_cid(genesis)
+        for n in range(updates):
+            commit = ModelInstanceDocument.make_patch_commit(
+                SIGNER, commit_cid(genesis), previous, [{"op": "replace", "path": "/page", "value": f"/{i}/{n}"}])
+            ceramic.apply_commit(stream_id, commit, {})
+            previous = commit_cid(commit)
+        stream_ids.append(stream_id)
+    return stream_ids
+
+
+class TestCar(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "streams.car")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_writer_and_reader_round_trip(self):
+        blocks = [(block_cid(dag_cbor.encode({"n": n})), dag_cbor.encode({"n": n})) for n in range(300)]
+        with CarWriter(self.path, [blocks[0][0]]) as car:
+            for cid, data in blocks + blocks[:10]:
+                car.put(cid, data)
+        with CarReader(self.path) as car:
+            self.assertEqual(car.roots, [blocks[0][0]])
+            self.assertEqual(len(car), 300)
+            self.assertEqual(car.get(blocks[150][0]), blocks[150][1])
+            self.assertEqual(car.verify(processes=0), set())
+            self.assertEqual(car.verify(processes=2), set())
+
+    def test_export_then_import_replays_every_stream(self):
+        source = FakeCeramic()
+        stream_ids = write_streams(source, 5, 3)
+        stats = export_streams(source, stream_ids + ["kmissing"], self.path, concurrency=2, batch_size=2)
+        self.assertEqual(stats["streams"], 5)
+        self.assertEqual(list(stats["failed"]), ["kmissing"])
+
+        with tempfile.TemporaryDirectory() as directory:
+            target = FakeCeramic(blocks=BlockStore(directory))
+            imported = import_car(target, self.path, concurrency=3, processes=0)
+            self.assertEqual(imported["failed"], {})
+            self.assertEqual(sorted(imported["stream_ids"]), sorted(stream_ids))
+            self.assertEqual(imported["commits"], 20)
+            self.assertEqual(target.logs, source.logs)
+            self.assertEqual(len(target.blocks), stats["blocks"])
+        # Only the tip of each stream asks for an anchor
+        self.assertEqual(sum(opts["anchor"] for opts in target.opts), 5)
+
+    def test_streams_that_fail_to_export_are_not_roots(self):
+        source = FakeCeramic()
+        stream_ids = write_streams(source, 3, 2)
+        source.commits[source.logs[stream_ids[1]][1]] = None
+        stats = export_streams(source, stream_ids, self.path)
+        self.assertEqual((stats["streams"], list(stats["failed"])), (2, [stream_ids[1]]))
+        self.assertEqual(stats["bytes"], os.path.getsize(self.path))
+        with CarReader(self.path) as car:
+            self.assertEqual(car.roots, [parse_cid(source.logs[stream_ids[i]][-1]) for i in (0, 2)])
+        imported = import_car(FakeCeramic(), self.path, processes=0)
+        self.assertEqual((imported["streams"], imported["failed"]), (2, {}))
+
+    def test_export_holds_a_bounded_number_of_histories(self):
+        source = FakeCeramic()
+        stream_ids = write_streams(source, 20, 1)
+        loaded, seen = [], []
+        load_commits, put = source.load_commits, CarWriter.put
+
+        def counting_load(stream_id, log=None):
+            loaded.append(stream_id)
+            return load_commits(stream_id, log)
+
+        def slow_put(car, cid, data):
+            if not seen:
+                # Give the worker time to load every stream it was handed
+                time.sleep(0.2)
+                seen.append(len(loaded))
+            put(car, cid, data)
+
+        with mock.patch.object(source, "load_commits", side_effect=counting_load), \
+                mock.patch.object(CarWriter, "put", slow_put):
+            stats = export_streams(source, stream_ids, self.path, concurrency=1)
+        self.assertEqual(stats["streams"], 20)
+        self.assertLessEqual(seen[0], 3)
+
+    def test_corrupt_blocks_fail_only_their_stream(self):
+        source = FakeCeramic()
+        stream_ids = write_streams(source, 3, 2)
+        export_streams(source, stream_ids, self.path)
+        with CarReader(self.path) as car:
+            offset, length = car.index[parse_cid(source.logs[stream_ids[1]][1])]
+        with open(self.path, "r+b") as file:
+            file.seek(offset + length - 3)
+            file.write(b"XXX")
+
+        target = FakeCeramic()
+        imported = import_car(target, self.path, processes=0)
+        self.assertEqual(imported["corrupt"], 1)
+        self.assertEqual(sorted(imported["stream_ids"]), sorted([stream_ids[0], stream_ids[2]]))
+        self.assertEqual(list(imported["failed"]), [source.logs[stream_ids[1]][-1]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import json
+import unittest
+
+try:
+    import numpy as np
+except ImportError:  # numpy is the optional 'columnar' extra
+    np = None
+
+if np is not None:
+    from orbis_python.columnar import ColumnarResult, DictionaryColumn, count, group_count, iter_rows, time_bucket
+
+
+ROWS = [
+    {"page": "/home", "customer_user_id": 3, "timestamp": "2024-09-25T15:06:14.957719+00:00"},
+    {"page": "/about", "customer_user_id": 8, "timestamp": "2024-09-25T16:14:22.364819Z"},
+    {"page": "/home", "customer_user_id": 3, "timestamp": "2024-09-25T15:43:06.127543+00:00"},
+    {"page": "/home", "customer_user_id": 8, "timestamp": None},
+]
+
+
+@unittest.skipUnless(np is not None, "numpy is not installed")
+class TestColumnarResult(unittest.TestCase):
+
+    def setUp(self):
+        self.result = ColumnarResult.from_rows(ROWS, datetime_columns=["timestamp"])
+
+    def test_column_types(self):
+        self.assertIsInstance(self.result["page"], DictionaryColumn)
+        self.assertEqual(list(self.result["page"].dictionary), ["/home", "/about"])
+        self.assertEqual(self.result["customer_user_id"].dtype, np.int64)
+        self.assertEqual(self.result["timestamp"].dtype, np.dtype("datetime64[us]"))
+
+    def test_count(self):
+        self.assertEqual(self.result.count("page", "/home"), 3)
+        self.assertEqual(self.result.count("page", "/missing"), 0)
+        self.assertEqual(count(self.result["timestamp"]), 3)
+
+    def test_group_count(self):
+        groups = self.result.group_count("customer_user_id", "page").to_rows()
+        self.assertEqual(groups, [
+            {"customer_user_id": 3, "page": "/home", "count": 2},
+            {"customer_user_id": 8, "page": "/home", "count": 1},
+            {"customer_user_id": 8, "page": "/about", "count": 1},
+        ])
+
+    def test_time_bucket(self):
+        hours = time_bucket(self.result["timestamp"], "1h")
+        groups = group_count(self.result["page"], hours, names=["page", "hour"]).to_rows()
+        self.assertIn({"page": "/home", "hour": "2024-09-25T15:00:00.000000", "count": 2}, groups)
+        self.assertIn({"page": "/about", "hour": "2024-09-25T16:00:00.000000", "count": 1}, groups)
+
+    def test_round_trip(self):
+        rows = ColumnarResult.from_rows(ROWS).to_rows()
+        self.assertEqual(rows, ROWS)
+        raw = json.dumps({"meta": {"data": [1]}, "data": ROWS, "count": 4}).encode()
+        self.assertEqual(list(iter_rows(raw)), ROWS)
+        self.assertEqual(ColumnarResult.from_rows(iter_rows(raw)).to_rows(), ROWS)
+        self.assertEqual(list(iter_rows(b' { "data" : [ ] } ')), [])
+
+    def test_group_count_on_nullable_mixed_column(self):
+        result = ColumnarResult.from_rows([{"tag": "a"}, {"tag": None}, {"tag": 1}, {"tag": "a"}, {}])
+        self.assertEqual(result["tag"].dtype, object)
+        self.assertEqual(result.group_count("tag").to_rows(), [
+            {"tag": "a", "count": 2}, {"tag": None, "count": 2}, {"tag": 1, "count": 1},
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
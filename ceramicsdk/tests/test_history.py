@@ -0,0 +1,74 @@
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+from ceramic_python import BlockStore, CeramicClient, StreamHistory
+from ceramic_python.helper import commit_cid
+from ceramic_python.model_instance_document import ModelInstanceDocument, ModelInstanceDocumentMetadataArgs
+
+from .fakes import SIGNER, TABLE, FakeSession
+
+
+def stream_session(updates):
+    """Session serving one stream whose page is set to /0, /1, ... by each update"""
+    genesis = ModelInstanceDocument.make_genesis(SIGNER, {"page": "/", "views": 1},
+                                                 ModelInstanceDocumentMetadataArgs(SIGNER.public_key, TABLE))
+    commits = [genesis]
+    for n in range(updates):
+        commits.append(ModelInstanceDocument.make_patch_commit(
+            SIGNER, commit_cid(genesis), commit_cid(commits[-1]), [{"op": "replace", "path": "/page", "value": f"/{n}"}]))
+    # Commits 0-4 anchored at t=100, 5-9 at t=200, the rest not yet
+    log = [{"cid": commit_cid(commit), "type": min(n, 1), "timestamp": None if n >= 10 else 100 * (n // 5 + 1)}
+           for n, commit in enumerate(commits)]
+    state = {"content": {"page": f"/{updates - 1}", "views": 1}, "log": log,
+             "metadata": {"controllers": [SIGNER.id], "model": TABLE}}
+    return FakeSession(commits, state)
+
+
+class TestStreamHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.session = stream_session(updates=30)
+        self.log = self.session.state["log"]
+        self.history = StreamHistory(interval=8)
+        self.client = CeramicClient("http://ceramic", SIGNER, session=self.session, blocks=BlockStore(self.dir.name),
+                                    history=self.history)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_load_at_commit(self):
+        doc = ModelInstanceDocument.load(self.client, "k1", at_commit=self.log[5]["cid"])
+        self.assertEqual(doc.content, {"page": "/4", "views": 1})
+        self.assertTrue(doc.is_read_only)
+        self.assertEqual(len(doc.state["log"]), 6)
+        with self.assertRaises(Exception):
+            doc.patch([{"op": "replace", "path": "/page", "value": "/x"}])
+        self.assertEqual(ModelInstanceDocument.load(self.client, "k1", at_commit=self.log[0]["cid"]).content,
+                         {"page": "/", "views": 1})
+        with self.assertRaises(ValueError):
+            ModelInstanceDocument.load(self.client, "k1", at_commit="bafyunknown")
+
+    def test_load_at_time(self):
+        self.assertEqual(ModelInstanceDocument.load(self.client, "k1", at_time=150).content["page"], "/3")
+        at = datetime.fromtimestamp(250, timezone.utc)
+        self.assertEqual(ModelInstanceDocument.load(self.client, "k1", at_time=at).content["page"], "/8")
+        naive = datetime(1970, 1, 1, 0, 2, 30)  # 150 s, read as UTC whatever the local timezone
+        self.assertEqual(ModelInstanceDocument.load(self.client, "k1", at_time=naive).content["page"], "/3")
+        with self.assertRaises(ValueError):
+            ModelInstanceDocument.load(self.client, "k1", at_time=50)
+
+    def test_replay_is_bounded_by_snapshots(self):
+        ModelInstanceDocument.load(self.client, "k1", at_commit=self.log[30]["cid"])
+        self.assertEqual(self.history.replayed, 31)
+        self.assertEqual(self.session.commit_requests, 1)
+        # Snapshots at 8, 16 and 24: commit 29 replays 25-29 from local blocks
+        doc = ModelInstanceDocument.load(self.client, "k1", at_commit=self.log[29]["cid"])
+        self.assertEqual(doc.content["page"], "/28")
+        self.assertEqual(self.history.replayed, 31 + 5)
+        self.assertEqual(self.session.commit_requests, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
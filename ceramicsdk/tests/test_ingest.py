@@ -0,0 +1,64 @@
+import io
+import unittest
+
+from orbis_python import ingest, read_csv
+from orbis_python.ingest import coerce_row
+
+from .fakes import FakeWriteOrbis
+
+
+SCHEMA = {
+    "$defs": {"DateTime": {"type": "string", "format": "date-time"}},
+    "required": ["page", "customer_user_id"],
+    "properties": {
+        "page": {"type": "string"},
+        "customer_user_id": {"type": "integer"},
+        "timestamp": {"$ref": "#/$defs/DateTime"},
+        "score": {"type": ["number", "null"]},
+        "returning": {"type": "boolean"},
+        "tags": {"type": "array"},
+    },
+    "additionalProperties": False,
+}
+
+
+class TestCoerceRow(unittest.TestCase):
+
+    def test_types_follow_schema(self):
+        row = coerce_row({"page": "007", "customer_user_id": " 12 ", "timestamp": "2024-09-25T15:06:14Z",
+                          "score": "1.5", "returning": "Yes", "tags": '["a"]'}, SCHEMA)
+        self.assertEqual(row, {"page": "007", "customer_user_id": 12, "timestamp": "2024-09-25T15:06:14Z",
+                               "score": 1.5, "returning": True, "tags": ["a"]})
+        self.assertEqual(coerce_row({"score": "3"}, SCHEMA), {"score": 3})
+
+    def test_empty_cells(self):
+        self.assertEqual(coerce_row({"page": "", "customer_user_id": "", "score": ""}, SCHEMA), {"page": ""})
+
+    def test_bad_value_names_the_field(self):
+        with self.assertRaisesRegex(ValueError, "customer_user_id: Cannot convert 'abc' to integer"):
+            coerce_row({"customer_user_id": "abc"}, SCHEMA)
+
+    def test_non_strings_pass_through(self):
+        self.assertEqual(coerce_row({"customer_user_id": 3, "extra": "x"}, SCHEMA), {"customer_user_id": 3, "extra": "x"})
+
+
+class TestIngest(unittest.TestCase):
+
+    def test_read_csv_is_lazy(self):
+        rows = read_csv(io.StringIO("page,customer_user_id\n/home,1\n/about,2\n"))
+        self.assertEqual(next(rows), {"page": "/home", "customer_user_id": "1"})
+
+    def test_ingest_converts_and_counts(self):
+        db = FakeWriteOrbis(SCHEMA)
+        csv_file = io.StringIO("page,customer_user_id\n/home,1\n/about,x\n/contact,\n/blog,4\n")
+        results, progress = [], []
+        stats = ingest(db, read_csv(csv_file), concurrency=2, on_progress=progress.append, on_result=results.append)
+        self.assertEqual((stats.created, stats.failed), (2, 2))
+        self.assertEqual(db.created, [{"page": "/home", "customer_user_id": 1}, {"page": "/blog", "customer_user_id": 4}])
+        self.assertIn("Cannot convert", results[1]["error"])
+        self.assertIn("Missing required fields: customer_user_id", results[2]["error"])
+        self.assertEqual(progress, [stats])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import threading
+import time
+import unittest
+
+from orbis_python.jobs import DONE, FAILED, QueueFull, WriteQueue
+
+
+class TestWriteQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = WriteQueue(workers=4, max_pending=100)
+
+    def tearDown(self):
+        self.queue.shutdown()
+
+    def test_result_and_failure(self):
+        ok = self.queue.submit(lambda: "k123")
+        bad = self.queue.submit(lambda: 1 / 0)
+        self.assertTrue(ok.wait(5) and bad.wait(5))
+        self.assertEqual(ok.status()["state"], DONE)
+        self.assertEqual(ok.status()["result"], "k123")
+        self.assertEqual(bad.status()["state"], FAILED)
+        self.assertIn("division by zero", bad.status()["error"])
+        self.assertIs(self.queue.get(ok.id), ok)
+        self.assertEqual(self.queue.stats()["failed"], 1)
+
+    def test_same_key_runs_in_order(self):
+        order = []
+
+        def write(i):
+            time.sleep(0.01 * (5 - i))
+            order.append(i)
+
+        jobs = [self.queue.submit(lambda i=i: write(i), keys=["stream"]) for i in range(5)]
+        for job in jobs:
+            job.wait(5)
+        self.assertEqual(order, list(range(5)))
+
+    def test_multi_key_job_waits_for_every_key(self):
+        release = threading.Event()
+        order = []
+        self.queue.submit(lambda: release.wait(5) and order.append("a"), keys=["a"])
+        self.queue.submit(lambda: order.append("b"), keys=["b"])
+        both = self.queue.submit(lambda: order.append("ab"), keys=["a", "b"])
+        time.sleep(0.05)
+        self.assertEqual(order, ["b"])
+        release.set()
+        both.wait(5)
+        self.assertEqual(order, ["b", "a", "ab"])
+
+    def test_concurrency_is_bounded(self):
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def write():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+        jobs = [self.queue.submit(write) for _ in range(16)]
+        for job in jobs:
+            job.wait(5)
+        self.assertLessEqual(peak[0], 4)
+
+    def test_queue_full(self):
+        queue = WriteQueue(workers=1, max_pending=2)
+        release = threading.Event()
+        queue.submit(lambda: release.wait(5))
+        time.sleep(0.05)
+        queue.submit(lambda: None)
+        queue.submit(lambda: None)
+        with self.assertRaises(QueueFull):
+            queue.submit(lambda: None)
+        release.set()
+        queue.shutdown()
+
+    def test_keeps_bounded_history(self):
+        queue = WriteQueue(workers=1, keep=3)
+        jobs = [queue.submit(lambda: None) for _ in range(6)]
+        queue.shutdown()
+        self.assertIsNone(queue.get(jobs[0].id))
+        self.assertIsNotNone(queue.get(jobs[-1].id))
+
+    def test_history_is_trimmed_past_a_long_running_job(self):
+        queue = WriteQueue(workers=2, keep=3)
+        release = threading.Event()
+        slow = queue.submit(lambda: release.wait(5))
+        jobs = [queue.submit(lambda: None) for _ in range(6)]
+        for job in jobs:
+            job.wait(5)
+        self.assertIsNotNone(queue.get(slow.id))
+        self.assertIsNone(queue.get(jobs[0].id))
+        self.assertEqual(sum(queue.get(job.id) is not None for job in jobs), 3)
+        release.set()
+        queue.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
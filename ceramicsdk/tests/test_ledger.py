@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from orbis_python import CheckpointLedger, ingest
+from orbis_python.ledger import MAGIC, RECORD_SIZE, BloomFilter, row_digest
+
+from .fakes import FakeWriteOrbis, fake_stream_id
+
+
+SCHEMA = {"required": ["page"], "properties": {"page": {"type": "string"}, "n": {"type": "integer"}}}
+
+
+class TestCheckpointLedger(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "rows.ledger")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_records_survive_reopen(self):
+        with CheckpointLedger(self.path, capacity=1000) as ledger:
+            for i in range(100):
+                ledger.add(row_digest({"n": i}), f"kjz{i}")
+            self.assertEqual(ledger.get(row_digest({"n": 7})), "kjz7")
+        self.assertTrue(os.path.exists(self.path + ".bloom"))
+        with CheckpointLedger(self.path, capacity=1000) as ledger:
+            self.assertEqual(len(ledger), 100)
+            self.assertEqual(ledger.get(row_digest({"n": 99})), "kjz99")
+            self.assertEqual(ledger.get(row_digest({"n": 3})), "kjz3")
+            self.assertIsNone(ledger.get(row_digest({"n": 100})))
+
+    def test_filter_grows_with_the_ledger(self):
+        with CheckpointLedger(self.path, capacity=16) as ledger:
+            small = ledger.bloom.bits
+            for i in range(100):
+                ledger.add(row_digest({"n": i}), f"kjz{i}")
+            self.assertEqual(ledger.capacity, 128)
+            self.assertGreater(ledger.bloom.bits, small)
+            self.assertTrue(all(row_digest({"n": i}) in ledger.bloom for i in range(100)))
+        self.assertLess(os.path.getsize(self.path + ".bloom"), 1024)
+
+    def test_lookups_out_of_order_and_false_positives(self):
+        with CheckpointLedger(self.path, capacity=1000) as ledger:
+            for i in range(2000):
+                ledger.add(row_digest({"n": i}), f"kjz{i}")
+            self.assertEqual([ledger.get(row_digest({"n": i})) for i in (1500, 3, 1999, 0)],
+                             ["kjz1500", "kjz3", "kjz1999", "kjz0"])
+            with mock.patch.object(BloomFilter, "__contains__", return_value=True):
+                self.assertIsNone(ledger.get(row_digest({"n": 2000})))
+            ledger.add(row_digest({"n": 2000}), "kjz2000")
+            self.assertEqual(ledger.get(row_digest({"n": 2000})), "kjz2000")
+            self.assertEqual(ledger.get(row_digest({"n": 42})), "kjz42")
+
+    def test_replays_records_missing_from_saved_filter(self):
+        with CheckpointLedger(self.path, capacity=1000) as ledger:
+            ledger.add(row_digest({"n": 1}), "kjz1")
+        # Appended by a run that crashed before saving its filter
+        ledger = CheckpointLedger(self.path, capacity=1000)
+        ledger.add(row_digest({"n": 2}), "kjz2")
+        ledger.sync()
+        os.remove(self.path + ".bloom")
+        ledger._file.close()
+        with CheckpointLedger(self.path, capacity=1000) as ledger:
+            self.assertEqual(ledger.get(row_digest({"n": 2})), "kjz2")
+
+    def test_torn_record_is_dropped(self):
+        with CheckpointLedger(self.path, capacity=1000) as ledger:
+            ledger.add(row_digest({"n": 1}), "kjz1")
+        with open(self.path, "ab") as file:
+            file.write(b"\x01" * 40)
+        with CheckpointLedger(self.path, capacity=1000) as ledger:
+            self.assertEqual(len(ledger), 1)
+            self.assertEqual(os.path.getsize(self.path), len(MAGIC) + RECORD_SIZE)
+
+    def test_rejects_other_files(self):
+        with open(self.path, "wb") as file:
+            file.write(b"page,n\n")
+        with self.assertRaises(ValueError):
+            CheckpointLedger(self.path)
+
+    def test_digest_ignores_key_order(self):
+        self.assertEqual(row_digest({"a": "1", "b": "2"}), row_digest({"b": "2", "a": "1"}))
+        self.assertNotEqual(row_digest({"a": "1"}), row_digest({"a": 1}))
+
+    def test_ingest_resumes_after_interruption(self):
+        rows = [{"page": "/home", "n": str(i)} for i in range(30)]
+        with CheckpointLedger(self.path, capacity=1000) as ledger:
+            first = ingest(FakeWriteOrbis(SCHEMA, fail_at=12), rows, concurrency=1, ledger=ledger)
+        self.assertEqual((first.created, first.failed), (12, 18))
+
+        db = FakeWriteOrbis(SCHEMA)
+        results = []
+        with CheckpointLedger(self.path, capacity=1000) as ledger:
+            second = ingest(db, rows, concurrency=4, ledger=ledger, on_result=results.append)
+        self.assertEqual((second.created, second.skipped, second.failed), (18, 12, 0))
+        self.assertEqual(sorted(row["n"] for row in db.created), list(range(12, 30)))
+        self.assertEqual([result["index"] for result in results], list(range(30)))
+        self.assertEqual(results[5], {"index": 5, "stream_id": fake_stream_id({"page": "/home", "n": 5}), "skipped": True})
+
+    def test_skipped_rows_between_writes_keep_order(self):
+        rows = [{"page": "/home", "n": str(i)} for i in range(10)]
+        with CheckpointLedger(self.path, capacity=1000) as ledger:
+            for i in (3, 4, 5, 8):
+                ledger.add(row_digest(rows[i]), f"kjz{i:05d}")
+            results = []
+            stats = ingest(FakeWriteOrbis(SCHEMA), rows, concurrency=3, ledger=ledger, on_result=results.append)
+        self.assertEqual([result["index"] for result in results], list(range(10)))
+        self.assertEqual((stats.created, stats.skipped), (6, 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import threading
+import time
+import unittest
+
+import requests
+from requests.adapters import BaseAdapter
+
+from ceramic_python import AdaptiveLimiter, LimitedSession, TokenBucket
+from ceramic_python.metrics import metrics
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_rate_is_a_ceiling(self):
+        bucket = TokenBucket(rate=200, burst=1)
+        t = time.monotonic()
+        for _ in range(21):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - t, 0.09)
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+
+    def call(self, limiter, latency=0.0, ok=True):
+        started = limiter.acquire()
+        limiter.release(started - latency, ok)
+        return started
+
+    def test_grows_while_used_and_latency_is_stable(self):
+        limiter = AdaptiveLimiter(initial=1, max_limit=8)
+        for _ in range(100):
+            for started in [limiter.acquire() for _ in range(int(limiter.limit))]:
+                limiter.release(started - 0.01)
+        self.assertEqual(limiter.limit, 8)
+
+    def test_does_not_grow_past_what_is_used(self):
+        limiter = AdaptiveLimiter(initial=1, max_limit=8)
+        for _ in range(100):
+            self.call(limiter, 0.01)
+        self.assertLessEqual(limiter.limit, 2.5)
+
+    def test_backs_off_once_per_episode(self):
+        limiter = AdaptiveLimiter(initial=10, backoff=0.5)
+        before = limiter.acquire()
+        self.call(limiter, ok=False)
+        self.assertEqual(limiter.limit, 5)
+        # Started before the decrease, so it belongs to the same overload episode
+        limiter.release(before, ok=False)
+        self.assertEqual(limiter.limit, 5)
+        self.call(limiter, ok=False)
+        self.assertEqual(limiter.limit, 2.5)
+        self.assertEqual(limiter.decreases, 2)
+
+    def test_latency_spike_backs_off(self):
+        limiter = AdaptiveLimiter(initial=10, backoff=0.5, tolerance=2.0, smoothing=1.0)
+        for _ in range(5):
+            self.call(limiter, 0.01)
+        limit = limiter.limit
+        self.call(limiter, 0.05)
+        self.assertAlmostEqual(limiter.limit, limit * 0.5)
+
+    def test_blocks_at_the_limit(self):
+        limiter = AdaptiveLimiter(initial=1, max_limit=1)
+        started = limiter.acquire()
+        acquired = threading.Event()
+        threading.Thread(target=lambda: (limiter.acquire(), acquired.set())).start()
+        self.assertFalse(acquired.wait(0.05))
+        limiter.release(started)
+        self.assertTrue(acquired.wait(1))
+
+
+class StatusAdapter(BaseAdapter):
+
+    def __init__(self, status):
+        super().__init__()
+        self.status = status
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = self.status
+        response.url = request.url
+        response._content = b"{}"
+        return response
+
+    def close(self):
+        pass
+
+
+class TestLimitedSession(unittest.TestCase):
+
+    def test_one_limiter_per_endpoint(self):
+        session = LimitedSession(initial=4, endpoints={"http://orbis:7008/api": {"max_limit": 2}})
+        session.mount("http://ceramic/", StatusAdapter(503))
+        session.mount("http://orbis:7008/", StatusAdapter(200))
+        session.get("http://ceramic/api/v0/streams/k1")
+        session.post("http://orbis:7008/api/db/query/json", json={})
+        ceramic, orbis = session.limiter("http://ceramic/x"), session.limiter("http://orbis:7008/")
+        self.assertLess(ceramic.limit, 4)
+        self.assertEqual(orbis.limit, 2)
+        self.assertEqual(ceramic.in_flight + orbis.in_flight, 0)
+        self.assertIn('upstream_concurrency_limit{endpoint="http://orbis:7008"} 2.0', metrics.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+from ceramic_python.metrics import UPSTREAM_SECONDS, Histogram, Metrics, metrics, timed
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+        for value in (0.005, 0.01, 0.05, 0.5, 3.0):
+            histogram.observe(value)
+        cumulative, total = histogram.snapshot()
+        self.assertEqual(cumulative, [2, 3, 4, 5])
+        self.assertAlmostEqual(total, 3.565)
+        self.assertEqual(histogram.count, 5)
+
+    def test_quantile(self):
+        histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+        self.assertIsNone(histogram.quantile(0.5))
+        for _ in range(99):
+            histogram.observe(0.005)
+        histogram.observe(0.5)
+        self.assertLessEqual(histogram.quantile(0.5), 0.01)
+        self.assertGreater(histogram.quantile(0.999), 0.1)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_render_prometheus_text(self):
+        registry = Metrics()
+        registry.observe("http_request_duration_seconds", 0.02, route="/get", method="GET", status=200)
+        registry.gauge("write_queue_depth", lambda: 3, help="Waiting writes")
+        registry.counter("reads_total", lambda: 7)
+        text = registry.render()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="/get",status="200",le="0.025"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="/get",status="200",le="0.01"} 0', text)
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/get",status="200"} 1', text)
+        self.assertIn('# HELP write_queue_depth Waiting writes\n# TYPE write_queue_depth gauge\nwrite_queue_depth 3.0', text)
+        self.assertIn('# TYPE reads_total counter\nreads_total 7.0', text)
+
+    def test_failing_gauge_renders_nan(self):
+        registry = Metrics()
+        registry.gauge("broken", lambda: 1 / 0)
+        self.assertIn("broken nan", registry.render())
+
+    def test_label_values_are_escaped(self):
+        registry = Metrics()
+        registry.observe("latency", 0.1, route='/a"b')
+        self.assertIn('route="/a\\"b"', registry.render())
+
+    def test_timed_decorator(self):
+        @timed("test_op")
+        def work(x):
+            return x * 2
+
+        before = metrics.histogram(UPSTREAM_SECONDS, op="test_op").count
+        self.assertEqual(work(2), 4)
+        self.assertEqual(metrics.histogram(UPSTREAM_SECONDS, op="test_op").count, before + 1)
+
+    def test_timer_records_on_error(self):
+        registry = Metrics()
+        with self.assertRaises(ZeroDivisionError):
+            with registry.timer("latency", op="x"):
+                1 / 0
+        self.assertEqual(registry.histogram("latency", op="x").count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
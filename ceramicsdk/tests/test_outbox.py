@@ -0,0 +1,185 @@
+import os
+import tempfile
+import threading
+import unittest
+from base64 import b64decode
+
+import dag_cbor
+from multiformats import CID
+
+from ceramic_python import Outbox, OutboxDrainer
+from ceramic_python.helper import commit_cid, stream_id_from_genesis
+from ceramic_python.model_instance_document import ModelInstanceDocument, ModelInstanceDocumentMetadataArgs
+from orbis_python import OrbisDB
+
+from .fakes import SIGNER, TABLE
+
+
+DEFINITION = {"accountRelation": {"type": "list"}, "schema": {"properties": {"page": {"type": "string"}}}}
+METADATA = ModelInstanceDocumentMetadataArgs(SIGNER.public_key, TABLE)
+
+
+class FakeCeramic:
+    """Applies commits in memory, checking that each update builds on the stream's tip"""
+
+    def __init__(self, failures=0):
+        self.logs = {}
+        self.failures = failures
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def _maybe_fail(self):
+        with self.lock:
+            self.calls += 1
+            if self.failures:
+                self.failures -= 1
+                raise Exception("Error applying commit: 503 Service Unavailable")
+
+    def create_stream_from_genesis(self, stream_type, commit, opts):
+        self._maybe_fail()
+        stream_id = stream_id_from_genesis(stream_type, commit)
+        with self.lock:
+            self.logs.setdefault(stream_id, [commit_cid(commit)])
+        return stream_id
+
+    def apply_commit(self, stream_id, commit, opts):
+        self._maybe_fail()
+        payload = dag_cbor.decode(b64decode(commit["linkedBlock"] + "=="))
+        with self.lock:
+            log = self.logs[stream_id]
+            if payload["prev"] != CID.decode(log[-1]):
+                raise Exception(f"Commit does not build on the tip of {stream_id}")
+            log.append(commit_cid(commit))
+
+    def get_stream_state(self, stream_id):
+        with self.lock:
+            return {"log": [{"cid": cid} for cid in self.logs.get(stream_id, [])]}
+
+    def get_stream_commits(self, stream_id):
+        with self.lock:
+            return self.logs[stream_id][0], self.logs[stream_id][-1]
+
+
+def genesis(page):
+    return ModelInstanceDocument.make_genesis(SIGNER, {"page": page}, METADATA)
+
+
+class TestOutbox(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = self.dir.name
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def queue_updates(self, outbox, stream_id, pages):
+        for page in pages:
+            genesis_cid, previous_cid = outbox.tip(stream_id)
+            commit = ModelInstanceDocument.make_patch_commit(
+                SIGNER, genesis_cid, previous_cid, [{"op": "replace", "path": "/page", "value": page}])
+            outbox.add_update(stream_id, commit, {})
+
+    def test_entries_survive_reopen(self):
+        outbox = Outbox(self.path)
+        entry = outbox.add_genesis(genesis("/home"), {"anchor": True})
+        self.assertEqual(entry.stream_id, stream_id_from_genesis(3, entry.commit))
+        self.assertTrue(entry.stream_id.startswith("kjzl6kcym7w8y"))
+        self.queue_updates(outbox, entry.stream_id, ["/about"])
+        outbox.close()
+
+        reopened = Outbox(self.path)
+        self.assertEqual([e.kind for e in reopened.pending()], ["genesis", "update"])
+        self.assertEqual(reopened.tip(entry.stream_id)[0], entry.cid)
+        self.assertEqual(reopened.add_genesis(genesis("/x"), {}).seq, 2)
+
+    def test_torn_record_is_dropped(self):
+        outbox = Outbox(self.path)
+        outbox.add_genesis(genesis("/home"), {})
+        outbox.close()
+        segment = os.path.join(self.path, os.listdir(self.path)[0])
+        with open(segment, "ab") as file:
+            file.write(b"\x00\x00\x01\x00garbage")
+        self.assertEqual(len(Outbox(self.path)), 1)
+
+    def test_drainer_keeps_order_per_stream_and_retries(self):
+        ceramic = FakeCeramic(failures=5)
+        outbox = Outbox(self.path, segment_bytes=4096)
+        streams = [outbox.add_genesis(genesis(f"/{i}"), {}).stream_id for i in range(4)]
+        for stream_id in streams:
+            self.queue_updates(outbox, stream_id, [f"/v{n}" for n in range(5)])
+        drainer = OutboxDrainer(outbox, ceramic, workers=3, retry_base=0.001).start()
+        self.assertTrue(drainer.drain(timeout=10))
+        drainer.stop()
+        self.assertEqual(drainer.submitted, 24)
+        self.assertTrue(all(len(ceramic.logs[stream_id]) == 6 for stream_id in streams))
+        # Fully acknowledged segments are deleted, only the one being written remains
+        self.assertEqual(len([name for name in os.listdir(self.path) if name.endswith(".seg")]), 1)
+        self.assertEqual(len(Outbox(self.path)), 0)
+
+    def test_gives_up_on_commits_that_depend_on_a_failed_one(self):
+        ceramic = FakeCeramic(failures=2)
+        outbox = Outbox(self.path)
+        stream_id = outbox.add_genesis(genesis("/home"), {}).stream_id
+        self.queue_updates(outbox, stream_id, ["/a", "/b"])
+        failed = []
+        drainer = OutboxDrainer(outbox, ceramic, workers=1, max_attempts=2, retry_base=0.001,
+                                on_failure=lambda entry, error: failed.append(entry.kind))
+        drainer.start()
+        self.assertTrue(drainer.drain(timeout=5))
+        drainer.stop()
+        self.assertEqual(failed, ["genesis", "update", "update"])
+        self.assertEqual(ceramic.logs, {})
+
+
+    def test_concurrent_appends_across_segments(self):
+        outbox = Outbox(self.path, segment_bytes=512)
+        threads = [threading.Thread(target=lambda n=n: [outbox.add_genesis(genesis(f"/{n}/{i}"), {}) for i in range(25)])
+                   for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        outbox.close()
+        self.assertEqual(len(Outbox(self.path)), 200)
+
+    def test_restarted_drainer_submits_each_commit_once(self):
+        ceramic = FakeCeramic(failures=1000)
+        outbox = Outbox(self.path)
+        streams = [outbox.add_genesis(genesis(f"/{i}"), {}).stream_id for i in range(3)]
+        drainer = OutboxDrainer(outbox, ceramic, workers=2, retry_base=5.0)
+        drainer.start()
+        while ceramic.calls < 2:
+            threading.Event().wait(0.01)
+        drainer.stop()
+        self.assertEqual(len(outbox), 3)
+
+        ceramic.failures = ceramic.calls = 0
+        self.queue_updates(outbox, streams[0], ["/a"])
+        drainer.start()
+        self.assertTrue(drainer.drain(timeout=5))
+        drainer.stop()
+        self.assertEqual((ceramic.calls, drainer.submitted), (4, 4))
+        self.assertEqual(len(ceramic.logs[streams[0]]), 2)
+
+
+class TestOrbisOutbox(unittest.TestCase):
+
+    def test_writes_go_through_the_outbox(self):
+        with tempfile.TemporaryDirectory() as path:
+            outbox = Outbox(path)
+            db = OrbisDB("http://ceramic", "http://orbis", table_stream=TABLE, controller_private_key="11" * 32,
+                         model_cache={TABLE: DEFINITION}, outbox=outbox)
+            stream_id = db.add_row({"page": "/home"})
+            self.assertEqual(db.update_row(stream_id, {"page": "/about"}), stream_id)
+            db.update_row(stream_id, {"page": "/contact"})
+
+            ceramic = FakeCeramic()
+            drainer = OutboxDrainer(outbox, ceramic).start()
+            self.assertTrue(drainer.drain(timeout=5))
+            drainer.stop()
+            self.assertEqual(len(ceramic.logs[stream_id]), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import threading
+import unittest
+from unittest import mock
+
+from orbis_python import ClientRegistry, QueryCache
+
+from .fakes import TABLE
+
+
+SEED_ONE = "11" * 32
+SEED_TWO = "22" * 32
+
+
+class TestClientRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = QueryCache(ttl=60)
+        self.registry = ClientRegistry("http://ceramic", "http://orbis", {"one": SEED_ONE, "two": SEED_TWO},
+                                       table_stream=TABLE, cache=self.cache)
+
+    def test_handles_are_built_once(self):
+        self.assertIs(self.registry.get("one"), self.registry.get("one"))
+        self.assertEqual(self.registry.get("one").controller.private_key, SEED_ONE)
+        self.assertNotEqual(self.registry.get("one").controller.id, self.registry.get("two").controller.id)
+        self.assertEqual(sorted(self.registry.agents), ["one", "two"])
+
+    def test_unknown_agent_gets_default(self):
+        self.assertIs(self.registry.get("nobody"), self.registry.default)
+        self.assertIs(self.registry.get(None), self.registry.default)
+
+    def test_handles_share_session_and_caches(self):
+        one, two = self.registry.get("one"), self.registry.get("two")
+        self.assertIs(one.session, two.session)
+        self.assertIs(one.ceramic_client.session, one.session)
+        self.assertIs(one.cache, self.cache)
+        self.assertIs(one.model_cache, two.model_cache)
+
+    def test_model_definition_loaded_once(self):
+        state = {"state": {"content": {"accountRelation": {"type": "list"}}}}
+        one, two = self.registry.get("one"), self.registry.get("two")
+        with mock.patch.object(one.ceramic_client, "load_stream", return_value=state) as load:
+            one.model_definition()
+            self.assertEqual(two.model_definition()["accountRelation"]["type"], "list")
+        self.assertEqual(load.call_count, 1)
+
+    def test_concurrent_get(self):
+        seen = []
+        threads = [threading.Thread(target=lambda: seen.append(self.registry.get("two"))) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        self.registry.register("three", None)
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all(handle is self.registry.get("two") for handle in seen))
+        self.assertIn("three", self.registry.agents)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import importlib.util
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from orbis_python.replica import OrbisReplica, bind_params
+
+from .fakes import TABLE
+
+
+class FakeOrbis:
+    """Stands in for OrbisDB by running the replica's SQL on an in-memory database"""
+
+    def __init__(self):
+        self.table_stream = TABLE
+        self.remote = sqlite3.connect(":memory:")
+        self.remote.row_factory = sqlite3.Row
+        self.remote.execute(f'CREATE TABLE "{TABLE}" (stream_id TEXT, page TEXT, customer_user_id INTEGER, indexed_at TEXT)')
+        self.queries = 0
+
+    def insert(self, stream_id, page, customer_user_id, indexed_at):
+        self.remote.execute(f'INSERT INTO "{TABLE}" VALUES (?, ?, ?, ?)', (stream_id, page, customer_user_id, indexed_at))
+
+    def _fetch(self, env_id, query, params=None, use_cache=True):
+        self.queries += 1
+        rows = self.remote.execute(query, bind_params(params or [])).fetchall()
+        return {"data": [dict(row) for row in rows]}
+
+
+class TestOrbisReplica(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "replica.db")
+        self.remote = FakeOrbis()
+        for i in range(7):
+            self.remote.insert(f"k{i}", "/home" if i % 2 else "/about", i, f"2024-09-25T15:00:0{i}")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_initial_load_pages_through_table(self):
+        replica = OrbisReplica(self.remote, "env", self.path, page_size=3)
+        self.assertEqual(replica.refresh(), 7)
+        self.assertEqual(self.remote.queries, 3)
+        self.assertEqual(replica.get("k4"), {"stream_id": "k4", "page": "/about", "customer_user_id": 4,
+                                             "indexed_at": "2024-09-25T15:00:04"})
+
+    def test_null_watermark_on_full_page_is_an_error(self):
+        self.remote.insert("j0", "/home", 0, None)
+        self.remote.insert("j1", "/home", 1, None)
+        replica = OrbisReplica(self.remote, "env", self.path, page_size=2)
+        self.assertRaises(ValueError, replica.refresh)
+        self.assertEqual(self.remote.queries, 1)
+
+    def test_incremental_sync_pulls_only_new_rows(self):
+        replica = OrbisReplica(self.remote, "env", self.path)
+        replica.refresh()
+        self.remote.insert("k7", "/contact", 7, "2024-09-25T15:00:07")
+        self.remote.insert("k8", "/contact", 8, "2024-09-25T15:00:07")
+        self.assertEqual(replica.refresh(), 2)
+        self.assertEqual(replica.refresh(), 0)
+        rows = replica.query(f'SELECT stream_id FROM "{TABLE}" WHERE page = $1 ORDER BY stream_id', ["/contact"])
+        self.assertEqual([row["stream_id"] for row in rows], ["k7", "k8"])
+
+    def test_state_survives_restart(self):
+        OrbisReplica(self.remote, "env", self.path).refresh()
+        replica = OrbisReplica(self.remote, "env", self.path, max_staleness=3600)
+        queries = self.remote.queries
+        self.assertEqual(replica.cursor, ("2024-09-25T15:00:06", "k6"))
+        self.assertIsNotNone(replica.get("k0"))
+        self.assertEqual(self.remote.queries, queries)
+
+    def test_stale_reads_sync_first(self):
+        replica = OrbisReplica(self.remote, "env", self.path, max_staleness=3600)
+        replica.refresh()
+        self.remote.insert("k9", "/contact", 9, "2024-09-25T15:00:09")
+        self.assertIsNone(replica.get("k9"))
+        replica.mark_stale()
+        self.assertIsNotNone(replica.get("k9"))
+
+
+    def test_text_params_do_not_match_integer_columns(self):
+        replica = OrbisReplica(self.remote, "env", self.path)
+        replica.refresh()
+        query = f'SELECT stream_id FROM "{TABLE}" WHERE customer_user_id = $1'
+        self.assertEqual(replica.query(query, ["3"]), [])
+        self.assertEqual(replica.query(query, [3]), [{"stream_id": "k3"}])
+
+
+def load_server():
+    """Import server-example.py with the default handle reading TABLE"""
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+    os.environ.update(ENV_ID="env", TABLE_ID=TABLE, CONTEXT_ID="", CERAMIC_ENDPOINT="http://ceramic",
+                      ORBIS_ENDPOINT="http://orbis", AGENT_ONE_SEED="11" * 32, AGENT_TWO_SEED="22" * 32,
+                      AGENT_THREE_SEED="33" * 32)
+    spec = importlib.util.spec_from_file_location("server_example", os.path.join(root, "server-example.py"))
+    server = importlib.util.module_from_spec(spec)
+    # load_dotenv(override=True) would replace the values above with a local .env
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            spec.loader.exec_module(server)
+        finally:
+            os.chdir(cwd)
+    return server
+
+
+@unittest.skipUnless(importlib.util.find_spec("flask") and importlib.util.find_spec("dotenv"),
+                     "the example server's dependencies are not installed")
+class TestFilterRoute(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        remote = FakeOrbis()
+        for i in range(7):
+            remote.insert(f"k{i}", "/home" if i % 2 else "/about", i, f"2024-09-25T15:00:0{i}")
+        self.server = load_server()
+        self.orbis = self.server.registry.default
+        self.orbis.replica = OrbisReplica(remote, "env", os.path.join(self.dir.name, "replica.db"))
+        self.orbis.replica.refresh()
+        definition = {"schema": {"properties": {"page": {"type": "string"}, "customer_user_id": {"type": "integer"}}}}
+        patcher = mock.patch.object(self.orbis, "model_definition", return_value=definition)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = self.server.app.test_client()
+
+    def tearDown(self):
+        self.orbis.replica.close()
+        self.dir.cleanup()
+
+    def test_query_string_values_match_typed_columns(self):
+        response = self.client.get("/filter?customer_user_id=3&customer_user_id=5&columns=stream_id&order_by=stream_id")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), [{"stream_id": "k3"}, {"stream_id": "k5"}])
+        response = self.client.get("/filter?customer_user_id__gte=4&page=/about&columns=stream_id&order_by=stream_id")
+        self.assertEqual(response.get_json(), [{"stream_id": "k4"}, {"stream_id": "k6"}])
+
+    def test_unconvertible_value_is_rejected(self):
+        response = self.client.get("/filter?customer_user_id=three")
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
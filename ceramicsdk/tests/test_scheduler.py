@@ -0,0 +1,125 @@
+import threading
+import time
+import unittest
+
+from orbis_python import CommitScheduler, OrbisDB
+from orbis_python.scheduler import default_scheduler
+
+from .fakes import TABLE
+
+
+class TestCommitScheduler(unittest.TestCase):
+
+    def test_fifo_within_a_stream(self):
+        scheduler = CommitScheduler(lanes=4)
+        applied = {}
+
+        def apply(stream_id, n):
+            time.sleep(0.001 * (n % 3))
+            applied.setdefault(stream_id, []).append(n)
+
+        futures = [scheduler.submit(f"k{i % 5}", lambda i=i: apply(f"k{i % 5}", i)) for i in range(50)]
+        for future in futures:
+            future.result()
+        scheduler.shutdown()
+        for stream_id, order in applied.items():
+            self.assertEqual(order, sorted(order))
+
+    def test_lanes_run_concurrently(self):
+        scheduler = CommitScheduler(lanes=4)
+        streams = [f"k{i}" for i in range(40)]
+        lanes = {scheduler.lane(stream_id) for stream_id in streams}
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def apply():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+        for future in scheduler.map(streams, lambda stream_id: apply()):
+            future.result()
+        scheduler.shutdown()
+        self.assertEqual(len(lanes), 4)
+        self.assertGreater(peak[0], 1)
+        self.assertLessEqual(peak[0], 4)
+
+    def test_depths_and_errors(self):
+        scheduler = CommitScheduler(lanes=2)
+        started, gate = threading.Event(), threading.Event()
+        blocker = scheduler.submit("k0", lambda: (started.set(), gate.wait()))
+        started.wait(1)
+        lane = scheduler.lane("k0")
+        queued = [scheduler.submit("k0", lambda: 1 / 0) for _ in range(3)]
+        self.assertEqual(scheduler.depths()[lane], 3)
+        gate.set()
+        blocker.result()
+        with self.assertRaises(ZeroDivisionError):
+            queued[0].result()
+        scheduler.shutdown()
+        self.assertEqual(scheduler.depth, 0)
+        with self.assertRaises(RuntimeError):
+            scheduler.submit("k0", lambda: None)
+
+    def test_lane_is_stable(self):
+        self.assertEqual(CommitScheduler(lanes=8).lane("kjzl6kcym7w8y"), CommitScheduler(lanes=8).lane("kjzl6kcym7w8y"))
+
+
+class FakeUpdateOrbis(OrbisDB):
+
+    def __init__(self, rows):
+        super().__init__("http://ceramic", "http://orbis", table_stream=TABLE, controller_private_key="11" * 32,
+                         scheduler=CommitScheduler(lanes=4))
+        self.rows = rows
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def filter(self, env_id, filters, columns=None, **kwargs):
+        return [{"stream_id": stream_id} for stream_id in self.rows]
+
+    def _patch_row(self, stream_id, new_content):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.005)
+        with self.lock:
+            self.running -= 1
+        if stream_id == "kbad":
+            raise Exception("Commit rejected")
+        return {"stream_id": stream_id, **new_content}
+
+
+class TestUpdateRows(unittest.TestCase):
+
+    def test_updates_streams_concurrently_in_order(self):
+        rows = [f"k{i:03d}" for i in range(20)]
+        db = FakeUpdateOrbis(rows)
+        results = db.update_rows("env", {"page": "/home"}, {"page": "/about"})
+        self.assertEqual([result["stream_id"] for result in results], rows)
+        self.assertGreater(db.peak, 1)
+
+    def test_first_error_is_raised_after_all_finished(self):
+        db = FakeUpdateOrbis(["k001", "kbad", "k002"])
+        with self.assertRaisesRegex(Exception, "Commit rejected"):
+            db.update_rows("env", {"page": "/home"}, {"page": "/about"})
+        self.assertEqual(db.running, 0)
+
+    def test_update_from_a_lane_is_refused(self):
+        db = FakeUpdateOrbis(["k001"])
+        future = db.scheduler.submit("k001", lambda: db.update_row("k001", {"page": "/about"}))
+        with self.assertRaises(RuntimeError):
+            future.result(timeout=5)
+        self.assertFalse(db.scheduler.on_lane())
+
+    def test_handles_share_the_default_scheduler(self):
+        one = OrbisDB("http://ceramic", "http://orbis", table_stream=TABLE)
+        two = OrbisDB("http://ceramic", "http://orbis", table_stream=TABLE)
+        self.assertIs(one.scheduler, two.scheduler)
+        self.assertIs(one.scheduler, default_scheduler())
+
+
+if __name__ == "__main__":
+    unittest.main()
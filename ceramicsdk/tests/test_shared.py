@@ -0,0 +1,134 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from orbis_python import QueryCache, SharedMemoryCache
+from orbis_python.shared import SEQUENCE
+
+from .fakes import TABLE
+
+
+# Rewrites the same keys with values whose content can be checked by the reader
+WRITER = """
+import sys
+from orbis_python import SharedMemoryCache
+cache = SharedMemoryCache(sys.argv[1])
+for n in range(400):
+    for k in range(16):
+        cache.put(b"k%d" % k, (b"%d:%d;" % (k, n)) * (1 + n % 300))
+"""
+
+
+class TestSharedMemoryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "cache")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_values_are_seen_by_every_handle(self):
+        first = SharedMemoryCache(self.path, slots=64, arena_bytes=1 << 16)
+        # Opening it again keeps the geometry and the entries
+        second = SharedMemoryCache(self.path, slots=8)
+        self.assertEqual(second.slots, 64)
+        first.put(b"small", b"value")
+        first.put(b"large", b"x" * 5000)
+        first.put(b"short", b"lived", ttl=0.05)
+        self.assertEqual(second.get(b"small"), b"value")
+        self.assertEqual(second.get(b"large"), b"x" * 5000)
+        self.assertEqual(second.get(b"short"), b"lived")
+        time.sleep(0.06)
+        self.assertIsNone(second.get(b"short"))
+        self.assertTrue(second.delete(b"small"))
+        self.assertIsNone(first.get(b"small"))
+        self.assertFalse(first.put(b"huge", b"x" * (1 << 15)))
+
+    def test_overwritten_arena_entries_are_misses(self):
+        cache = SharedMemoryCache(self.path, slots=256, arena_bytes=1 << 14)
+        for n in range(20):
+            cache.put(b"k%d" % n, bytes([n]) * 2000)
+        self.assertIsNone(cache.get(b"k0"))
+        self.assertEqual(cache.get(b"k19"), bytes([19]) * 2000)
+
+    def test_referenced_entries_survive_eviction(self):
+        cache = SharedMemoryCache(self.path, slots=8)
+        for n in range(8):
+            cache.put(b"k%d" % n, b"v")
+        self.assertEqual(cache.get(b"k0"), b"v")
+        cache.put(b"new", b"v")
+        self.assertEqual(cache.get(b"k0"), b"v")
+        self.assertEqual(cache.get(b"new"), b"v")
+        self.assertEqual(sum(cache.get(b"k%d" % n) is not None for n in range(8)), 7)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_reads_racing_another_process_never_see_torn_values(self):
+        cache = SharedMemoryCache(self.path)
+        writer = subprocess.Popen([sys.executable, "-c", WRITER, self.path],
+                                  cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        seen = 0
+        while writer.poll() is None or not seen:
+            for k in range(16):
+                value = cache.get(b"k%d" % k)
+                if value is not None:
+                    parts = value.split(b";")[:-1]
+                    self.assertEqual(len(set(parts)), 1)
+                    self.assertTrue(parts[0].startswith(b"%d:" % k))
+                    seen += 1
+        self.assertEqual(writer.wait(), 0)
+
+    def test_slot_left_odd_by_a_dead_writer_recovers(self):
+        cache = SharedMemoryCache(self.path, slots=8)
+        cache.put(b"k", b"old")
+        offset = next(cache._slot(index) for index in range(8) if cache.map[cache._slot(index) + 4] & 1)
+        # A writer killed between marking the slot and finishing it leaves the sequence odd
+        SEQUENCE.pack_into(cache.map, offset, SEQUENCE.unpack_from(cache.map, offset)[0] | 1)
+        self.assertIsNone(cache.get(b"k"))
+        cache.put(b"k", b"new")
+        self.assertEqual(SEQUENCE.unpack_from(cache.map, offset)[0] % 2, 0)
+        self.assertEqual(cache.get(b"k"), b"new")
+
+    def test_package_imports_without_fcntl(self):
+        script = "import sys; sys.modules['fcntl'] = None; import orbis_python; print(orbis_python.QueryCache.__name__)"
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual((output.returncode, output.stdout.strip()), (0, "QueryCache"), output.stderr)
+
+    def test_bump_is_visible_to_other_handles(self):
+        first, second = SharedMemoryCache(self.path), SharedMemoryCache(self.path)
+        self.assertEqual(second.generation(TABLE), 0)
+        first.bump(TABLE)
+        self.assertEqual(second.generation(TABLE), 1)
+
+
+class TestSharedQueryCache(unittest.TestCase):
+
+    def test_workers_share_results_and_invalidations(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache")
+            # Two worker processes, each with its own QueryCache over the same file
+            one, two = QueryCache(shared=SharedMemoryCache(path)), QueryCache(shared=SharedMemoryCache(path))
+            calls = []
+
+            def loader():
+                calls.append(1)
+                return b'{"data": [%d]}' % len(calls)
+
+            query = f"SELECT * FROM {TABLE}"
+            self.assertEqual(one.get_or_load("env", query, [], loader), b'{"data": [1]}')
+            self.assertEqual(two.get_or_load("env", query, [], loader), b'{"data": [1]}')
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(two.stats()["shared_hits"], 1)
+
+            one.invalidate(TABLE)
+            self.assertEqual(two.get_or_load("env", query, [], loader), b'{"data": [2]}')
+            self.assertEqual(one.get_or_load("env", query, [], loader), b'{"data": [2]}')
+            self.assertEqual(len(calls), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
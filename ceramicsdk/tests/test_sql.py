@@ -0,0 +1,153 @@
+import importlib.util
+import sqlite3
+import threading
+import unittest
+from unittest import mock
+
+from orbis_python import OrbisDB
+from orbis_python.replica import bind_params
+from orbis_python.sql import build_select, chunk_filters, sort_rows, split_range
+from .fakes import TABLE
+from .test_replica import load_server
+
+
+class TestBuildSelect(unittest.TestCase):
+
+    def test_equality_keeps_values_out_of_sql(self):
+        query, params = build_select(TABLE, {"page": "/home'; DROP TABLE x; --", "customer_user_id": 3})
+        self.assertEqual(query, f'SELECT * FROM {TABLE} WHERE "page" = $1 AND "customer_user_id" = $2')
+        self.assertEqual(params, ["/home'; DROP TABLE x; --", 3])
+
+    def test_in_range_order_limit_projection(self):
+        query, params = build_select(
+            TABLE,
+            {"customer_user_id": [3, 8], "timestamp": {"gte": "a", "lt": "b"}, "address": None},
+            columns=["stream_id", "page"], order_by=["-timestamp", "page"], limit=10,
+        )
+        self.assertEqual(query, (
+            f'SELECT "stream_id", "page" FROM {TABLE} WHERE "customer_user_id" IN ($1, $2) '
+            f'AND "timestamp" >= $3 AND "timestamp" < $4 AND "address" IS NULL '
+            f'ORDER BY "timestamp" DESC, "page" LIMIT $5'
+        ))
+        self.assertEqual(params, [3, 8, "a", "b", 10])
+
+    def test_rejects_bad_identifiers_and_operators(self):
+        with self.assertRaises(ValueError):
+            build_select(TABLE, {"page = 1 OR 1": 1})
+        with self.assertRaises(ValueError):
+            build_select(TABLE, {"timestamp": {"like": "%"}})
+        with self.assertRaises(ValueError):
+            build_select(TABLE, columns=["*"])
+
+    def test_chunk_filters_splits_largest_list(self):
+        chunks = chunk_filters({"page": ["/a", "/b"], "customer_user_id": {"in": list(range(5))}}, 2)
+        self.assertEqual([c["customer_user_id"]["in"] for c in chunks], [[0, 1], [2, 3], [4]])
+        self.assertTrue(all(c["page"] == ["/a", "/b"] for c in chunks))
+
+    def test_split_range(self):
+        self.assertEqual(split_range(0, 10, 4), [0, 2, 5, 7, 10])
+        self.assertEqual(split_range(0, 2, 4), [0, 1, 2])
+        self.assertEqual(split_range("2024-09-25T00:00:00+00:00", "2024-09-25T12:00:00+00:00", 3), [
+            "2024-09-25T00:00:00+00:00", "2024-09-25T04:00:00+00:00",
+            "2024-09-25T08:00:00+00:00", "2024-09-25T12:00:00+00:00",
+        ])
+        self.assertEqual(split_range("2024-09-25T00:00:00Z", "2024-09-25T12:00:00Z", 2), [
+            "2024-09-25T00:00:00Z", "2024-09-25T06:00:00Z", "2024-09-25T12:00:00Z",
+        ])
+        with self.assertRaises(ValueError):
+            split_range(5, 5, 2)
+
+    def test_chunk_filters_without_filters(self):
+        self.assertEqual(chunk_filters(None, 10), [{}])
+
+    def test_sort_rows_nulls_last(self):
+        rows = [{"a": 2}, {"a": None}, {"a": 3}, {"a": 1}]
+        self.assertEqual([r["a"] for r in sort_rows(rows, "-a")], [3, 2, 1, None])
+
+
+class LocalOrbisDB(OrbisDB):
+    """OrbisDB whose reads run against an in-memory SQLite table"""
+
+    def __init__(self):
+        super().__init__(c_endpoint="http://localhost", o_endpoint="http://localhost", table_stream=TABLE)
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(f'CREATE TABLE {TABLE} (stream_id, customer_user_id, timestamp)')
+        self.conn.executemany(f'INSERT INTO {TABLE} VALUES (?, ?, ?)',
+                              [(f"k{i}", i % 50, f"2024-09-25T15:{i % 60:02d}:00") for i in range(500)])
+        self.round_trips = 0
+        self.lock = threading.Lock()
+
+    def _read_rows(self, env_id, query, params=None):
+        # Partitioned scans read from several threads, one connection cannot serve them at once
+        with self.lock:
+            self.round_trips += 1
+            return [dict(row) for row in self.conn.execute(query, bind_params(params or []))]
+
+
+class TestFilter(unittest.TestCase):
+
+    def test_chunked_in_list_merges_sorts_and_limits(self):
+        db = LocalOrbisDB()
+        rows = db.filter("env", {"customer_user_id": list(range(0, 50, 2))}, columns=["stream_id"],
+                         order_by="-timestamp", limit=5, chunk_size=10)
+        self.assertEqual(db.round_trips, 3)
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(set(rows[0]), {"stream_id"})
+        timestamps = [db.get_row("env", row["stream_id"])["timestamp"] for row in rows]
+        self.assertEqual(timestamps, ["2024-09-25T15:58:00"] * 5)
+
+
+    def test_scan_range_matches_single_query(self):
+        db = LocalOrbisDB()
+        start, end = "2024-09-25T15:10:00", "2024-09-25T15:50:00"
+        rows = db.scan_range("env", "timestamp", start, end, partitions=4, parallelism=4)
+        self.assertEqual(db.round_trips, 4)
+        expected = db.filter("env", {"timestamp": {"gte": start, "lt": end}}, order_by="timestamp")
+        self.assertEqual([r["timestamp"] for r in rows], [r["timestamp"] for r in expected])
+        unordered = list(db.iter_range("env", "timestamp", start, end, partitions=4, ordered=False))
+        self.assertEqual(sorted(r["stream_id"] for r in unordered), sorted(r["stream_id"] for r in expected))
+
+
+    def test_load_related_batches_and_reuses_identity_map(self):
+        db = LocalOrbisDB()
+        rows = [{"ref_id": f"k{i % 7}"} for i in range(30)] + [{"ref_id": None}, {"ref_id": "missing"}]
+        identity_map = {}
+        db.load_related("env", rows, "ref_id", columns=["customer_user_id"], identity_map=identity_map, chunk_size=4)
+        self.assertEqual(db.round_trips, 2)
+        self.assertEqual(rows[3]["ref"], {"stream_id": "k3", "customer_user_id": 3})
+        self.assertIsNone(rows[-2]["ref"])
+        self.assertIsNone(rows[-1]["ref"])
+        self.assertEqual(len(identity_map), 7)
+
+        more = [{"ref_id": "k1"}, {"ref_id": "k9"}]
+        db.load_related("env", more, "ref_id", attach_as="target", identity_map=identity_map)
+        self.assertEqual(db.round_trips, 3)
+        self.assertIs(more[0]["target"], identity_map["k1"])
+        self.assertEqual(more[1]["target"]["customer_user_id"], 9)
+
+
+    def test_update_rows_requires_filters(self):
+        db = LocalOrbisDB()
+        with mock.patch.object(db, "update_streams") as update_streams:
+            for filters in ({}, None):
+                self.assertRaises(ValueError, db.update_rows, "env", filters, {"page": "/home"})
+        update_streams.assert_not_called()
+
+
+@unittest.skipUnless(importlib.util.find_spec("flask") and importlib.util.find_spec("dotenv"),
+                     "the example server's dependencies are not installed")
+class TestUpdateRoute(unittest.TestCase):
+
+    def test_update_without_filters_is_rejected(self):
+        server = load_server()
+        client = server.app.test_client()
+        with mock.patch.object(server.registry.default, "update_streams") as update_streams:
+            for filters in ({}, None):
+                response = client.patch("/update_document", json={"filters": filters, "content": {"page": "/home"}})
+                self.assertEqual(response.status_code, 400)
+        update_streams.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
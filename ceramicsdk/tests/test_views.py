@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+from orbis_python.views import AggregateView, bucket_timestamp
+
+from .test_replica import TABLE, FakeOrbis
+
+
+class TestAggregateView(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "views.db")
+        self.remote = FakeOrbis()
+        self.remote.insert("k1", "/home", 1, "2024-09-25T15:10:00")
+        self.remote.insert("k2", "/home", 2, "2024-09-25T15:20:00")
+        self.remote.insert("k3", "/about", 1, "2024-09-25T16:05:00")
+        self.remote.insert("k4", "/home", 1, "2024-09-25T16:30:00")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def view(self, **kwargs):
+        return AggregateView(self.remote, "env", "by_page", path=self.path, **kwargs)
+
+    def test_group_count_with_time_bucket(self):
+        view = self.view(group_by=["page"], time_bucket=("indexed_at", 3600))
+        self.assertEqual(view.refresh(), 4)
+        self.assertEqual(view.rows(), [
+            {"page": "/about", "indexed_at_bucket": "2024-09-25T16:00:00+00:00", "count": 1},
+            {"page": "/home", "indexed_at_bucket": "2024-09-25T15:00:00+00:00", "count": 2},
+            {"page": "/home", "indexed_at_bucket": "2024-09-25T16:00:00+00:00", "count": 1},
+        ])
+
+    def test_incremental_refresh_and_distinct(self):
+        view = self.view(group_by=["page"], count_distinct="customer_user_id")
+        view.refresh()
+        self.remote.insert("k5", "/about", 3, "2024-09-25T17:00:00")
+        queries = self.remote.queries
+        self.assertEqual(view.refresh(), 1)
+        self.assertEqual(self.remote.queries, queries + 1)
+        self.assertEqual(view.rows(), [
+            {"page": "/about", "count": 2, "distinct_count": 2},
+            {"page": "/home", "count": 3, "distinct_count": 2},
+        ])
+
+    def test_updated_rows_move_between_groups(self):
+        view = self.view(group_by=["page"], count_distinct="customer_user_id")
+        view.refresh()
+        self.remote.remote.execute(
+            f'UPDATE "{TABLE}" SET page = ?, indexed_at = ? WHERE stream_id = ?', ("/about", "2024-09-25T18:00:00", "k2")
+        )
+        self.assertEqual(view.refresh(), 1)
+        self.assertEqual(view.rows(), [
+            {"page": "/about", "count": 2, "distinct_count": 2},
+            {"page": "/home", "count": 2, "distinct_count": 1},
+        ])
+
+    def test_state_persists_and_resets_on_new_definition(self):
+        self.view(group_by=["page"]).refresh()
+        restarted = self.view(group_by=["page"])
+        self.assertEqual(restarted.refresh(), 0)
+        self.assertEqual(len(restarted.rows()), 2)
+        redefined = self.view(group_by=["customer_user_id"])
+        self.assertEqual(redefined.rows(), [])
+        self.assertEqual(redefined.refresh(), 4)
+
+    def test_bucket_timestamp(self):
+        self.assertEqual(bucket_timestamp("2024-09-25T15:06:14.957719+00:00", 900), "2024-09-25T15:00:00+00:00")
+        self.assertEqual(bucket_timestamp("2024-09-25T15:06:14Z", 3600), "2024-09-25T15:00:00+00:00")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import sqlite3
+import threading
+import time
+import unittest
+
+from orbis_python import OrbisDB, StreamWatcher
+from orbis_python.replica import bind_params
+
+from .fakes import TABLE
+
+
+class FakeCeramic:
+
+    def __init__(self):
+        self.streams = {}
+        self.loaded = []
+
+    def multi_query(self, stream_ids, opts=None):
+        self.loaded.extend(stream_ids)
+        return {stream_id: self.streams[stream_id] for stream_id in stream_ids if stream_id in self.streams}
+
+
+class FakeOrbis:
+    """Keeps stream states and the index table in step, like OrbisDB indexing a Ceramic node"""
+
+    watch = OrbisDB.watch
+
+    def __init__(self):
+        self.table_stream = TABLE
+        self.watchers = {}
+        self.ceramic_client = FakeCeramic()
+        self.index = sqlite3.connect(":memory:", check_same_thread=False)
+        self.index.execute(f'CREATE TABLE "{TABLE}" (stream_id TEXT PRIMARY KEY, page TEXT, indexed_at REAL)')
+        self.lock = threading.Lock()
+
+    def write(self, stream_id, content, indexed=True):
+        with self.lock:
+            state = self.ceramic_client.streams.setdefault(stream_id, {"content": {}, "log": []})
+            state["content"] = content
+            state["log"] = state["log"] + [{"cid": f"{stream_id}-{len(state['log'])}"}]
+            if indexed:
+                self.index.execute(f'INSERT OR REPLACE INTO "{TABLE}" VALUES (?, ?, ?)',
+                                   (stream_id, content.get("page"), time.time()))
+
+    def _fetch(self, env_id, query, params=None, use_cache=True):
+        with self.lock:
+            rows = self.index.execute(query, bind_params(params or [])).fetchall()
+        return {"data": [{"stream_id": row[0], "indexed_at": row[1]} for row in rows]}
+
+
+class TestStreamWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeOrbis()
+        for i in range(10):
+            self.db.write(f"k{i}", {"page": "/home", "views": i})
+        self.changes = []
+        self.changed = threading.Event()
+
+    def on_change(self, stream_id, patch, content):
+        self.changes.append((stream_id, patch, content))
+        self.changed.set()
+
+    def test_delivers_patches_and_loads_only_moved_streams(self):
+        watcher = StreamWatcher(self.db, "env", min_interval=0.02, max_interval=0.02)
+        watcher.watch([f"k{i}" for i in range(10)], self.on_change)
+        time.sleep(0.1)
+        self.assertEqual(self.changes, [])
+        self.db.ceramic_client.loaded.clear()
+        self.db.write("k3", {"page": "/about", "views": 3})
+        self.assertTrue(self.changed.wait(5))
+        watcher.close()
+        self.assertEqual(self.changes, [("k3", [{"op": "replace", "path": "/page", "value": "/about"}],
+                                         {"page": "/about", "views": 3})])
+        self.assertEqual(set(self.db.ceramic_client.loaded), {"k3"})
+
+    def test_idle_streams_back_off(self):
+        watcher = StreamWatcher(self.db, "env", min_interval=0.01, max_interval=10, factor=2, batch_size=4)
+        watcher.watch([f"k{i}" for i in range(10)], self.on_change)
+        time.sleep(0.3)
+        watcher.close()
+        # Rounds at about 0, 0.01, 0.03, 0.07, 0.15 and 0.31s, three tip queries each
+        self.assertLessEqual(watcher.tip_queries, 3 * 6)
+
+    def test_unindexed_streams_are_loaded_from_ceramic(self):
+        watcher = StreamWatcher(self.db, "env", min_interval=0.01, max_interval=0.01)
+        self.db.write("k99", {"page": "/home"}, indexed=False)
+        watcher.watch(["k99"], self.on_change)
+        time.sleep(0.05)
+        self.db.write("k99", {"page": "/home", "tags": ["a"]}, indexed=False)
+        self.assertTrue(self.changed.wait(5))
+        watcher.close()
+        self.assertEqual(self.changes[0][1], [{"op": "add", "path": "/tags", "value": ["a"]}])
+
+    def test_closed_watcher_is_replaced(self):
+        first = self.db.watch("env", ["k1"], self.on_change, min_interval=0.01)
+        self.assertIs(self.db.watch("env", ["k2"], self.on_change), first)
+        first.close()
+        second = self.db.watch("env", ["k3"], self.on_change, min_interval=0.01)
+        self.assertIsNot(second, first)
+        self.assertIs(self.db.watchers["env"], second)
+        self.assertEqual(len(second), 1)
+        second.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
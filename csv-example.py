@@ -1,9 +1,8 @@
 import os
+import sys
+import argparse
 from dotenv import load_dotenv
-from orbis_python import OrbisDB
-import json
-import csv
-from typing import List, Dict
+from orbis_python import CheckpointLedger, OrbisDB, ingest, read_csv
 
 
 load_dotenv(dotenv_path='.env',override=True)
@@ -13,32 +12,43 @@ TABLE_ID = os.getenv("TABLE_ID")
 CONTEXT_ID = os.getenv("CONTEXT_ID")
 CERAMIC_ENDPOINT = os.getenv("CERAMIC_ENDPOINT")
 ORBIS_ENDPOINT = os.getenv("ORBIS_ENDPOINT")
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "8"))
 
-# filename
-filename = 'sample.csv'
 
+def create_documents(filename, seed, concurrency, report_every, ledger_path):
+    """Stream `filename` into the table, converting each cell to the type the model declares
 
-def create_documents():
-    seed = os.urandom(32).hex()
-    orbis = OrbisDB(c_endpoint=CERAMIC_ENDPOINT, 
-                    o_endpoint=ORBIS_ENDPOINT, 
-                    context_stream=CONTEXT_ID, 
-                    table_stream=TABLE_ID, 
+    Written rows are recorded in the ledger at `ledger_path`, so running the
+    same file again after an interruption skips the rows already written.
+    """
+    orbis = OrbisDB(c_endpoint=CERAMIC_ENDPOINT,
+                    o_endpoint=ORBIS_ENDPOINT,
+                    context_stream=CONTEXT_ID,
+                    table_stream=TABLE_ID,
                     controller_private_key=seed)
-    data = []
-    with open(filename, mode='r') as file:
-        csvFile = csv.DictReader(file)
-        for lines in csvFile:
-            data.append(lines)
-    
-    for i in range(len(data)):
-        line = data[i]
-        # ensure line.customer_user_id is an integer
-        line['customer_user_id'] = int(line['customer_user_id'])
-        doc = orbis.add_row(line)
-        print(doc)
-    
-    # Return stringified stream_id
-    return json.dumps(doc)
-
-create_documents()
+
+    def on_result(result):
+        # Data rows start on line 2, after the header
+        if "error" in result:
+            print(f"line {result['index'] + 2}: {result['error']}", file=sys.stderr)
+
+    with CheckpointLedger(ledger_path) as ledger:
+        stats = ingest(orbis, read_csv(filename), concurrency=concurrency, report_every=report_every,
+                       on_progress=print, on_result=on_result, ledger=ledger)
+    return stats.failed == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create one document per row of a CSV file")
+    parser.add_argument("filename", nargs="?", default="sample.csv")
+    parser.add_argument("--agent", default="AGENT_ONE_SEED", help="environment variable holding the controller seed")
+    parser.add_argument("--concurrency", type=int, default=INGEST_CONCURRENCY)
+    parser.add_argument("--report-every", type=float, default=5.0, help="seconds between progress lines")
+    parser.add_argument("--ledger", help="file recording the rows already written (default: <filename>.ledger)")
+    args = parser.parse_args()
+
+    seed = os.getenv(args.agent)
+    if not seed:
+        sys.exit(f"{args.agent} is not set, run seeds.py and add the seeds to your .env file")
+    sys.exit(0 if create_documents(args.filename, seed, args.concurrency, args.report_every,
+                                    args.ledger or args.filename + ".ledger") else 1)
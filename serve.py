@@ -0,0 +1,148 @@
+"""Run server-example.py with several pre-forked worker processes
+
+    python3 serve.py --workers 4 --host 0.0.0.0 --port 8000
+
+The app is imported once in the parent, so workers share the imported code and
+the agent keys derived at startup. After the fork each worker opens its own
+connection pools, warms up (loads the model definition and opens connections
+to Ceramic and OrbisDB) and only then starts accepting requests; until then
+`/ready` on that worker answers 503. On Linux every worker listens on its own
+SO_REUSEPORT socket and the kernel spreads connections between them; elsewhere
+the workers accept from one socket opened by the parent.
+
+Workers that die are restarted. SIGTERM or Ctrl+C stops all of them; each worker
+finishes its queued asynchronous writes before exiting.
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_app(path):
+    spec = importlib.util.spec_from_file_location("server_example", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def open_socket(host, port, reuse_port, listen=True):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    if listen:
+        sock.listen(1024)
+    return sock
+
+
+def run_worker(server, host, port, shared_sock, ready_fd):
+    """Body of a worker process. Never returns"""
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    code = 0
+    try:
+        server.registry.reopen()
+        server.warm_up()
+        sock = shared_sock or open_socket(host, port, reuse_port=True)
+        http = make_server(host, port, server.app, threaded=True, fd=sock.fileno())
+        # From here on stop gracefully: stop accepting, then let queued async writes finish
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=http.shutdown, daemon=True).start())
+        os.write(ready_fd, b".")
+        http.serve_forever()
+        if server.write_queue is not None:
+            server.write_queue.shutdown(wait=True)
+    except SystemExit:
+        pass
+    except BaseException:
+        logging.exception(f"Worker {os.getpid()} failed")
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--app", default=os.path.join(ROOT, "server-example.py"), help="path of the Flask app module")
+    parser.add_argument("--ready-file", help="touched once every worker is warmed up")
+    parser.add_argument("--shared-socket", action="store_true", help="accept from one socket even if SO_REUSEPORT exists")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(message)s")
+
+    server = load_app(args.app)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    reuse_port = hasattr(socket, "SO_REUSEPORT") and not args.shared_socket
+    # With SO_REUSEPORT the parent only holds the port (resolving port 0) and workers bind their own sockets
+    parent_sock = open_socket(args.host, args.port, reuse_port, listen=not reuse_port)
+    port = parent_sock.getsockname()[1]
+    shared_sock = None if reuse_port else parent_sock
+    ready_r, ready_w = os.pipe()
+
+    workers = {}
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            run_worker(server, args.host, port, shared_sock, ready_w)
+        workers[pid] = time.monotonic()
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+
+    for _ in range(args.workers):
+        spawn()
+    ready = 0
+    announced = False
+    while not stopping:
+        try:
+            readable, _, _ = select.select([ready_r], [], [], 0.5)
+        except InterruptedError:
+            continue
+        if readable:
+            ready += len(os.read(ready_r, 1024))
+        if not announced and ready >= args.workers:
+            announced = True
+            logging.info(f"{args.workers} workers ready on http://{args.host}:{port}")
+            if args.ready_file:
+                open(args.ready_file, "w").close()
+        while workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                break
+            started_at = workers.pop(pid)
+            if not stopping:
+                logging.warning(f"Worker {pid} exited with status {status}, restarting")
+                # Back off if workers crash right after boot, e.g. while upstream is unreachable
+                time.sleep(max(0.0, 1.0 - (time.monotonic() - started_at)))
+                spawn()
+
+    logging.info("Stopping workers")
+    for pid in workers:
+        os.kill(pid, signal.SIGTERM)
+    for pid in list(workers):
+        os.waitpid(pid, 0)
+    if args.ready_file and os.path.exists(args.ready_file):
+        os.remove(args.ready_file)
+
+
+if __name__ == "__main__":
+    main()
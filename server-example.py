@@ -1,8 +1,15 @@
 import os
 from dotenv import load_dotenv
-from orbis_python import OrbisDB
-from flask import Flask, request
+from orbis_python import ClientRegistry, QueryCache, SharedMemoryCache, WriteQueue
+from orbis_python.jobs import QueueFull
+from orbis_python.cache import SingleFlight
+from orbis_python.sql import OPERATORS
+from ceramic_python.metrics import metrics
+from flask import Flask, Response, g, request, stream_with_context
+import hashlib
 import json
+import threading
+import time
 
 app = Flask(__name__)
 
@@ -16,6 +23,37 @@ AGENT_TWO_SEED = os.getenv("AGENT_TWO_SEED")
 AGENT_THREE_SEED = os.getenv("AGENT_THREE_SEED")
 CERAMIC_ENDPOINT = os.getenv("CERAMIC_ENDPOINT")
 ORBIS_ENDPOINT = os.getenv("ORBIS_ENDPOINT")
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "10"))
+# File (e.g. under /dev/shm) of a cache shared by the worker processes of serve.py, empty to keep caches per process
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "")
+SHARED_CACHE_MB = int(os.getenv("SHARED_CACHE_MB", "64"))
+# When enabled, write routes validate and enqueue the write, answer 202 with a job ID
+# and leave signing and the Ceramic round trips to a background worker pool
+ASYNC_WRITES = os.getenv("ASYNC_WRITES", "false").lower() in ("1", "true", "yes")
+WRITE_WORKERS = int(os.getenv("WRITE_WORKERS", "4"))
+WRITE_QUEUE_SIZE = int(os.getenv("WRITE_QUEUE_SIZE", "1000"))
+# Rows written concurrently by /create_documents, and the most its `concurrency` parameter may ask for
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "8"))
+COMMIT_LANES = int(os.getenv("COMMIT_LANES", "8"))
+# Adapt the number of concurrent calls to each of Ceramic and OrbisDB to how the node responds.
+# The rate limits are hard ceilings in requests per second, 0 for none
+ADAPTIVE_LIMITS = os.getenv("ADAPTIVE_LIMITS", "false").lower() in ("1", "true", "yes")
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "64"))
+CERAMIC_RATE_LIMIT = float(os.getenv("CERAMIC_RATE_LIMIT", "0"))
+ORBIS_RATE_LIMIT = float(os.getenv("ORBIS_RATE_LIMIT", "0"))
+
+# Shared by every request so reads are served from memory until the TTL expires
+# or one of the write routes below invalidates the table
+query_cache = QueryCache(ttl=QUERY_CACHE_TTL,
+                         shared=SharedMemoryCache(SHARED_CACHE_PATH, arena_bytes=SHARED_CACHE_MB << 20)
+                         if SHARED_CACHE_PATH else None)
+
+# Identical read requests that arrive while one is in flight share its response
+read_flight = SingleFlight()
+read_stats = {"coalesced": 0, "not_modified": 0}
+read_stats_lock = threading.Lock()
+
+write_queue = WriteQueue(workers=WRITE_WORKERS, max_pending=WRITE_QUEUE_SIZE) if ASYNC_WRITES else None
 
 switcher = {
 "agent_one": AGENT_ONE_SEED,
@@ -23,16 +61,76 @@ switcher = {
 "agent_three": AGENT_THREE_SEED
 }
 
+# One OrbisDB handle per agent, built at startup and reused by every request. The handles
+# share a connection pool and the model definition cache; unknown agents get a default handle
+registry = ClientRegistry(c_endpoint=CERAMIC_ENDPOINT,
+                          o_endpoint=ORBIS_ENDPOINT,
+                          seeds=switcher,
+                          context_stream=CONTEXT_ID,
+                          table_stream=TABLE_ID,
+                          cache=query_cache,
+                          lanes=COMMIT_LANES,
+                          limits={"max_limit": UPSTREAM_MAX_CONCURRENCY,
+                                  "endpoints": {CERAMIC_ENDPOINT: {"rate": CERAMIC_RATE_LIMIT or None},
+                                                ORBIS_ENDPOINT: {"rate": ORBIS_RATE_LIMIT or None}}}
+                          if ADAPTIVE_LIMITS else None)
+
+# Request latency per route, plus gauges read when /metrics is scraped. The Ceramic client and
+# OrbisDB record their own upstream timings (model lookup, signing, stream create, commit apply,
+# state fetch, Orbis query) into the same registry
+metrics.describe("http_request_duration_seconds", "Duration of HTTP requests by route, method and status")
+metrics.gauge("query_cache_hit_ratio", lambda: query_cache.stats()["hit_ratio"], help="Share of Orbis queries served from the query cache")
+metrics.gauge("query_cache_entries", lambda: query_cache.stats()["entries"])
+metrics.gauge("query_cache_bytes", lambda: query_cache.stats()["bytes"])
+metrics.counter("query_cache_shared_hits_total", lambda: query_cache.stats()["shared_hits"], help="Orbis queries served from the cache shared between workers")
+metrics.gauge("read_requests_in_flight", lambda: read_flight.in_flight)
+metrics.counter("read_requests_coalesced_total", lambda: read_stats["coalesced"], help="Read requests answered with another request's result")
+metrics.counter("read_requests_not_modified_total", lambda: read_stats["not_modified"], help="Read requests answered with 304")
+for lane in range(COMMIT_LANES):
+    metrics.gauge("commit_lane_depth", lambda lane=lane: registry.scheduler.depths()[lane],
+                  help="Update commits waiting per commit scheduler lane", lane=str(lane))
+if write_queue is not None:
+    metrics.gauge("write_queue_depth", lambda: write_queue.depth, help="Accepted writes waiting for a worker")
+    metrics.gauge("write_queue_running", lambda: write_queue.stats()["running"])
+
+@app.before_request
+def start_timer():
+    g.started_at = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    # Streamed responses are timed up to their first byte
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe("http_request_duration_seconds", time.perf_counter() - g.started_at,
+                    route=route, method=request.method, status=response.status_code)
+    return response
+
+# Set once warm_up() has loaded the model and opened connections; see serve.py
+ready = threading.Event()
+
+def warm_up():
+    registry.warm_up(ENV_ID)
+    ready.set()
+
+# GET http://127.0.0.1:5000/ready
+# Readiness probe for load balancers: 503 until the process is warmed up
+@app.route('/ready', methods=['GET'])
+def get_ready():
+    if not ready.is_set():
+        return {"ready": False}, 503
+    return {"ready": True, "pid": os.getpid()}
+
+# GET http://127.0.0.1:5000/metrics
+# Prometheus text format
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # GET http://127.0.0.1:5000?agent=agent_two
 @app.route('/')
 def get():
     agent = request.args.get('agent')
-    seed = switcher.get(agent)
-    orbis = OrbisDB(c_endpoint=CERAMIC_ENDPOINT, 
-                    o_endpoint=ORBIS_ENDPOINT, 
-                    context_stream=CONTEXT_ID, 
-                    table_stream=TABLE_ID, 
-                    controller_private_key=seed)
+    orbis = registry.get(agent)
     return json.dumps(orbis.ceramic_client.did.id)
 
 # POST http://127.0.0.1:5000/create_document?agent=agent_three
@@ -40,64 +138,172 @@ def get():
 @app.route('/create_document', methods=['POST'])
 def create_document():
     agent = request.args.get('agent')
-    seed = switcher.get(agent)
-    orbis = OrbisDB(c_endpoint=CERAMIC_ENDPOINT, 
-                    o_endpoint=ORBIS_ENDPOINT, 
-                    context_stream=CONTEXT_ID, 
-                    table_stream=TABLE_ID, 
-                    controller_private_key=seed)
+    orbis = registry.get(agent)
     content = request.json
+    if write_queue is not None:
+        try:
+            orbis.validate_row(content)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        return enqueue(lambda: orbis.add_row(content))
     doc = orbis.add_row(content)
     
     # Return stringified stream_id
     return json.dumps(doc)
 
+# POST http://127.0.0.1:5000/create_documents?agent=agent_three
+# Body: one JSON document per line (NDJSON), e.g. curl -T rows.ndjson -H "Content-Type: application/x-ndjson"
+# Rows are read, validated and written as they arrive, and one result per row is streamed back as NDJSON:
+# {"index": 0, "stream_id": "kjzl..."} or {"index": 1, "error": "..."}, followed by a {"summary": ...} line
+@app.route('/create_documents', methods=['POST'])
+def create_documents():
+    agent = request.args.get('agent')
+    orbis = registry.get(agent)
+    concurrency = request.args.get('concurrency', default=INGEST_CONCURRENCY, type=int)
+    if not 1 <= concurrency <= INGEST_CONCURRENCY:
+        return {"error": f"concurrency must be between 1 and {INGEST_CONCURRENCY}"}, 400
+
+    def rows():
+        for line in request.stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Rejected by validation as not being a JSON object
+                yield line.decode('utf-8', errors='replace')
+
+    def results():
+        created = failed = 0
+        for result in orbis.add_rows(rows(), concurrency=concurrency):
+            if 'error' in result:
+                failed += 1
+            else:
+                created += 1
+            yield json.dumps(result) + '\n'
+        yield json.dumps({"summary": {"created": created, "failed": failed}}) + '\n'
+
+    return Response(stream_with_context(results()), mimetype='application/x-ndjson')
+
+def read_response(load):
+    """Serve a read, coalescing identical in-flight requests and answering 304 to a matching If-None-Match
+
+    `load` returns the JSON-serializable result. The ETag is a hash of the serialized body,
+    so it only changes when the result does.
+    """
+    # Every agent reads the same table, so the agent is not part of the key
+    key = (request.path, tuple(sorted((k, v) for k, v in request.args.items(multi=True) if k != 'agent')))
+
+    def render():
+        body = app.json.dumps(load()).encode('utf-8')
+        return body, hashlib.sha256(body).hexdigest()
+
+    (body, etag), shared = read_flight.do(key, render)
+    response = Response(body, mimetype='application/json', headers={'Cache-Control': 'no-cache'})
+    response.set_etag(etag)
+    response.make_conditional(request)
+    with read_stats_lock:
+        read_stats["coalesced"] += shared
+        read_stats["not_modified"] += response.status_code == 304
+    return response
+
 # GET http://127.0.0.1:5000/get?agent=agent_one
+# Send the returned ETag back in If-None-Match to get an empty 304 while the rows are unchanged
 @app.route('/get', methods=['GET'])
 def get_documents():
     agent = request.args.get('agent')
-    seed = switcher.get(agent)
-    orbis = OrbisDB(c_endpoint=CERAMIC_ENDPOINT, 
-                    o_endpoint=ORBIS_ENDPOINT, 
-                    context_stream=CONTEXT_ID, 
-                    table_stream=TABLE_ID, 
-                    controller_private_key=seed)
+    orbis = registry.get(agent)
     
-    return orbis.read(ENV_ID)
+    return read_response(lambda: orbis.read(ENV_ID))
 
 ## Need to update below
 
 # # GET http://127.0.0.1:5000/filter?customer_user_id=3&agent=agent_two
+# Repeated keys become IN lists (?customer_user_id=3&customer_user_id=8), "__gte", "__lt", ... suffixes
+# become range comparisons (?timestamp__gte=2024-09-25T15:00:00Z), and limit, order_by (comma separated,
+# "-" prefix for descending) and columns (comma separated) shape the result
 @app.route('/filter')
 def get_filtered_documents():
     agent = request.args.get('agent')
-    seed = switcher.get(agent)
-    orbis = OrbisDB(c_endpoint=CERAMIC_ENDPOINT, 
-                    o_endpoint=ORBIS_ENDPOINT, 
-                    context_stream=CONTEXT_ID, 
-                    table_stream=TABLE_ID, 
-                    controller_private_key=seed)
+    orbis = registry.get(agent)
     
-    # Get the filter from the query string but remove the agent key
-    filter = {k: v for k, v in request.args.items() if k != 'agent'}
-    res = orbis.filter(ENV_ID, filter)
-    return res
+    # Get the filter from the query string but remove the agent and result-shaping keys
+    filter = {}
+    for key, values in request.args.lists():
+        if key in ('agent', 'limit', 'order_by', 'columns'):
+            continue
+        value = values if len(values) > 1 else values[0]
+        name, _, op = key.rpartition('__')
+        if name and op in OPERATORS:
+            filter.setdefault(name, {})[op] = value
+        else:
+            filter[key] = value
+    # Query string values are text; convert them to the model's column types
+    try:
+        filter = orbis.coerce_filters(filter)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    columns = request.args.get('columns')
+    order_by = request.args.get('order_by')
+    return read_response(lambda: orbis.filter(ENV_ID, filter,
+                                              columns=columns.split(',') if columns else None,
+                                              order_by=order_by.split(',') if order_by else None,
+                                              limit=request.args.get('limit', type=int)))
 
 # # PATCH http://127.0.0.1:5000/update_document?agent=agent_two
 # # payload example: { "filters": {"customer_user_id": 3 }, "content": {"customer_user_id": 4} }
 @app.route('/update_document', methods=['PATCH'])
 def update_document():
     agent = request.args.get('agent')
-    seed = switcher.get(agent)
-    orbis = OrbisDB(c_endpoint=CERAMIC_ENDPOINT, 
-                    o_endpoint=ORBIS_ENDPOINT, 
-                    context_stream=CONTEXT_ID, 
-                    table_stream=TABLE_ID, 
-                    controller_private_key=seed)
+    orbis = registry.get(agent)
     content = request.json.get('content')
     filters = request.json.get('filters')
+    if not filters:
+        return {"error": "At least one filter is required"}, 400
+    if write_queue is not None:
+        try:
+            orbis.validate_row(content, partial=True)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        # The matching rows are resolved now; the job waits for earlier writes to the same streams
+        stream_ids = [row["stream_id"] for row in orbis.filter(ENV_ID, filters, columns=["stream_id"])]
+        return enqueue(lambda: orbis.update_streams(stream_ids, content), keys=stream_ids)
     doc = orbis.update_rows(ENV_ID, filters, content)
     return doc
 
+def enqueue(write, keys=()):
+    try:
+        job = write_queue.submit(write, keys=keys)
+    except QueueFull as e:
+        return {"error": str(e)}, 503, {"Retry-After": "1"}
+    return {"job_id": job.id, "status": f"/jobs/{job.id}"}, 202, {"Location": f"/jobs/{job.id}"}
+
+# GET http://127.0.0.1:5000/jobs/<job_id>
+# State of a write accepted with ASYNC_WRITES: queued, running, done (with its result) or failed (with the error)
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = write_queue.get(job_id) if write_queue is not None else None
+    if job is None:
+        return {"error": f"Unknown job {job_id}"}, 404
+    return job.status()
+
+# GET http://127.0.0.1:5000/jobs
+@app.route('/jobs', methods=['GET'])
+def job_stats():
+    if write_queue is None:
+        return {"error": "Asynchronous writes are disabled, set ASYNC_WRITES=true"}, 404
+    return write_queue.stats()
+
+# GET http://127.0.0.1:5000/cache_stats
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    with read_stats_lock:
+        reads = dict(read_stats, in_flight=read_flight.in_flight)
+    return {**query_cache.stats(), "reads": reads}
+
 if __name__ == '__main__':
+    try:
+        warm_up()
+    except Exception as e:
+        app.logger.warning(f"Warm-up failed, /ready will report 503: {e}")
     app.run(debug=True)
\ No newline at end of file